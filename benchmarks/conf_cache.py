@@ -0,0 +1,78 @@
+# coding: utf-8
+"""
+    benchmarks.conf_cache
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures request-scoped reloads of the same unchanged config file with
+    and without :class:`dooku.conf.ConfCache`.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_cache.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, ConfCache  # noqa
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+NUMBER = 20
+
+
+def make_conf(width=20, leaves=20):
+    return dict(
+        ('section%d' % i, dict(
+            ('group%d' % j, dict(
+                ('option%d' % k, 'value %d' % k) for k in range(leaves)))
+            for j in range(width)))
+        for i in range(width))
+
+
+def report(name, func):
+    seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+    print('%-30s %8.2f ms/reload' % (name, seconds / NUMBER * 1e3))
+
+
+def main():
+    loaders = [('json', json.load, json.dump)]
+    if yaml is not None:
+        loaders.append(('yaml', yaml.safe_load, yaml.safe_dump))
+
+    for name, load, dump in loaders:
+        fd, filename = tempfile.mkstemp(suffix='.' + name)
+        with os.fdopen(fd, 'w') as f:
+            dump(make_conf(), f)
+
+        cache = ConfCache()
+        checksum_cache = ConfCache(checksum=True)
+        try:
+            report('%s, no cache' % name,
+                   lambda: Conf().from_file(load, filename))
+            report('%s, ConfCache' % name,
+                   lambda: Conf().from_file(load, filename, cache=cache))
+            report('%s, ConfCache(checksum=True)' % name,
+                   lambda: Conf().from_file(
+                       load, filename, cache=checksum_cache))
+            print(cache.cache_info())
+        finally:
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# coding: utf-8
+"""
+    benchmarks.conf_compact
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures memory saved by :meth:`dooku.conf.Conf.compact` on 1000
+    tenant configs of 1000 leaves each (1M leaves in total), which repeat
+    the same keys and many of the same values. Memory is measured by
+    tracemalloc.
+
+    Run it from the repository root (Python 3.4+)::
+
+        $ python benchmarks/conf_compact.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+TENANTS = 1000
+SERVICES = 100
+
+
+def make_source(tenant):
+    return json.dumps(dict(
+        ('service%d' % i, {
+            'host': 'service%d.internal' % i,
+            'port': 8000 + i,
+            'timeout': 30.0,
+            'retries': 3,
+            'enabled': True,
+            'user': 'tenant%d' % tenant,
+            'pool': {'size': 100, 'overflow': 10},
+            'tags': ['production', 'eu-west-1'],
+        })
+        for i in range(SERVICES)))
+
+
+def main():
+    sources = [make_source(i) for i in range(TENANTS)]
+
+    tracemalloc.start()
+    confs = [Conf(json.loads(source)) for source in sources]
+    before = tracemalloc.get_traced_memory()[0]
+
+    started = time.time()
+    pool = {}
+    for conf in confs:
+        conf.compact(pool)
+    elapsed = time.time() - started
+
+    with_pool = tracemalloc.get_traced_memory()[0]
+    del pool
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    mib = 1024.0 ** 2
+    print('%d tenants, %d leaves:' % (TENANTS, TENANTS * SERVICES * 10))
+    print('  plain                %8.1f MiB' % (before / mib))
+    print('  compact, with pool   %8.1f MiB' % (with_pool / mib))
+    print('  compact, pool freed  %8.1f MiB (%.0f%% saved)' % (
+        after / mib, 100.0 * (before - after) / before))
+    print('  compaction took      %8.2f s (traced)' % elapsed)
+
+
+if __name__ == '__main__':
+    main()
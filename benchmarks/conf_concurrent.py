@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+    benchmarks.conf_concurrent
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures reads per second of a conf shared by a few reader threads,
+    while a writer thread updates it continuously. A usual
+    :class:`dooku.conf.Conf` guarded by a global lock is compared with
+    :class:`dooku.conf.ConcurrentConf`.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_concurrent.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, ConcurrentConf, KeyPath  # noqa
+
+
+READERS = 4
+SECONDS = 2.0
+
+KEYS = [KeyPath('service.group%d.option%d' % (i, i)) for i in range(10)]
+
+
+def make_conf(width=100, leaves=100):
+    return {'service': dict(
+        ('group%d' % i, dict(
+            ('option%d' % j, 'value %d' % j) for j in range(leaves)))
+        for i in range(width))}
+
+
+class _Locked(object):
+    """
+    A conf guarded by a global lock, the way it's done without
+    :class:`ConcurrentConf`.
+    """
+
+    def __init__(self, conf):
+        self.conf = conf
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            return self.conf[key]
+
+    def update(self, value):
+        with self.lock:
+            self.conf.update(value)
+
+
+def measure(name, conf):
+    stopped = threading.Event()
+    reads = [0] * READERS
+    writes = [0]
+
+    def read(n):
+        count = 0
+        while not stopped.is_set():
+            for key in KEYS:
+                conf[key]
+            count += len(KEYS)
+        reads[n] = count
+
+    def write():
+        i = 0
+        while not stopped.is_set():
+            conf.update({'service': {'group%d' % (i % 100): {'option0': i}}})
+            i += 1
+        writes[0] = i
+
+    threads = [threading.Thread(target=read, args=(n, ))
+               for n in range(READERS)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(SECONDS)
+    stopped.set()
+    for thread in threads:
+        thread.join()
+
+    print('%-22s %12d reads/s %10d writes/s' % (
+        name, sum(reads) / SECONDS, writes[0] / SECONDS))
+
+
+def main():
+    print('%d readers, 1 writer:' % READERS)
+    measure('  Conf + lock', _Locked(Conf(make_conf())))
+    measure('  ConcurrentConf', ConcurrentConf(make_conf()))
+
+
+if __name__ == '__main__':
+    main()
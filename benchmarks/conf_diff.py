@@ -0,0 +1,94 @@
+# coding: utf-8
+"""
+    benchmarks.conf_diff
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Measures :meth:`dooku.conf.Conf.diff` on a config of 1M leaves with
+    ten changed values: against an independent copy of the config, against
+    a new version that shares unchanged subtrees (as :class:`ConcurrentConf`
+    versions do), and against flattening both configs and comparing
+    the flat dictionaries.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_diff.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import ConcurrentConf, Conf  # noqa
+
+
+WIDTH = 100
+CHANGES = 10
+
+
+def make_tree():
+    return dict(
+        ('a%d' % i, dict(
+            ('b%d' % j, dict(('c%d' % k, i * j * k) for k in range(WIDTH)))
+            for j in range(WIDTH)))
+        for i in range(WIDTH))
+
+
+def flatten(tree):
+    flat, stack = {}, [('', tree)]
+    while stack:
+        prefix, node = stack.pop()
+        for key, value in node.items():
+            if isinstance(value, dict):
+                stack.append((prefix + key + '.', value))
+            else:
+                flat[prefix + key] = value
+    return flat
+
+
+def flat_diff(old, new):
+    old, new = flatten(old), flatten(new)
+    return (
+        dict((k, v) for k, v in new.items() if k not in old),
+        dict((k, v) for k, v in old.items() if k not in new),
+        dict((k, (v, new[k])) for k, v in old.items()
+             if k in new and new[k] != v))
+
+
+def measure(func, *args):
+    started = time.time()
+    result = func(*args)
+    return time.time() - started, result
+
+
+def main():
+    tree = make_tree()
+    changes = [('a%d.b%d.c0' % (i, i), -1) for i in range(CHANGES)]
+
+    # versions of a concurrent config share subtrees that aren't written
+    concurrent = ConcurrentConf(tree)
+    old = Conf()
+    old._data = concurrent._version
+    concurrent.set_many(changes)
+    shared = concurrent._version
+
+    independent = Conf(shared)
+
+    print('%d leaves, %d changed:' % (WIDTH ** 3, CHANGES))
+    for name, func, args in [
+            ('flatten and compare', flat_diff, (old._data, independent._data)),
+            ('diff, independent', old.diff, (independent, )),
+            ('diff, shared subtrees', old.diff, (shared, ))]:
+        elapsed, result = measure(func, *args)
+        assert len(result[2]) == CHANGES, name
+        print('  %-22s %9.2f ms' % (name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
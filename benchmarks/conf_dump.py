@@ -0,0 +1,85 @@
+# coding: utf-8
+"""
+    benchmarks.conf_dump
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Measures writing a config of 1M leaves by
+    :meth:`dooku.conf.Conf.dump_json` and :meth:`dooku.conf.Conf.dump_binary`
+    compared with :func:`json.dump`, and loading written files back.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_dump.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+WIDTH = 100
+
+
+def make_conf():
+    conf = Conf()
+    conf._data = dict(
+        ('service%d' % i, dict(
+            ('node%d' % j, dict(
+                ('key%d' % k, [i, 'host%d.local' % j, k * 0.5][k % 3])
+                for k in range(WIDTH)))
+            for j in range(WIDTH)))
+        for i in range(WIDTH))
+    return conf
+
+
+def measure(func):
+    started = time.time()
+    func()
+    return time.time() - started
+
+
+def main():
+    conf = make_conf()
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'conf')
+
+    def write(filename, mode, func):
+        def run():
+            with io.open(filename, mode) as f:
+                func(f)
+        return run
+
+    try:
+        print('%d leaves, writing:' % WIDTH ** 3)
+        for name, ext, mode, func in [
+                ('json.dump', '.json', 'w',
+                 lambda f: json.dump(conf._data, f)),
+                ('dump_json', '.json', 'w', conf.dump_json),
+                ('dump_binary', '.bin', 'wb', conf.dump_binary)]:
+            elapsed = measure(write(path + ext, mode, func))
+            print('  %-12s %8.0f ms' % (name, elapsed * 1000))
+
+        print('loading:')
+        for name, func in [
+                ('from_json', lambda: Conf().from_json(path + '.json')),
+                ('from_binary', lambda: Conf().from_binary(path + '.bin'))]:
+            print('  %-12s %8.0f ms' % (name, measure(func) * 1000))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# coding: utf-8
+"""
+    benchmarks.conf_env
+    ~~~~~~~~~~~~~~~~~~~
+
+    Measures :class:`dooku.conf.EnvOverlay` on an environment of 2000
+    ``APP__*`` variables: creating the overlay, refreshing it with none or
+    one variable changed, and a lookup compared with a wrapper that scans
+    the environment on every lookup.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_env.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, EnvOverlay  # noqa
+
+
+SERVICES = 500
+
+
+def make_environ():
+    environ = dict(('SYSTEM_VAR_%d' % i, 'x') for i in range(100))
+    for i in range(SERVICES):
+        environ['APP__SERVICE%d__HOST' % i] = 'service%d.local' % i
+        environ['APP__SERVICE%d__PORT' % i] = str(8000 + i)
+        environ['APP__SERVICE%d__DEBUG' % i] = 'false'
+        environ['APP__SERVICE%d__TAGS' % i] = '["a", "b"]'
+    return environ
+
+
+def scan_lookup(conf, environ, compound_key):
+    # a lookup made by a wrapper that knows nothing about the environment
+    # in advance
+    for name, value in environ.items():
+        if not name.startswith('APP__'):
+            continue
+        if '.'.join(name[5:].lower().split('__')) == compound_key:
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+    return conf[compound_key]
+
+
+def report(name, seconds):
+    print('  %-24s %10.2f us' % (name, seconds * 1e6))
+
+
+def main():
+    environ = make_environ()
+    conf = Conf()
+    overlay = EnvOverlay(conf, 'APP', environ=environ)
+
+    def create():
+        EnvOverlay(Conf(), 'APP', environ=environ)
+
+    def refresh_one():
+        environ['APP__SERVICE1__PORT'] = str(int(
+            environ['APP__SERVICE1__PORT']) + 1)
+        overlay.refresh()
+
+    print('%d variables:' % len(environ))
+    report('create', min(timeit.repeat(create, number=10)) / 10)
+    report('refresh, none changed',
+           min(timeit.repeat(overlay.refresh, number=100)) / 100)
+    report('refresh, one changed',
+           min(timeit.repeat(refresh_one, number=100)) / 100)
+
+    key = 'service%d.port' % (SERVICES - 1)
+    assert scan_lookup(conf, environ, key) == conf[key]
+    report('lookup, scanning',
+           min(timeit.repeat(
+               lambda: scan_lookup(conf, environ, key), number=100)) / 100)
+    report('lookup, overlay',
+           min(timeit.repeat(lambda: conf[key], number=100000)) / 100000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# coding: utf-8
+"""
+    benchmarks.conf_fingerprint
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures :meth:`dooku.conf.Conf.fingerprint` on a config of 1M leaves:
+    the first call that hashes the whole tree, a re-check after a single
+    write, and a digest of ``json.dumps(sort_keys=True)`` of the whole
+    config for comparison.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_fingerprint.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+WIDTH = 100
+WRITES = 1000
+
+
+def make_conf():
+    conf = Conf()
+    conf._data = dict(
+        ('a%d' % i, dict(
+            ('b%d' % j, dict(('c%d' % k, i * j * k) for k in range(WIDTH)))
+            for j in range(WIDTH)))
+        for i in range(WIDTH))
+    return conf
+
+
+def dumps_digest(conf):
+    return hashlib.sha1(
+        json.dumps(conf._data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def main():
+    conf = make_conf()
+
+    started = time.time()
+    dumps_digest(conf)
+    dumps = time.time() - started
+
+    started = time.time()
+    conf.fingerprint()
+    first = time.time() - started
+
+    started = time.time()
+    for i in range(WRITES):
+        conf['a%d.b%d.c0' % (i % WIDTH, i // WIDTH)] = -i
+        conf.fingerprint()
+    recheck = (time.time() - started) / WRITES
+
+    print('%d leaves:' % WIDTH ** 3)
+    print('  json.dumps and sha1      %9.2f ms' % (dumps * 1000))
+    print('  fingerprint, first call  %9.2f ms' % (first * 1000))
+    print('  write and fingerprint    %9.3f ms' % (recheck * 1000))
+
+
+if __name__ == '__main__':
+    main()
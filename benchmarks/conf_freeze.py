@@ -0,0 +1,63 @@
+# coding: utf-8
+"""
+    benchmarks.conf_freeze
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures how long it takes to build a :class:`dooku.conf.FrozenConf`
+    snapshot of a config with 100k leaves, and compares lookups of keys
+    of different depth against :class:`dooku.conf.Conf`.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_freeze.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+NUMBER = 200000
+REPEAT = 5
+
+
+def make_conf(width=100, leaves=10):
+    # 100 * 100 * 10 = 100k leaves
+    conf = Conf()
+    for i in range(width):
+        for j in range(width):
+            for k in range(leaves):
+                conf['section%d.group%d.option%d' % (i, j, k)] = k
+    return conf
+
+
+def report(name, func):
+    seconds = min(timeit.repeat(func, number=NUMBER, repeat=REPEAT))
+    print('%-30s %8.1f ns/lookup' % (name, seconds / NUMBER * 1e9))
+
+
+def main():
+    conf = make_conf()
+
+    started = time.time()
+    snapshot = conf.freeze()
+    print('freeze of 100k leaves: %.3f s' % (time.time() - started))
+
+    for key in ('section1', 'section1.group2', 'section1.group2.option3'):
+        print('%s:' % key)
+        report('  Conf', lambda: conf[key])
+        report('  FrozenConf', lambda: snapshot[key])
+
+
+if __name__ == '__main__':
+    main()
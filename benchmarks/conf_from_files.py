@@ -0,0 +1,85 @@
+# coding: utf-8
+"""
+    benchmarks.conf_from_files
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares loading 200 config fragments one by one with
+    :meth:`dooku.conf.Conf.from_files` in pools of threads and processes.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_from_files.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+FRAGMENTS = 200
+
+
+def make_fragment(i, width=10, leaves=20):
+    return {'fragment%d' % i: dict(
+        ('group%d' % j, dict(
+            ('option%d' % k, 'value %d' % k) for k in range(leaves)))
+        for j in range(width))}
+
+
+def measure(name, filenames, **kwargs):
+    started = time.time()
+    conf = Conf()
+    if kwargs:
+        conf.from_files(filenames, **kwargs)
+    else:
+        for filename in filenames:
+            conf.from_files([filename])
+    print('%-28s %7.3f s' % (name, time.time() - started))
+    return conf
+
+
+def main():
+    formats = [('json', json.dump)]
+    if yaml is not None:
+        formats.append(('yaml', yaml.safe_dump))
+
+    for ext, dump in formats:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filenames = []
+            for i in range(FRAGMENTS):
+                filenames.append(os.path.join(tmpdir, '%03d.%s' % (i, ext)))
+                with open(filenames[-1], 'w') as f:
+                    dump(make_fragment(i), f)
+
+            print('%d %s fragments:' % (FRAGMENTS, ext))
+            expected = measure('  one by one', filenames)
+            for workers in (4, 8):
+                assert expected == measure(
+                    '  %d threads' % workers, filenames, workers=workers)
+                assert expected == measure(
+                    '  %d processes' % workers, filenames,
+                    workers=workers, processes=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# coding: utf-8
+"""
+    benchmarks.conf_iteration
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares native implementations of :class:`dooku.conf.Conf` methods
+    with ones of the :class:`collections.MutableMapping` mixin, which go
+    through ``__getitem__`` for every key, on a config of 1000 sections
+    of 100 values each and 1000 top-level values.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_iteration.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # fallback to Python 2.x
+    from collections import MutableMapping
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+SECTIONS = 1000
+VALUES = 100
+
+
+def make_conf():
+    data = dict(
+        ('section%d' % i, dict(('key%d' % j, j) for j in range(VALUES)))
+        for i in range(SECTIONS))
+    data.update(('value%d' % i, i) for i in range(SECTIONS))
+    return Conf(data)
+
+
+def mixin_walk(conf, prefix=''):
+    for key, value in MutableMapping.items(conf):
+        if isinstance(value, Conf):
+            for item in mixin_walk(value, prefix + key + '.'):
+                yield item
+        else:
+            yield prefix + key, value
+
+
+def main():
+    conf = make_conf()
+    other = make_conf()
+    hit, miss = 'section500.key50', 'section500.nokey'
+
+    cases = [
+        ('items', 100,
+         lambda: list(MutableMapping.items(conf)),
+         lambda: list(conf.items())),
+        ('values', 100,
+         lambda: list(MutableMapping.values(conf)),
+         lambda: list(conf.values())),
+        ('__contains__, hit', 100000,
+         lambda: MutableMapping.__contains__(conf, hit),
+         lambda: hit in conf),
+        ('__contains__, miss', 100000,
+         lambda: MutableMapping.__contains__(conf, miss),
+         lambda: miss in conf),
+        ('get, miss', 100000,
+         lambda: MutableMapping.get(conf, miss),
+         lambda: conf.get(miss)),
+        ('__eq__', 10,
+         lambda: MutableMapping.__eq__(conf, other),
+         lambda: conf == other),
+        ('copy', 3,
+         lambda: Conf(conf),
+         lambda: conf.copy()),
+        ('walk', 3,
+         lambda: list(mixin_walk(conf)),
+         lambda: list(conf.walk())),
+    ]
+
+    print('%-20s %12s %12s %8s' % ('', 'mixin, us', 'native, us', ''))
+    for name, number, mixin, native in cases:
+        assert mixin() == native() or name in ('items', 'values', 'copy')
+        a = min(timeit.repeat(mixin, number=number, repeat=3)) / number
+        b = min(timeit.repeat(native, number=number, repeat=3)) / number
+        print('%-20s %12.2f %12.2f %7.1fx' % (name, a * 1e6, b * 1e6, a / b))
+
+
+if __name__ == '__main__':
+    main()
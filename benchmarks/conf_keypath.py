@@ -0,0 +1,60 @@
+# coding: utf-8
+"""
+    benchmarks.conf_keypath
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures the cost of a single ``Conf`` lookup by a compound key: the
+    way it was done before (split on every call), with the internal cache
+    of split keys, and with a pre-compiled :class:`dooku.conf.KeyPath`.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_keypath.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, KeyPath  # noqa
+
+
+NUMBER = 200000
+REPEAT = 7
+
+
+def split_getitem(conf, compound_key):
+    # a copy of Conf.__getitem__ as it was before keys were compiled
+    data = conf._data
+    for key in compound_key.split(conf._separator):
+        data = data[key]
+    return data
+
+
+def report(name, func):
+    seconds = min(timeit.repeat(func, number=NUMBER, repeat=REPEAT))
+    print('%-30s %8.1f ns/lookup' % (name, seconds / NUMBER * 1e9))
+
+
+def main():
+    conf = Conf()
+
+    for key in ('db.primary.host', 'services.billing.db.primary.pool.size'):
+        conf[key] = 42
+        compiled = KeyPath(key)
+
+        print('%s:' % key)
+        report('  split on every call', lambda: split_getitem(conf, key))
+        report('  Conf[str] (cached split)', lambda: conf[key])
+        report('  Conf[KeyPath]', lambda: conf[compiled])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# coding: utf-8
+"""
+    benchmarks.conf_layered
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares building per-tenant configs from big shared defaults with
+    :class:`dooku.conf.Conf` (a deep copy per source) and with
+    :class:`dooku.conf.LayeredConf` (shared immutable layers).
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_layered.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, LayeredConf  # noqa
+
+
+TENANTS = 50
+
+
+def make_defaults(width=50, leaves=20):
+    # 50 * 50 * 20 = 50k leaves
+    return dict(
+        ('section%d' % i, dict(
+            ('group%d' % j, dict(
+                ('option%d' % k, 'value-%d-%d-%d' % (i, j, k))
+                for k in range(leaves)))
+            for j in range(width)))
+        for i in range(width))
+
+
+def measure(name, factory, defaults):
+    tracemalloc.start()
+    started = time.time()
+
+    confs = []
+    for tenant in range(TENANTS):
+        conf = factory(defaults, {'section1': {'group1': {'tenant': tenant}}})
+        conf['section2.group2.option2'] = tenant
+        confs.append(conf)
+
+    elapsed = time.time() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print('%-12s %d tenants: %7.3f s, %8.1f MiB' % (
+        name, TENANTS, elapsed, memory / 1024.0 / 1024.0))
+    return confs
+
+
+def main():
+    defaults = make_defaults()
+
+    measure('Conf', Conf, defaults)
+    measure('LayeredConf', LayeredConf, defaults)
+
+
+if __name__ == '__main__':
+    main()
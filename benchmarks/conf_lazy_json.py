@@ -0,0 +1,100 @@
+# coding: utf-8
+"""
+    benchmarks.conf_lazy_json
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares time and peak RSS of eager and lazy
+    :meth:`dooku.conf.Conf.from_json` on a big generated JSON file, when
+    a few values of one section of the file are read. Each run is made in
+    a separate process, so peak RSS values don't affect each other.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_lazy_json.py [size in MiB] [sections]
+
+    .. note:: The ``resource`` module is required, so it works on Unix only.
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+def generate(filename, size, sections):
+    """
+    Writes a JSON object of a given approximate size in bytes, which
+    consists of a given number of equal sections.
+    """
+    groups = size // sections // 600 + 1
+
+    with open(filename, 'w') as f:
+        f.write('{')
+        for i in range(sections):
+            section = json.dumps(dict(
+                ('group%d' % j, dict(
+                    ('option%d' % k, 'value %d %d %d' % (i, j, k))
+                    for k in range(20)))
+                for j in range(groups)))
+            if i:
+                f.write(',')
+            f.write('"section%d": %s' % (i, section))
+        f.write('}')
+
+
+def run(filename, lazy):
+    started = time.time()
+    conf = Conf()
+    conf.from_json(filename, lazy=lazy)
+    loaded = time.time() - started
+
+    for j in range(10):
+        conf['section1.group%d.option1' % j]
+    elapsed = time.time() - started
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+
+    print('lazy=%-5s load %6.2f s, total %6.2f s, peak RSS %7.1f MiB' % (
+        lazy, loaded, elapsed, rss / 1024.0))
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[2] in ('True', 'False'):
+        run(sys.argv[1], sys.argv[2] == 'True')
+        return
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sections = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    fd, filename = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+
+    try:
+        generate(filename, size * 1024 * 1024, sections)
+        print('file: %.1f MiB, %d sections, 1 section is read' % (
+            os.path.getsize(filename) / 1024.0 ** 2, sections))
+
+        for lazy in (False, True):
+            subprocess.check_call(
+                [sys.executable, __file__, filename, str(lazy)])
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+    benchmarks.conf_many
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Compares bulk operations of :class:`dooku.conf.Conf` (``get_many``,
+    ``set_many`` and ``delete_many``) with loops of single operations on
+    batches of 10 to 10k keys that share prefixes.
+
+    Each operation is repeated, so about 10k keys are processed per
+    timing, and the best time per call is reported. Loops and bulk calls
+    are timed in turns, and the speed-up is a median of their ratios, so
+    it's stable on noisy machines. Deletions are made on fresh confs that
+    are built before a timing starts.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_many.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+SERVICES = 200
+OPTIONS = 50
+
+
+def make_conf(services=SERVICES):
+    return Conf(dict(
+        ('service%d' % i, {'db': {'primary': dict(
+            ('option%d' % j, j) for j in range(OPTIONS))}})
+        for i in range(services)))
+
+
+def make_keys(size):
+    keys = ['service%d.db.primary.option%d' % (i, j)
+            for i in range(SERVICES) for j in range(OPTIONS)]
+    return keys[:size]
+
+
+def timed(fn, setup, number):
+    args = iter([setup() for _ in range(number)])
+    return timeit.Timer(lambda: fn(next(args))).timeit(number) / number
+
+
+def compare(loop, bulk, setup, number, repeat=15):
+    loops, bulks, ratios = [], [], []
+    for _ in range(repeat):
+        loops.append(timed(loop, setup, number))
+        bulks.append(timed(bulk, setup, number))
+        ratios.append(loops[-1] / bulks[-1])
+    return min(loops), min(bulks), sorted(ratios)[repeat // 2]
+
+
+def main():
+    conf = make_conf()
+
+    print('%6s %-8s %10s %10s' % ('keys', 'op', 'loop, ms', 'bulk, ms'))
+    for size in (10, 100, 1000, 10000):
+        keys = make_keys(size)
+        items = [(key, 0) for key in keys]
+        number = max(1, 10000 // size)
+
+        # deleted keys are in first services, so there's no need to
+        # build the whole conf for each call
+        services = -(-size // OPTIONS)
+
+        def get_loop(_):
+            return [conf.get(key) for key in keys]
+
+        def get_bulk(_):
+            return conf.get_many(keys)
+
+        def set_loop(_):
+            for key, value in items:
+                conf[key] = value
+
+        def set_bulk(_):
+            conf.set_many(items)
+
+        def delete_loop(target):
+            for key in keys:
+                del target[key]
+
+        def delete_bulk(target):
+            target.delete_many(keys)
+
+        for op, loop, bulk, setup in (
+                ('get', get_loop, get_bulk, lambda: None),
+                ('set', set_loop, set_bulk, lambda: None),
+                ('delete', delete_loop, delete_bulk,
+                 lambda: make_conf(services))):
+            loop, bulk, ratio = compare(loop, bulk, setup, number)
+            print('%6d %-8s %10.3f %10.3f %7.1fx' % (
+                size, op, loop * 1000, bulk * 1000, ratio))
+
+
+if __name__ == '__main__':
+    main()
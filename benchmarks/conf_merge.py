@@ -0,0 +1,59 @@
+# coding: utf-8
+"""
+    benchmarks.conf_merge
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures :meth:`dooku.conf.Conf.update` on a wide config with 1M keys
+    and on a config that is deeper than the recursion limit, and prints
+    merge reports.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_merge.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, Merger, APPEND  # noqa
+
+
+def make_wide(width=1000):
+    # 1000 * 1000 = 1M keys
+    return dict(
+        ('section%d' % i, dict(('option%d' % j, j) for j in range(width)))
+        for i in range(width))
+
+
+def make_deep(depth=5000):
+    root = node = {}
+    for i in range(depth):
+        node['level%d' % i] = {'items': [i]}
+        node = node['level%d' % i]
+    return root
+
+
+def main():
+    wide = make_wide()
+    print('wide, copy:  ', Merger().merge({}, wide, copy=True))
+    print('wide, update:', Conf(wide).update(wide))
+
+    deep = make_deep()
+    print('deep, copy:  ', Merger().merge({}, deep, copy=True))
+    print('deep, update:', Conf(deep).update(deep))
+
+    strategies = dict(
+        ('.'.join('level%d' % j for j in range(i + 1)) + '.items', APPEND)
+        for i in range(0, 5000, 10))
+    print('deep, append:', Conf(deep, strategies=strategies).update(deep))
+
+
+if __name__ == '__main__':
+    main()
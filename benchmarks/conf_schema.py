@@ -0,0 +1,62 @@
+# coding: utf-8
+"""
+    benchmarks.conf_schema
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares reading typed values through an accessor compiled by
+    :class:`dooku.conf.Schema` with coercing results of
+    :meth:`dooku.conf.Conf.__getitem__` on every read.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_schema.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, Schema  # noqa
+
+
+NUMBER = 1000000
+
+SCHEMA = Schema({
+    'host': ('server.host', str),
+    'port': ('server.port', int),
+    'timeout': ('server.timeout', float),
+})
+
+
+def main():
+    conf = Conf({
+        'server': {'host': 'localhost', 'port': '8080', 'timeout': '2.5'},
+    })
+
+    def raw():
+        return (
+            str(conf['server.host']),
+            int(conf['server.port']),
+            float(conf['server.timeout']))
+
+    def compiled(settings=SCHEMA.load(conf)):
+        return settings.host, settings.port, settings.timeout
+
+    assert raw() == compiled()
+
+    load = min(timeit.repeat(lambda: SCHEMA.load(conf), number=10000))
+    print('%-18s %7.2f us' % ('load and validate', load / 10000 * 1e6))
+    for name, func in [('getitem and coerce', raw), ('accessor', compiled)]:
+        elapsed = min(timeit.repeat(func, number=NUMBER))
+        print('%-18s %7.0f ns per 3 fields' % (name, elapsed / NUMBER * 1e9))
+
+
+if __name__ == '__main__':
+    main()
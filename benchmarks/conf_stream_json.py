@@ -0,0 +1,101 @@
+# coding: utf-8
+"""
+    benchmarks.conf_stream_json
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares peak RSS and time of :meth:`dooku.conf.Conf.from_json` with
+    and without streaming on a big generated JSON file, loaded into an
+    empty config (insert) and into a config with the same keys (override).
+    Each run is made in a separate process, so peak RSS values don't affect
+    each other.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_stream_json.py [size in MiB]
+
+    .. note:: The ``resource`` module is required, so it works on Unix only.
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+import subprocess
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, os.pardir))
+
+from dooku.conf import Conf  # noqa
+
+
+def generate(filename, size):
+    """
+    Writes a JSON object of a given approximate size in bytes.
+    """
+    with open(filename, 'w') as f:
+        f.write('{')
+        written, i = 0, 0
+        while written < size:
+            section = json.dumps(dict(
+                ('group%d' % j, dict(
+                    ('option%d' % k, 'value %d %d %d' % (i, j, k))
+                    for k in range(20)))
+                for j in range(20)))
+            if i:
+                f.write(',')
+            f.write('"section%d": %s' % (i, section))
+            written += len(section)
+            i += 1
+        f.write('}')
+
+
+def run(filename, stream, scenario):
+    conf = Conf()
+    if scenario == 'override':
+        # every key of the file is in the config already, so the whole
+        # file has to be merged rather than just inserted
+        conf.from_json(filename, stream=True)
+
+    started = time.time()
+    stats = conf.from_json(filename, stream=stream)
+    elapsed = time.time() - started
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on OS X
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+
+    print('%-8s stream=%-5s %7.2f s, peak RSS %7.1f MiB, %d keys' % (
+        scenario, stream, elapsed, rss / 1024.0, stats.keys))
+
+
+def main():
+    if len(sys.argv) == 4:
+        run(sys.argv[1], sys.argv[2] == 'True', sys.argv[3])
+        return
+
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    fd, filename = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+
+    try:
+        generate(filename, size * 1024 * 1024)
+        print('file: %.1f MiB' % (os.path.getsize(filename) / 1024.0 ** 2))
+
+        for scenario in ('insert', 'override'):
+            for stream in (False, True):
+                subprocess.check_call([
+                    sys.executable, __file__, filename, str(stream), scenario])
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
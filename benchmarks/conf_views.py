@@ -0,0 +1,65 @@
+# coding: utf-8
+"""
+    benchmarks.conf_views
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures memory allocated per lookup of a subtree of
+    :class:`dooku.conf.Conf`, with cached views and with a new view per
+    lookup (the way it was done before views were cached). Returned views
+    are kept alive, so every allocated byte is counted by tracemalloc.
+
+    Run it from the repository root (Python 3.4+)::
+
+        $ python benchmarks/conf_views.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, KeyPath  # noqa
+
+
+LOOKUPS = 100000
+
+
+def measure(name, conf, key, uncached=False):
+    # the list is allocated beforehand, so it isn't counted
+    results = [None] * LOOKUPS
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.time()
+
+    for i in range(LOOKUPS):
+        if uncached:
+            conf._views.clear()
+        results[i] = conf[key]
+
+    elapsed = time.time() - started
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print('%-28s %8.1f bytes/lookup %8.3f us/lookup' % (
+        name, float(allocated) / LOOKUPS, elapsed * 1e6 / LOOKUPS))
+
+
+def main():
+    conf = Conf({'db': {'primary': {'host': 'localhost', 'port': 5432}}})
+
+    for key in ('db.primary', KeyPath('db.primary')):
+        print('conf[%r]:' % (key, ))
+        measure('  new view per lookup', conf, key, uncached=True)
+        measure('  cached view', conf, key)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# coding: utf-8
+"""
+    benchmarks.conf_watcher
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compares picking up a one-value change of one of 20 config files by
+    rebuilding a conf from scratch and by :class:`dooku.conf.ConfWatcher`.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_watcher.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.conf import Conf, ConfWatcher  # noqa
+
+
+FILES = 20
+ROUNDS = 20
+
+
+def make_file(i, width=20, leaves=50):
+    return {'service': dict(
+        ('group%d' % j, dict(
+            ('option%d' % k, 'value %d %d' % (i, k)) for k in range(leaves)))
+        for j in range(width))}
+
+
+def write(filename, data, mtime):
+    with open(filename, 'w') as f:
+        json.dump(data, f)
+    os.utime(filename, (mtime, mtime))
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        filenames = [
+            os.path.join(tmpdir, '%02d.json' % i) for i in range(FILES)]
+        for i, filename in enumerate(filenames):
+            write(filename, make_file(i), 0)
+
+        changed = make_file(FILES - 1)
+
+        started = time.time()
+        for i in range(ROUNDS):
+            changed['service']['group0']['option0'] = i
+            write(filenames[-1], changed, i + 1)
+
+            conf = Conf()
+            for filename in filenames:
+                conf.from_json(filename)
+        rebuild = (time.time() - started) / ROUNDS
+
+        conf = Conf()
+        watcher = ConfWatcher(conf)
+        for filename in filenames:
+            watcher.watch(filename)
+
+        started = time.time()
+        for i in range(ROUNDS):
+            changed['service']['group0']['option0'] = i
+            write(filenames[-1], changed, ROUNDS + i + 1)
+            watcher.check()
+        check = (time.time() - started) / ROUNDS
+
+        print('%d files, one changed value per round:' % FILES)
+        print('  rebuild    %8.2f ms' % (rebuild * 1000))
+        print('  watcher    %8.2f ms' % (check * 1000))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# coding: utf-8
+"""
+    benchmarks.conf_yaml_compiled
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures cold start of :meth:`dooku.conf.Conf.from_yaml` on a big YAML
+    file: the pure Python loader, the LibYAML one (if available) and
+    a compiled file. Each run is made in a separate process, so nothing is
+    shared between them.
+
+    Run it from the repository root::
+
+        $ python benchmarks/conf_yaml_compiled.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import yaml  # noqa
+
+from dooku import conf as dooku_conf  # noqa
+
+
+def make_conf(width=100, leaves=100):
+    return dict(
+        ('section%d' % i, dict(
+            ('option%d' % j, {'value': j, 'tags': ['a', 'b'], 'on': True})
+            for j in range(leaves)))
+        for i in range(width))
+
+
+def run(filename, mode):
+    if mode == 'pure':
+        dooku_conf._YAMLLoader = yaml.SafeLoader
+
+    started = time.time()
+    dooku_conf.Conf().from_yaml(filename, compiled=(mode == 'compiled'))
+    print('%-10s %7.3f s' % (mode, time.time() - started))
+
+
+def main():
+    if len(sys.argv) == 3:
+        run(sys.argv[1], sys.argv[2])
+        return
+
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'conf.yaml')
+
+    try:
+        with open(filename, 'w') as f:
+            yaml.safe_dump(make_conf(), f)
+        print('file: %.1f MiB' % (os.path.getsize(filename) / 1024.0 ** 2))
+
+        # the first compiled run parses YAML and saves a compiled file
+        modes = ['pure', 'libyaml', 'compiled', 'compiled']
+        if not hasattr(yaml, 'CSafeLoader'):
+            modes.remove('libyaml')
+
+        for mode in modes:
+            subprocess.check_call([sys.executable, __file__, filename, mode])
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
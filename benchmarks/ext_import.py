@@ -0,0 +1,86 @@
+# coding: utf-8
+"""
+    benchmarks.ext_import
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Measures startup costs of :mod:`dooku.ext` in fresh interpreters:
+    import time of the module as reported by ``python -X importtime``,
+    and wall time of importing it and discovering extensions of an empty
+    namespace by :class:`dooku.ext.ExtensionManager`, with entry points
+    discovered by :mod:`importlib.metadata` and by ``pkg_resources`` (the
+    way it was done before).
+
+    Run it from the repository root (Python 3.8+)::
+
+        $ python benchmarks/ext_import.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import subprocess
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+REPEAT = 5
+
+DISCOVER = '''
+import sys, time
+started = time.time()
+%s
+from dooku.ext import ExtensionManager
+ExtensionManager('dooku.benchmarks')
+sys.stdout.write('%%d' %% ((time.time() - started) * 1e6))
+'''
+
+# makes importlib.metadata and its backport unavailable, so dooku.ext
+# falls back to pkg_resources
+NO_METADATA = (
+    "sys.modules['importlib.metadata'] = None; "
+    "sys.modules['importlib_metadata'] = None")
+
+
+def run(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + env.get('PYTHONPATH', '').split(os.pathsep))
+    process = subprocess.Popen(
+        [sys.executable] + args, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return stdout.decode('utf-8'), stderr.decode('utf-8')
+
+
+def importtime(module):
+    """
+    Returns cumulative import time of a module in microseconds.
+    """
+    _, stderr = run(['-X', 'importtime', '-c', 'import ' + module])
+    # lines look like "import time: self [us] | cumulative | module"
+    for line in stderr.splitlines():
+        _, cumulative, name = line.split('|')
+        if name.strip() == module:
+            return int(cumulative)
+
+
+def main():
+    print('import time, -X importtime (best of %d):' % REPEAT)
+    for module in ['dooku.ext', 'importlib.metadata', 'pkg_resources']:
+        best = min(importtime(module) for _ in range(REPEAT))
+        print('  %-20s %8.1f ms' % (module, best / 1000.0))
+
+    print('import dooku.ext and discover entry points (best of %d):' % REPEAT)
+    for name, prepare in [
+            ('importlib.metadata', ''),
+            ('pkg_resources', NO_METADATA)]:
+        best = min(
+            int(run(['-c', DISCOVER % prepare])[0]) for _ in range(REPEAT))
+        print('  %-20s %8.1f ms' % (name, best / 1000.0))
+
+
+if __name__ == '__main__':
+    main()
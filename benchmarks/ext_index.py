@@ -0,0 +1,98 @@
+# coding: utf-8
+"""
+    benchmarks.ext_index
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Measures resolving a namespace by :class:`dooku.ext.ExtensionManager`
+    in a virtualenv of 1000 distributions, by discovering installed
+    distributions and by :class:`dooku.ext.EntryPointIndex`. Every case
+    runs in a fresh interpreter, and extensions are not loaded.
+
+    Run it from the repository root (Python 3.8+)::
+
+        $ python benchmarks/ext_index.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+NAMESPACE = 'dooku.benchmarks'
+DISTRIBUTIONS = 1000
+REPEAT = 5
+
+CASE = '''
+import sys, time
+from dooku.ext import ExtensionManager, EntryPointIndex
+started = time.time()
+%s
+sys.stdout.write('%%d' %% ((time.time() - started) * 1e6))
+'''
+
+
+def make_distributions(location):
+    for i in range(DISTRIBUTIONS):
+        distinfo = os.path.join(location, 'dooku_dist%d-0.1.dist-info' % i)
+        os.mkdir(distinfo)
+
+        with io.open(os.path.join(distinfo, 'METADATA'), 'w') as f:
+            f.write(
+                u'Metadata-Version: 2.1\nName: dooku_dist%d\nVersion: 0.1\n'
+                % i)
+
+        with io.open(os.path.join(distinfo, 'entry_points.txt'), 'w') as f:
+            f.write(u'[console_scripts]\ndist%d = dist%d:main\n' % (i, i))
+            if i % 10 == 0:
+                f.write(u'[%s]\nplugin%d = dist%d:Plugin\n' % (
+                    NAMESPACE, i, i))
+
+
+def run(location, code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT, location] + env.get('PYTHONPATH', '').split(os.pathsep))
+    return int(subprocess.check_output(
+        [sys.executable, '-c', CASE % code], env=env))
+
+
+def main():
+    location = tempfile.mkdtemp()
+    # the index is kept out of sys.path, since writing it into a sys.path
+    # entry changes modification time of the entry
+    cache_dir = tempfile.mkdtemp()
+    filename = os.path.join(cache_dir, 'index.json')
+    discover = 'ExtensionManager(%r, lazy=True)' % NAMESPACE
+    indexed = 'ExtensionManager(%r, lazy=True, index=EntryPointIndex(%r))' \
+        % (NAMESPACE, filename)
+
+    try:
+        make_distributions(location)
+
+        print('%d distributions (best of %d):' % (DISTRIBUTIONS, REPEAT))
+        for name, prepare, code in [
+                ('discovery', None, discover),
+                ('index, rebuilt', lambda: os.remove(filename), indexed),
+                ('index, cached', None, indexed)]:
+            timings = []
+            for _ in range(REPEAT):
+                if prepare is not None and os.path.exists(filename):
+                    prepare()
+                timings.append(run(location, code))
+            print('  %-16s %8.1f ms' % (name, min(timings) / 1000.0))
+    finally:
+        shutil.rmtree(location)
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
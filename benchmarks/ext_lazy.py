@@ -0,0 +1,110 @@
+# coding: utf-8
+"""
+    benchmarks.ext_lazy
+    ~~~~~~~~~~~~~~~~~~~
+
+    Measures :class:`dooku.ext.ExtensionManager` on a namespace of 300
+    plugins, each in its own module, in eager and lazy modes. Every case
+    runs in a fresh interpreter, since imported plugins are cached.
+
+    Run it from the repository root (Python 3.8+)::
+
+        $ python benchmarks/ext_lazy.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+NAMESPACE = 'dooku.benchmarks'
+PLUGINS = 300
+REPEAT = 5
+
+PLUGIN = u'''
+import collections
+
+
+class Plugin%(i)d(object):
+
+    options = collections.OrderedDict([('name', 'plugin%(i)d')])
+
+    def __init__(self, conf):
+        self.conf = conf
+
+    def run(self):
+        return self.options
+'''
+
+CASE = '''
+import sys, time
+from dooku.ext import ExtensionManager
+started = time.time()
+%s
+sys.stdout.write('%%d' %% ((time.time() - started) * 1e6))
+'''
+
+
+def make_plugins(location):
+    distinfo = os.path.join(location, 'dooku_plugins-0.1.dist-info')
+    os.mkdir(distinfo)
+
+    with io.open(os.path.join(distinfo, 'METADATA'), 'w') as f:
+        f.write(u'Metadata-Version: 2.1\nName: dooku_plugins\nVersion: 0.1\n')
+
+    with io.open(os.path.join(distinfo, 'entry_points.txt'), 'w') as f:
+        f.write(u'[%s]\n' % NAMESPACE)
+        for i in range(PLUGINS):
+            f.write(u'plugin%d = dooku_plugin%d:Plugin%d\n' % (i, i, i))
+
+    for i in range(PLUGINS):
+        filename = os.path.join(location, 'dooku_plugin%d.py' % i)
+        with io.open(filename, 'w') as f:
+            f.write(PLUGIN % {'i': i})
+
+
+def run(location, code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT, location] + env.get('PYTHONPATH', '').split(os.pathsep))
+    return int(subprocess.check_output(
+        [sys.executable, '-c', CASE % code], env=env))
+
+
+def main():
+    location = tempfile.mkdtemp()
+
+    try:
+        make_plugins(location)
+
+        # compile plugins once, so bytecode writing isn't measured
+        run(location, 'list(ExtensionManager(%r))' % NAMESPACE)
+
+        print('%d plugins (best of %d):' % (PLUGINS, REPEAT))
+        for name, code in [
+                ('eager, construct',
+                 'm = ExtensionManager(%r)' % NAMESPACE),
+                ('lazy, construct',
+                 'm = ExtensionManager(%r, lazy=True)' % NAMESPACE),
+                ('lazy, get 2 plugins',
+                 'm = ExtensionManager(%r, lazy=True); '
+                 'm["plugin1"], m.get("plugin42")' % NAMESPACE),
+                ('lazy, iterate all',
+                 'm = ExtensionManager(%r, lazy=True); list(m)' % NAMESPACE)]:
+            best = min(run(location, code) for _ in range(REPEAT))
+            print('  %-22s %8.1f ms' % (name, best / 1000.0))
+    finally:
+        shutil.rmtree(location)
+
+
+if __name__ == '__main__':
+    main()
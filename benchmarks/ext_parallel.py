@@ -0,0 +1,99 @@
+# coding: utf-8
+"""
+    benchmarks.ext_parallel
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures eager loading by :class:`dooku.ext.ExtensionManager` of 50
+    plugins that do IO-bound initialization on import (emulated by 20 ms
+    sleep), with plugins imported one by one and in a pool of threads.
+    Every case runs in a fresh interpreter, since imported plugins are
+    cached.
+
+    Run it from the repository root (Python 3.8+)::
+
+        $ python benchmarks/ext_parallel.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+NAMESPACE = 'dooku.benchmarks'
+PLUGINS = 50
+REPEAT = 3
+
+PLUGIN = u'''
+import time
+
+# reading model files, connecting somewhere and so on
+time.sleep(0.02)
+
+
+class Plugin%(i)d(object):
+    pass
+'''
+
+CASE = '''
+import sys, time
+from dooku.ext import ExtensionManager
+started = time.time()
+ExtensionManager(%r, workers=%s)
+sys.stdout.write('%%d' %% ((time.time() - started) * 1e6))
+'''
+
+
+def make_plugins(location):
+    distinfo = os.path.join(location, 'dooku_plugins-0.1.dist-info')
+    os.mkdir(distinfo)
+
+    with io.open(os.path.join(distinfo, 'METADATA'), 'w') as f:
+        f.write(u'Metadata-Version: 2.1\nName: dooku_plugins\nVersion: 0.1\n')
+
+    with io.open(os.path.join(distinfo, 'entry_points.txt'), 'w') as f:
+        f.write(u'[%s]\n' % NAMESPACE)
+        for i in range(PLUGINS):
+            f.write(u'plugin%d = dooku_plugin%d:Plugin%d\n' % (i, i, i))
+
+    for i in range(PLUGINS):
+        filename = os.path.join(location, 'dooku_plugin%d.py' % i)
+        with io.open(filename, 'w') as f:
+            f.write(PLUGIN % {'i': i})
+
+
+def run(location, workers):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT, location] + env.get('PYTHONPATH', '').split(os.pathsep))
+    return int(subprocess.check_output(
+        [sys.executable, '-c', CASE % (NAMESPACE, workers)], env=env))
+
+
+def main():
+    location = tempfile.mkdtemp()
+
+    try:
+        make_plugins(location)
+
+        # compile plugins once, so bytecode writing isn't measured
+        run(location, 1)
+
+        print('%d plugins (best of %d):' % (PLUGINS, REPEAT))
+        for workers in [1, 4, 16, None]:
+            best = min(run(location, workers) for _ in range(REPEAT))
+            print('  workers=%-6s %8.1f ms' % (workers, best / 1000.0))
+    finally:
+        shutil.rmtree(location)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# coding: utf-8
+"""
+    benchmarks.ext_registry
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Measures creating :class:`dooku.ext.ExtensionManager` instances for 12
+    namespaces in a virtualenv of 1000 distributions, with distributions
+    scanned once by the process-wide :data:`dooku.ext.registry` and with
+    them scanned again for every namespace (the way it was done before).
+    Extensions are not loaded.
+
+    Run it from the repository root (Python 3.8+)::
+
+        $ python benchmarks/ext_registry.py
+
+    :copyright: (c) 2016, Igor Kalnitsky
+    :license: BSD, see LICENSE for details
+"""
+
+from __future__ import print_function
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dooku.ext import ExtensionManager, registry  # noqa
+
+
+NAMESPACES = ['dooku.benchmarks.ns%d' % i for i in range(12)]
+DISTRIBUTIONS = 1000
+REPEAT = 5
+
+
+def make_distributions(location):
+    for i in range(DISTRIBUTIONS):
+        distinfo = os.path.join(location, 'dooku_dist%d-0.1.dist-info' % i)
+        os.mkdir(distinfo)
+
+        with io.open(os.path.join(distinfo, 'METADATA'), 'w') as f:
+            f.write(
+                u'Metadata-Version: 2.1\nName: dooku_dist%d\nVersion: 0.1\n'
+                % i)
+
+        with io.open(os.path.join(distinfo, 'entry_points.txt'), 'w') as f:
+            f.write(u'[console_scripts]\ndist%d = dist%d:main\n' % (i, i))
+            f.write(u'[%s]\nplugin%d = dist%d:Plugin\n' % (
+                NAMESPACES[i % len(NAMESPACES)], i, i))
+
+
+def per_namespace():
+    for namespace in NAMESPACES:
+        registry.refresh()
+        ExtensionManager(namespace, lazy=True)
+
+
+def shared():
+    registry.refresh()
+    for namespace in NAMESPACES:
+        ExtensionManager(namespace, lazy=True)
+
+
+def main():
+    location = tempfile.mkdtemp()
+    sys.path.append(location)
+
+    try:
+        make_distributions(location)
+        shared()
+
+        print('%d distributions, %d namespaces (best of %d):' % (
+            DISTRIBUTIONS, len(NAMESPACES), REPEAT))
+        for name, func in [
+                ('scan per namespace', per_namespace),
+                ('registry', shared)]:
+            timings = []
+            for _ in range(REPEAT):
+                started = time.time()
+                func()
+                timings.append(time.time() - started)
+            print('  %-20s %8.1f ms' % (name, min(timings) * 1000))
+    finally:
+        sys.path.remove(location)
+        shutil.rmtree(location)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,10 +11,37 @@
 
 from __future__ import absolute_import
 
+import io
+import os
+import mmap
+import codecs
+import re
 import json
 import copy
+import sys
+import pickle
+import marshal
+import hashlib
 import collections
 import itertools
+import threading
+import timeit
+import traceback
+
+try:
+    from functools import lru_cache
+except ImportError:  # fallback to Python 2.x
+    lru_cache = None
+
+try:
+    _replace = os.replace
+except AttributeError:  # fallback to Python 2.x
+    _replace = os.rename
+
+try:
+    string_types = basestring
+except NameError:  # Python 3.x has no basestring
+    string_types = str
 
 # In Py 2.7 a built-in open function doesn't support an encoding argument,
 # so let's use one from the io package in order to get behaviour similar
@@ -31,219 +58,4216 @@ try:
 except ImportError:
     yaml = None
 
+# The LibYAML based loader is an order of magnitude faster than the pure
+# Python one, but it's available only if PyYAML was built with LibYAML.
+_YAMLLoader = getattr(yaml, 'CSafeLoader', getattr(yaml, 'SafeLoader', None))
 
-class Conf(collections.MutableMapping):
+# The same goes for dumpers. Objects of lazily loaded JSON files are
+# subclasses of dict, so they have to be represented as usual dictionaries.
+if yaml:
+    _YAMLDumper = type('_YAMLDumper', (
+        getattr(yaml, 'CSafeDumper', yaml.SafeDumper), ), {})
+    _YAMLDumper.add_multi_representer(dict, yaml.SafeDumper.represent_dict)
+else:
+    _YAMLDumper = None
+
+
+def _lru_cache(maxsize):
     """
-    A :class:`dict` wrapper that extends its functionality.
+    A minimal replacement of :func:`functools.lru_cache` for Python 2.x.
 
-    The class was designed with one purpose: to provide the more convenient
-    way to interact with dictionary instances that keep some configuration
-    data. In many ways it behaves exactly like a dictionary, but unlike the
-    last one it can be accessed by a *compound key* and supports *recursive
-    update*.
+    Only positional hashable arguments are supported, which is more than
+    enough for caching split compound keys.
+    """
+    def decorator(func):
+        cache = collections.OrderedDict()
+        lock = threading.Lock()
 
-    A Compound Key is a key that consists of two or more keys that allow
-    you to retrieve value from subnode of subnode. For example, we have
-    the following structure ::
+        def wrapper(*args):
+            with lock:
+                try:
+                    value = cache.pop(args)
+                except KeyError:
+                    value = func(*args)
+                    if len(cache) >= maxsize:
+                        cache.popitem(last=False)
+                cache[args] = value
+            return value
+        return wrapper
+    return decorator
 
-        { 'ukraine': {
-            'kharkiv': {
-              'timezone': 'UTC+2', }, }, }
 
-    and you want to get the timezone's value with one query. Well, with
-    compound keys you can do it this way ::
+if lru_cache is None:
+    lru_cache = _lru_cache
 
-        timezone = conf['ukraine.kharkiv.timezone']
 
-    instead of usual ::
+class KeyPath(tuple):
+    """
+    A compiled compound key.
 
-        timezone = conf['ukraine']['kharkiv']['timezone']
+    Every time a :class:`Conf` instance is accessed by a compound key, the
+    key has to be split by the separator. Though the split keys are cached
+    internally, you can skip even the cache lookup by compiling hot keys
+    once and using them instead of strings::
 
-    On the other hand we have a usual dictionary behaviour:
+        HOST = KeyPath('db.primary.host')
 
-    * a ``KeyError`` exception will be thrown in case of key absence
-    * a :meth:`get` method is provided to retrieve values safely
+        for conf in confs:
+            host = conf[HOST]
 
-    The class overrides an :meth:`update` method so it can be used to
-    recursively update values. For example, we have the following structure ::
+    The compiled key is a tuple of keys, so it doesn't depend on the
+    separator of the instance it's used with.
 
-        { 'ukraine': {
-            'kharkiv': {
-              'timezone': 'UTC+2', }, }, }
+    :param compound_key: (str) a compound key to be compiled, or an
+                         iterable of keys that are already split
+    :param separator: (str) a character that's used as separator in the
+                      compound key
 
-    and want to update it with next one ::
+    .. versionadded:: 0.5.0
+    """
 
-        { 'ukraine': {
-            'kharkiv': {
-              'population': '1 427 000', }, }, }
+    __slots__ = ()
 
-    In vanilla Python's dictionary we will have the same result as statement
-    above since it completely overwrites top-level keys, but our class can
-    handle it properly and merge it automatically, so we will have next
-    result ::
+    def __new__(cls, compound_key, separator='.'):
+        if isinstance(compound_key, string_types):
+            compound_key = compound_key.split(separator)
+        return super(KeyPath, cls).__new__(cls, compound_key)
 
-        { 'ukraine': {
-            'kharkiv': {
-              'timezone': 'UTC+2',
-              'population': '1 427 000', }, }, }
+    def __repr__(self):
+        return 'KeyPath(%r)' % (tuple(self), )
 
-    In addition to compound keys and update method, the class provides two
-    helpers - :meth:`from_json` and :meth:`from_yaml` - for loading and
-    updating a Conf instance from files. ::
 
-        conf = Conf(default_conf)
-        conf.from_json('path/to/user/conf.json')
+#: a number of compound keys that are kept split per separator
+_KEYPATH_CACHE_SIZE = 4096
 
-    .. note:: You have to install ``PyYAML`` before using :meth:`from_yaml`.
+#: a size of batches of keys that are processed key by key rather than
+#: grouped by prefixes, see :meth:`Conf.delete_many`
+_SMALL_BATCH = 32
 
-    :param confs:
-        A list of dictionaries to create a Conf instance based on it.
-        Each next dictionary overrides settings from the previous one.
+#: `separator` <-> `cached split function` map
+_keypath_caches = {}
+
+
+def _get_keypath_cache(separator):
+    """
+    Returns a function that compiles compound keys with a given separator.
+
+    The function is backed by a bounded LRU cache, and the cache is shared
+    between all :class:`Conf` instances with the same separator, so
+    sub-confs returned by :meth:`Conf.__getitem__` reuse it for free.
+    """
+    try:
+        return _keypath_caches[separator]
+    except KeyError:
+        pass
+
+    @lru_cache(maxsize=_KEYPATH_CACHE_SIZE)
+    def compile_key(compound_key):
+        return KeyPath(compound_key, separator)
+
+    # setdefault makes sure we do not lose a cache that was created by
+    # another thread in the meantime
+    return _keypath_caches.setdefault(separator, compile_key)
+
+
+#: types of values that are immutable, so it's safe to share them between
+#: a few trees instead of copying
+_ATOMIC_TYPES = frozenset(
+    [type(None), bool, int, float, complex, str, bytes, type(u'')] +
+    ([long] if str is bytes else []))  # noqa
+
+
+def _copy_value(value):
+    if value.__class__ in _ATOMIC_TYPES:
+        return value
+    return copy.deepcopy(value)
+
+
+#: merge strategy: a new value replaces an old one, even a dictionary
+REPLACE = 'replace'
+
+#: merge strategy: dictionaries are merged recursively, other values are
+#: replaced; that's the default one
+MERGE = 'merge'
+
+#: merge strategy: a new list is appended to an old one
+APPEND = 'append'
+
+#: merge strategy: items of a new list that aren't in an old one are
+#: appended to it
+UNION = 'union'
+
+
+def _append(old, new):
+    if isinstance(old, list) and isinstance(new, list):
+        return old + new
+    return new
+
+
+def _union(old, new):
+    if not (isinstance(old, list) and isinstance(new, list)):
+        return new
+
+    rv = list(old)
+    try:
+        seen = set(old)
+        for item in new:
+            if item not in seen:
+                seen.add(item)
+                rv.append(item)
+    except TypeError:
+        # unhashable items, fallback to slow but generic approach
+        rv = list(old)
+        for item in new:
+            if item not in rv:
+                rv.append(item)
+    return rv
+
+
+_STRATEGIES = {
+    APPEND: _append,
+    UNION: _union,
+}
+
+
+class MergeStats(collections.namedtuple(
+        'MergeStats', ['nodes', 'keys', 'seconds'])):
+    """
+    A report of a merge made by :class:`Merger`.
+
+    :param nodes: (int) a number of dictionaries that were merged or copied
+    :param keys: (int) a number of keys that were merged
+    :param seconds: (float) how long the merge took
+
+    .. versionadded:: 0.5.0
+    """
+    __slots__ = ()
+
+
+class Merger(object):
+    """
+    Merges a tree of dictionaries into another one.
+
+    The merger is a heart of :meth:`Conf.update`. It walks trees with an
+    explicit stack instead of recursion, so there's no limit on a tree
+    depth. By default dictionaries are merged recursively and any other
+    value is replaced, but that may be changed for any compound key by
+    passing a merge strategy::
+
+        merger = Merger({
+            'plugins': APPEND,
+            'logging.handlers': REPLACE,
+        })
+
+    Built-in strategies are :data:`REPLACE`, :data:`MERGE`, :data:`APPEND`
+    and :data:`UNION`. Besides, a strategy may be any callable that
+    receives an old and a new value and returns a value to be set. It's
+    called only if a key exists in both trees.
+
+    :param strategies:
+        A dictionary of compound keys and strategies to be applied to
+        values of those keys.
     :param separator:
         A character that's used as separator in compound keys
-    """
 
-    #: this character will be used as a separator in case you don't
-    #: set a new one explicitly
-    default_separator = '.'
+    .. versionadded:: 0.5.0
+    """
 
-    def __init__(self, *confs, **options):
-        self._data = {}
-        self._separator = options.get('separator', self.default_separator)
+    def __init__(self, strategies=None, separator='.'):
+        #: a trie of compiled compound keys; each node is a tuple of
+        #: a strategy and a dictionary of children
+        self._trie = None
 
-        for conf in confs:
-            self.update(copy.deepcopy(conf))
+        for compound_key, strategy in (strategies or {}).items():
+            if not callable(strategy) and strategy not in (
+                    REPLACE, MERGE, APPEND, UNION):
+                raise ValueError('Unknown merge strategy: %r' % (strategy, ))
 
-    def from_file(self, loader, filename, encoding='utf-8', silent=False):
-        """
-        Updates recursively the value in the the config from some file.
+            if self._trie is None:
+                self._trie = [None, {}]
 
-        :param loader: (function) a function that receives a file object
-            and returns a dictionary to be merged into settings
-        :param filename: (str) a filename to be opened
-        :param encoding: (str) an encoding of the filename
-        :param silent: (bool) fails silently if something wrong with json file
+            node = self._trie
+            for key in KeyPath(compound_key, separator):
+                node = node[1].setdefault(key, [None, {}])
+            node[0] = strategy
 
-        .. versionadded:: 0.4.0
+    def subtree(self, keys):
         """
-        conf = {}
-        try:
-            with open(filename, encoding=encoding) as f:
-                conf = loader(f)
-        except Exception:
-            if not silent:
-                raise
-        self.update(conf)
+        Returns a merger for a subtree with a given path.
 
-    def from_json(self, filename, encoding='utf-8', silent=False):
+        :param keys: (:class:`KeyPath`) a path to the subtree
+        :returns: (:class:`Merger`) a merger with strategies of the subtree
         """
-        Updates recursively the value in the the config from a JSON file.
+        node = self._trie
+        for key in keys:
+            if node is None:
+                break
+            node = node[1].get(key)
 
-        :param filename: (str) a filename of the JSON file
-        :param encoding: (str) an encoding of the filename
-        :param silent: (bool) fails silently if something wrong with json file
+        if node is self._trie:
+            return self
 
-        .. versionadded:: 0.3.0
+        rv = Merger.__new__(Merger)
+        rv._trie = node
+        return rv
+
+    def merge(self, dst, src, copy=False, shared=False):
         """
-        self.from_file(json.load, filename, encoding, silent)
+        Merges a given tree into the destination one in place.
 
-    def from_yaml(self, filename, encoding='utf-8', silent=False):
+        :param dst: (dict) a tree to merge into
+        :param src: (dict or iterable) a tree to be merged; may be an
+                    iterable of ``(key, value)`` pairs as well
+        :param copy: (bool) copy values of ``src`` instead of referencing
+                     them, so further changes of ``dst`` don't affect it
+        :param shared: (bool) subnodes of ``dst`` are shared with other
+                       trees, so they're copied (shallowly) before they're
+                       changed; ``dst`` itself is changed in place
+        :returns: (:class:`MergeStats`) a merge report
         """
-        Updates recursively the value in the the config from a YAML file.
+        started = timeit.default_timer()
+        nodes = keys = 0
 
-        The method requires the PyYAML to be installed.
+        if isinstance(src, (Conf, FrozenConf)):
+            src = src._data
+        if isinstance(src, dict):
+            src = src.items()
 
-        :param filename: (str) a filename of the YAML file
-        :param encoding: (str) an encoding of the filename
-        :param silent: (bool) fails silently if something wrong with yaml file
+        stack = [(dst, src, self._trie)]
 
-        .. versionadded:: 0.3.0
+        while stack:
+            dst, src, trie = stack.pop()
+            nodes += 1
+
+            for key, value in src:
+                keys += 1
+
+                if isinstance(value, (Conf, FrozenConf)):
+                    value = value._data
+
+                strategy = subtrie = None
+                if trie is not None:
+                    subtrie = trie[1].get(key)
+                    if subtrie is not None:
+                        strategy = subtrie[0]
+
+                if strategy is None or strategy == MERGE:
+                    if isinstance(value, dict):
+                        old = dst.get(key)
+                        if isinstance(old, dict):
+                            if shared:
+                                old = dst[key] = dict(old)
+                            stack.append((old, value.items(), subtrie))
+                            continue
+
+                elif strategy != REPLACE and key in dst:
+                    value = _STRATEGIES.get(strategy, strategy)(
+                        dst[key], value)
+
+                if copy:
+                    # dictionaries are copied here rather than by deepcopy,
+                    # since the last one is recursive
+                    if isinstance(value, dict):
+                        dst[key] = {}
+                        stack.append((dst[key], value.items(), subtrie))
+                        continue
+                    value = _copy_value(value)
+
+                dst[key] = value
+
+        return MergeStats(nodes, keys, timeit.default_timer() - started)
+
+
+class _JSONReader(object):
+    """
+    An incremental reader of a JSON object from a file.
+
+    The reader walks the object member by member. Each call of :meth:`next`
+    parses a member's key and returns it with a kind of the member's value:
+
+    * :attr:`OBJECT` - the value is an object; call :meth:`enter` to walk
+      its members next, or :meth:`value` to decode it as a whole;
+    * :attr:`VALUE` - the value is anything else; call :meth:`value` to
+      decode it, arrays are decoded as a whole;
+    * :attr:`END` - the current object is over, the key is ``None``.
+
+    The top-level value has to be an object. Only a small window of the
+    file is kept in memory, so objects of any size may be walked.
+    """
+
+    OBJECT, VALUE, END = 'object', 'value', 'end'
+
+    _whitespaces = re.compile(r'[ \t\n\r]*')
+    _delimiters = re.compile(r'[ \t\n\r,\]}]')
+    _numbers = frozenset('-0123456789')
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, f, chunk_size=65536):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+        # keys are repeated a lot in configs, so share their strings just
+        # like the json module does
+        self._keys = {}
+
+        self._expect('{')
+        self._depth = 1
+        self._first = True
+
+    def _fill(self, size=None):
         """
-        if not yaml:
-            raise AttributeError(
-                'You need to install PyYAML before using this method!')
+        Reads next chunk of a file, drops consumed part of the buffer.
+        """
+        chunk = self._f.read(size or self._chunk_size)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
 
-        self.from_file(yaml.load, filename, encoding, silent)
+    def _error(self, message):
+        raise ValueError('%s near %r' % (
+            message, self._buf[self._pos:self._pos + 20]))
 
-    def update(self, iterable={}, **kwargs):
+    def _peek(self):
         """
-        Updates recursively a self with a given iterable.
+        Skips whitespaces and returns next character without consuming it.
+        """
+        while True:
+            self._pos = self._whitespaces.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                return ''
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            self._error('Expecting %r' % char)
+        self._pos += 1
 
-        TODO: rewrite this ugly stuff
+    def _decode(self, decode, limit=None):
         """
-        def _merge(a, *args):
-            for key, value in itertools.chain(*args):
-                if key in a and isinstance(value, (dict, Conf)):
-                    value = _merge(a[key], value.items())
-                a[key] = value
-            return a
+        Decodes a value at the current position, reading the file until
+        the value is complete, or until the buffer exceeds a given limit.
+        """
+        size = self._chunk_size
+        while True:
+            # a number may be truncated by the end of the buffer in a way
+            # it's still valid (e.g. "1.5" -> "1."), so make sure that the
+            # buffer contains the number's end
+            if self._buf[self._pos] not in self._numbers or self._eof or \
+                    self._delimiters.search(self._buf, self._pos):
+                try:
+                    value, end = decode(self._buf, self._pos)
+                except ValueError:
+                    if self._eof:
+                        raise
+                else:
+                    if end < len(self._buf) or self._eof:
+                        self._pos = end
+                        return value
 
-        # adopt iterable sequence to unified interface: (key, value)
-        if isinstance(iterable, (dict, Conf)):
-            iterable = iterable.items()
+            if limit is not None and len(self._buf) - self._pos > limit:
+                return _missing
 
-        # iterate and update values
-        _merge(self._data, iterable, kwargs.items())
+            # grow reads geometrically, so a huge value is decoded in
+            # amortized linear time
+            self._fill(size)
+            size = max(size, len(self._buf))
 
-    def __getitem__(self, compound_key):
+    def next(self):
         """
-        Returns a value that's associated with a given compound key.
-
-        :param compound_key: (str) a key for retrieving value
-        :returns: (object) retrieved value if key exists
-        :raises KeyError: a given key does not exist
+        Returns a kind and a key of next member, or ``None`` at the end.
         """
-        conf = self._data
+        if not self._depth:
+            if self._peek():
+                self._error('Extra data')
+            return None
 
-        for key in compound_key.split(self._separator):
-            conf = conf[key]
+        if self._peek() == '}':
+            self._pos += 1
+            self._depth -= 1
+            self._first = False
+            return self.END, None
 
-        # We need to return dict as Conf instance to make possible use Conf's
-        # features on it. The returned object is used exactly like a wrapper,
-        # since it doesn't make a full copy of a given dict.
-        if isinstance(conf, dict):
-            rv = Conf(separator=self._separator)
-            rv._data = conf
-            return rv
+        if not self._first:
+            self._expect(',')
+        self._first = False
 
-        return conf
+        if self._peek() != '"':
+            self._error('Expecting property name enclosed in double quotes')
+        key = self._decode(
+            lambda buf, pos: json.decoder.scanstring(buf, pos + 1))
+        key = self._keys.setdefault(key, key)
+        self._expect(':')
 
-    def __setitem__(self, compound_key, value):
-        """
-        Sets a value for given option.
+        if self._peek() == '{':
+            return self.OBJECT, key
+        return self.VALUE, key
 
-        :param compound_key: (str) an option to change
-        :param value: (object) a value to set
-        :raises KeyError: an option doesn't exist
+    def enter(self):
         """
-        conf = self._data
-        keys = compound_key.split(self._separator)
-        for key in keys[:-1]:
-            if key not in conf:
-                conf[key] = {}
-            conf = conf[key]
-        conf[keys[-1]] = value
+        Starts walking members of an object returned by :meth:`next`.
+        """
+        self._pos += 1
+        self._depth += 1
+        self._first = True
 
-    def __delitem__(self, compound_key):
+    def value(self, limit=None):
         """
-        Remove a given compound key from the instance.
+        Decodes a value of a member returned by :meth:`next` as a whole.
 
-        :param compound_key: (str) a key to delete
+        :param limit: (int) give up if the value is longer than a given
+                      number of characters and return ``_missing``
         """
-        conf = self._data
-        keys = compound_key.split(self._separator)
-        for key in keys[:-1]:
-            conf = conf[key]
-        del conf[keys[-1]]
+        return self._decode(self._decoder.raw_decode, limit)
 
-    def __iter__(self):
-        return iter(self._data)
 
-    def __len__(self):
-        return len(self._data)
+#: a marker of an absent value
+_missing = object()
 
-    def __str__(self):
-        return str(self._data)
 
-    def __repr__(self):
-        return repr(self._data)
+def _apply_later(strategy, dst, key, old):
+    def finalize(new):
+        dst[key] = strategy(old, new)
+    return finalize
+
+
+def _stream_json(f, dst, merger, chunk_size=65536):
+    """
+    Parses a JSON object from a given file and merges it into a given tree
+    as the file is being read.
+
+    Objects are decoded as a whole and merged unless they are too big;
+    big ones are walked member by member. So the parsed object never
+    exists in memory as a whole, along with the tree it's merged into.
+
+    :returns: (:class:`MergeStats`) a merge report
+    """
+    started = timeit.default_timer()
+    nodes, keys = 1, 0
+
+    reader = _JSONReader(f, chunk_size)
+    stack = [(dst, merger._trie, None)]
+
+    while True:
+        member = reader.next()
+        if member is None:
+            break
+
+        kind, key = member
+        if kind is reader.END:
+            node, _, finalize = stack.pop()
+            if finalize is not None:
+                finalize(node)
+            continue
+
+        dst, trie, _ = stack[-1]
+        keys += 1
+
+        strategy = subtrie = None
+        if trie is not None:
+            subtrie = trie[1].get(key)
+            if subtrie is not None:
+                strategy = subtrie[0]
+
+        if kind is reader.OBJECT:
+            old = dst.get(key)
+            merge = strategy in (None, MERGE) and isinstance(old, dict)
+
+            # small objects are decoded as a whole, since it's way faster
+            # than walking them member by member
+            value = reader.value(limit=chunk_size * 16)
+
+            if value is not _missing and merge:
+                submerger = Merger.__new__(Merger)
+                submerger._trie = subtrie
+
+                stats = submerger.merge(old, value)
+                nodes += stats.nodes
+                keys += stats.keys
+                continue
+
+            if value is _missing:
+                nodes += 1
+                finalize = None
+
+                if merge:
+                    node = old
+                elif callable(strategy) and key in dst:
+                    # a custom strategy needs the whole object, so collect
+                    # it aside and apply the strategy once it's over
+                    node = {}
+                    finalize = _apply_later(strategy, dst, key, old)
+                else:
+                    node = dst[key] = {}
+
+                reader.enter()
+                stack.append((node, subtrie, finalize))
+                continue
+        else:
+            value = reader.value()
+
+        if strategy not in (None, MERGE, REPLACE) and key in dst:
+            value = _STRATEGIES.get(strategy, strategy)(dst[key], value)
+        dst[key] = value
+
+    return MergeStats(nodes, keys, timeit.default_timer() - started)
+
+
+#: JSON objects smaller than that (in bytes) are decoded eagerly on lazy
+#: loading, since indexing them costs more than decoding
+_LAZY_THRESHOLD = 64 * 1024
+
+#: files larger than that (in bytes) are mapped into memory on lazy loading
+#: rather than read
+_MMAP_THRESHOLD = 1024 * 1024
+
+_json_ws = re.compile(br'[ \t\n\r]*')
+_json_string = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"')
+_json_scalar = re.compile(br'[^,:\]}\s]+')
+
+# everything but brackets; strings are skipped as a whole, so brackets
+# inside them don't count
+_json_skip = re.compile(br'(?:[^"{}\[\]]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+
+
+def _json_error(pos):
+    return ValueError('Invalid JSON at position %d.' % (pos, ))
+
+
+def _skip_json_container(buf, pos, opening):
+    """
+    Returns a position right after a JSON object or array that starts at
+    a given position.
+
+    It's a fast path of :func:`_skip_json` that jumps between brackets of
+    one kind by :meth:`bytes.find`, and tells brackets inside strings by
+    a parity of quotes in between. Escaped quotes break the parity, so
+    ``None`` is returned once a backslash is met.
+    """
+    closing = b'}' if opening == b'{' else b']'
+    find = buf.find
+
+    depth, last, quoted = 0, pos, False
+    next_opening, next_closing = pos, find(closing, pos)
+
+    while True:
+        if next_closing == -1:
+            raise _json_error(pos)
+
+        if next_opening != -1 and next_opening < next_closing:
+            at, step = next_opening, 1
+            next_opening = find(opening, at + 1)
+        else:
+            at, step = next_closing, -1
+            next_closing = find(closing, at + 1)
+
+        # mmap has no count(), so a segment is copied
+        segment = buf[last:at]
+        if b'\\' in segment:
+            return None
+        if segment.count(b'"') & 1:
+            quoted = not quoted
+        last = at
+
+        if not quoted:
+            depth += step
+            if not depth:
+                return at + 1
+
+
+def _skip_json(buf, pos):
+    """
+    Returns a position right after a JSON value that starts at a given
+    position, without decoding the value.
+    """
+    char = buf[pos:pos + 1]
+
+    if char == b'"':
+        match = _json_string.match(buf, pos)
+        if match is None:
+            raise _json_error(pos)
+        return match.end()
+
+    if char not in (b'{', b'['):
+        match = _json_scalar.match(buf, pos)
+        if match is None:
+            raise _json_error(pos)
+        return match.end()
+
+    end = _skip_json_container(buf, pos, char)
+    if end is not None:
+        return end
+
+    depth = 0
+    while True:
+        char = buf[pos:pos + 1]
+        if char in (b'{', b'['):
+            depth += 1
+        elif char in (b'}', b']'):
+            depth -= 1
+            if not depth:
+                return pos + 1
+        else:
+            raise _json_error(pos)
+        pos = _json_skip.match(buf, pos + 1).end()
+
+
+def _index_json(buf, start, encoding):
+    """
+    Returns members of a JSON object that starts at a given position.
+
+    Big nested objects aren't decoded, but represented by lazy
+    dictionaries; other values are decoded.
+
+    :returns: (list) a list of ``(key, value)`` pairs
+    """
+    ws = _json_ws.match
+    members = []
+
+    pos = ws(buf, start + 1).end()
+    if buf[pos:pos + 1] == b'}':
+        return members
+
+    while True:
+        match = _json_string.match(buf, pos)
+        if match is None:
+            raise _json_error(pos)
+        key = json.loads(match.group().decode(encoding))
+
+        pos = ws(buf, match.end()).end()
+        if buf[pos:pos + 1] != b':':
+            raise _json_error(pos)
+
+        pos = ws(buf, pos + 1).end()
+        end = _skip_json(buf, pos)
+
+        if end - pos >= _LAZY_THRESHOLD and buf[pos:pos + 1] == b'{':
+            value = _LazyDict(buf, pos, encoding)
+        else:
+            value = json.loads(buf[pos:end].decode(encoding))
+        members.append((key, value))
+
+        pos = ws(buf, end).end()
+        char = buf[pos:pos + 1]
+        if char == b'}':
+            return members
+        if char != b',':
+            raise _json_error(pos)
+        pos = ws(buf, pos + 1).end()
+
+
+#: a key an undecoded :class:`_LazyDict` holds, so it isn't empty for code
+#: that checks size of a dictionary directly (e.g. C encoder of json)
+_undecoded = object()
+
+#: a lock that makes decoding of :class:`_LazyDict` thread-safe
+_lazy_lock = threading.Lock()
+
+
+class _LazyDict(dict):
+    """
+    A dictionary that's decoded from a JSON object on first access.
+
+    Until then it keeps only a position of the object in a buffer, so
+    undecoded parts of a file take no memory except pages of the buffer.
+    Every method of the dictionary decodes it first.
+    """
+
+    __slots__ = ('_source', )
+
+    def __init__(self, buf, start, encoding):
+        dict.__init__(self)
+        dict.__setitem__(self, _undecoded, None)
+        self._source = (buf, start, encoding)
+
+    def _load(self):
+        with _lazy_lock:
+            # it may be decoded by another thread while waiting for lock
+            source = self._source
+            if source is None:
+                return
+
+            members = _index_json(*source)
+            dict.__delitem__(self, _undecoded)
+            dict.update(self, members)
+
+            # other threads see a decoded dictionary once this is reset
+            self._source = None
+
+    def __reduce_ex__(self, protocol):
+        # don't copy or pickle the buffer, a plain dictionary is enough
+        return dict, (dict(self.items()), )
+
+
+def _loading(method):
+    def wrapper(self, *args, **kwargs):
+        if self._source is not None:
+            self._load()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def _comparing(method):
+    def wrapper(self, other):
+        # dict's comparison reads a size of the other dictionary directly
+        for node in (self, other):
+            if isinstance(node, _LazyDict) and node._source is not None:
+                node._load()
+        return method(self, other)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+_LazyDict.__eq__ = _comparing(dict.__eq__)
+_LazyDict.__ne__ = _comparing(dict.__ne__)
+
+for _name in (
+        '__getitem__', '__setitem__', '__delitem__', '__contains__',
+        '__iter__', '__len__', '__repr__',
+        '__reversed__', '__or__', '__ror__', '__ior__',
+        'get', 'keys', 'values', 'items', 'pop', 'popitem', 'setdefault',
+        'update', 'clear', 'copy', 'has_key', 'iterkeys', 'itervalues',
+        'iteritems', 'viewkeys', 'viewvalues', 'viewitems'):
+    if hasattr(dict, _name):
+        setattr(_LazyDict, _name, _loading(getattr(dict, _name)))
+del _name
+
+# a dictionary is shown by __repr__ in Python 2.x
+_LazyDict.__str__ = _LazyDict.__repr__
+
+
+def _load_json_lazily(filename, encoding):
+    """
+    Loads a JSON file, but decodes only values that are small.
+
+    Big objects are decoded once they're accessed. Large files are mapped
+    into memory, so they don't take memory beyond OS page cache.
+
+    :returns: (dict) a top-level object
+    """
+    if len(u'{'.encode(encoding)) != 1:
+        # the file can be scanned only if it's ASCII compatible
+        with open(filename, encoding=encoding) as f:
+            return json.load(f)
+
+    with io.open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size >= _MMAP_THRESHOLD:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+
+    pos = 3 if buf[:3] == codecs.BOM_UTF8 else 0
+    pos = _json_ws.match(buf, pos).end()
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError('A top-level JSON value must be an object.')
+    return dict(_index_json(buf, pos, encoding))
+
+
+#: a merger with no custom strategies
+_default_merger = Merger()
+
+
+# Dictionaries keep insertion order since Python 3.7, and they're created
+# much faster than ordered ones.
+if sys.version_info >= (3, 7):
+    _ordered_dict = dict
+else:  # fallback to Python 2.x and 3.x < 3.7
+    _ordered_dict = collections.OrderedDict
+
+#: a signature of binary configs, see :meth:`Conf.dump_binary`
+_BINARY_MAGIC = b'DKCB'
+
+
+def _plain(tree):
+    """
+    Returns a copy of a given tree, where subclasses of dictionaries and
+    lists (e.g. :class:`_LazyDict`) are replaced with built-in ones.
+    """
+    tree = dict(tree)
+    stack = [tree]
+
+    while stack:
+        node = stack.pop()
+        members = node.items() if isinstance(node, dict) else enumerate(node)
+
+        for key, value in list(members):
+            if isinstance(value, dict):
+                node[key] = value = dict(value)
+            elif isinstance(value, list):
+                node[key] = value = list(value)
+            else:
+                continue
+            stack.append(value)
+
+    return tree
+
+
+def _dumps(tree):
+    """
+    Serializes a given tree into a compact binary form.
+
+    The :mod:`marshal` format is preferred, since it's the fastest one to
+    load, but it supports built-in types only, so :mod:`pickle` is used as
+    a fallback (e.g. YAMLs may contain dates). Marshal rejects subclasses
+    of built-in types as well, so a tree with ones (e.g. lazily loaded
+    JSON) is converted into a plain one before falling back.
+
+    :returns: (tuple) a function to deserialize the tree and binary data
+    """
+    try:
+        return marshal.loads, marshal.dumps(tree)
+    except ValueError:
+        pass
+
+    tree = _plain(tree)
+    try:
+        return marshal.loads, marshal.dumps(tree)
+    except ValueError:
+        return pickle.loads, pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+
+
+def _dump_json(tree, f, sort_keys=False, ensure_ascii=True):
+    """
+    Writes a given tree to a file object as JSON.
+
+    The pure Python encoder of the :mod:`json` module is used whenever
+    JSON is written to a file, and it's several times slower than the C
+    one that's used for encoding into a string. So the tree is walked
+    node by node, and consecutive values that aren't dictionaries are
+    encoded by a single call of the C encoder. The output is the same as
+    one of :func:`json.dumps`, while the largest chunk kept in memory is
+    values of a single node.
+    """
+    encode = json.JSONEncoder(
+        sort_keys=sort_keys, ensure_ascii=ensure_ascii).encode
+    write = f.write
+
+    def members(node):
+        if sort_keys:
+            return iter(sorted(node.items(), key=lambda item: item[0]))
+        return iter(node.items())
+
+    def is_leaf(node):
+        return not any(
+            value and isinstance(value, dict) for value in node.values())
+
+    # nodes without subnodes, which are the most of them, are encoded
+    # as a whole
+    if is_leaf(tree):
+        write(encode(tree))
+        return
+
+    write(u'{')
+    stack = [[members(tree), True]]
+
+    while stack:
+        entry = stack[-1]
+
+        run, child = [], None
+        for key, value in entry[0]:
+            if value and isinstance(value, dict):
+                child = key, value
+                break
+            run.append((key, value))
+
+        if run:
+            # strip braces of an encoded object, so members are left
+            chunk = encode(_ordered_dict(run))[1:-1]
+            write(chunk if entry[1] else u', ' + chunk)
+            entry[1] = False
+
+        if child is None:
+            write(u'}')
+            stack.pop()
+            continue
+
+        # a key is encoded as an object's member, since keys that aren't
+        # strings are encoded in a special way
+        key, node = child
+        chunk = encode({key: 0})[1:-1]
+        if is_leaf(node):
+            chunk = chunk[:-1] + encode(node)
+        else:
+            chunk = chunk[:-1] + u'{'
+            stack.append([members(node), True])
+        write(chunk if entry[1] else u', ' + chunk)
+        entry[1] = False
+
+
+def _load_binary(f, allow_pickle=False):
+    """
+    Loads a tree from a binary file written by :meth:`Conf.dump_binary`.
+
+    :raises ValueError: the file isn't a binary config, it's written by an
+                        incompatible version of Python, or it's pickled
+                        while pickle isn't allowed
+    """
+    header = f.read(len(_BINARY_MAGIC) + 3)
+    if header[:len(_BINARY_MAGIC)] != _BINARY_MAGIC:
+        raise ValueError('%r is not a binary config.' % (f.name, ))
+
+    kind, version = header[-3:-2], bytearray(header[-2:])
+    if kind == b'm':
+        if tuple(version) != sys.version_info[:2]:
+            raise ValueError(
+                '%r is written by Python %d.%d.' % ((f.name, ) + tuple(
+                    version)))
+        return marshal.loads(f.read())
+
+    # unpickling may execute arbitrary code
+    if not allow_pickle:
+        raise ValueError('%r is pickled, while pickle is not allowed.' % (
+            f.name, ))
+    return pickle.load(f)
+
+
+_CacheEntry = collections.namedtuple(
+    '_CacheEntry', ['signature', 'digest', 'loads', 'data'])
+
+
+class CacheInfo(collections.namedtuple(
+        'CacheInfo', ['hits', 'misses', 'evictions', 'size', 'memory'])):
+    """
+    Statistics of :class:`ConfCache`.
+
+    :param hits: (int) a number of loads served from the cache
+    :param misses: (int) a number of loads that parsed a file
+    :param evictions: (int) a number of entries that were evicted
+    :param size: (int) a number of entries in the cache
+    :param memory: (int) memory taken by entries, in bytes
+
+    .. versionadded:: 0.5.0
+    """
+    __slots__ = ()
+
+
+class ConfCache(object):
+    """
+    A cache of parsed configuration files.
+
+    The cache keeps output of loaders, such as :func:`json.load`, and
+    serves it again as long as a file is unchanged, so the file isn't read
+    and parsed over and over again. It's opt-in, just pass the cache to
+    :meth:`Conf.from_file`, :meth:`Conf.from_json` or :meth:`Conf.from_yaml`::
+
+        cache = ConfCache(maxsize=64)
+
+        def handle_request(request):
+            conf = Conf(defaults)
+            conf.from_yaml('/etc/app/conf.yaml', cache=cache)
+
+    A file is considered unchanged if its modification time, size and inode
+    are the same. Since modification time has a limited resolution, you
+    may ask to compare file content hashes as well. It doesn't save
+    reading the file, but still saves parsing.
+
+    Parsed trees are kept in a compact binary form, which is way faster to
+    load than any text format, and each load returns a brand new tree, so
+    it may be changed freely. Entries are evicted in least recently used
+    order, when there are too many of them or when they take too much
+    memory. The cache is safe to be shared between threads.
+
+    :param maxsize:
+        A maximum number of cached files; unlimited if ``None``.
+    :param maxmemory:
+        A maximum memory, in bytes, that's taken by cached entries;
+        unlimited if ``None``.
+    :param checksum:
+        Compare content hashes of files in addition to their stats.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, maxsize=128, maxmemory=None, checksum=False):
+        self.maxsize = maxsize
+        self.maxmemory = maxmemory
+        self.checksum = checksum
+
+        #: `(loader, filename, encoding)` <-> `_CacheEntry`
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._memory = 0
+        self._hits = self._misses = self._evictions = 0
+
+    def load(self, loader, filename, encoding='utf-8'):
+        """
+        Returns a parsed file, either from the cache or by a given loader.
+
+        :param loader: (function) a function that receives a file object
+            and returns a parsed tree
+        :param filename: (str) a filename to be loaded
+        :param encoding: (str) an encoding of the filename
+        :returns: (object) a parsed tree
+        """
+        key = (loader, os.path.abspath(filename), encoding)
+        stat = os.stat(filename)
+        signature = (stat.st_mtime, stat.st_size, stat.st_ino)
+
+        content = digest = None
+        if self.checksum:
+            with io.open(filename, 'rb') as f:
+                content = f.read()
+            digest = hashlib.sha1(content).hexdigest()
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and (
+                    entry.signature == signature if digest is None
+                    else entry.digest == digest):
+                self._hits += 1
+                self._entries[key] = entry._replace(signature=signature)
+                return entry.loads(entry.data)
+
+            self._misses += 1
+            if entry is not None:
+                self._memory -= len(entry.data)
+
+        if content is not None:
+            tree = loader(io.StringIO(content.decode(encoding)))
+        else:
+            with open(filename, encoding=encoding) as f:
+                tree = loader(f)
+
+        self._store(key, _CacheEntry(signature, digest, *_dumps(tree)))
+        return tree
+
+    def _store(self, key, entry):
+        size = len(entry.data)
+        if self.maxmemory is not None and size > self.maxmemory:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._memory -= len(old.data)
+
+            self._entries[key] = entry
+            self._memory += size
+
+            while self._entries and (
+                    (self.maxsize is not None and
+                        len(self._entries) > self.maxsize) or
+                    (self.maxmemory is not None and
+                        self._memory > self.maxmemory)):
+                _, evicted = self._entries.popitem(last=False)
+                self._memory -= len(evicted.data)
+                self._evictions += 1
+
+    def invalidate(self, filename):
+        """
+        Drops all entries of a given file.
+
+        :param filename: (str) a filename to be dropped
+        """
+        filename = os.path.abspath(filename)
+
+        with self._lock:
+            for key in list(self._entries):
+                if key[1] == filename:
+                    self._memory -= len(self._entries.pop(key).data)
+
+    def clear(self):
+        """
+        Drops all entries and resets statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._memory = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def cache_info(self):
+        """
+        Returns statistics of the cache.
+
+        :returns: (:class:`CacheInfo`) cache statistics
+        """
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._evictions,
+                len(self._entries), self._memory)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _load_yaml(f):
+    """
+    Loads a YAML document from a given file object safely.
+    """
+    return yaml.load(f, Loader=_YAMLLoader)
+
+
+class _CompiledYAMLLoader(object):
+    """
+    A YAML loader that keeps parsed documents in compiled files on disk.
+
+    The idea is similar to ``.pyc`` files. A parsed document is saved in
+    a compact binary form, either next to a YAML file (``conf.yaml`` ->
+    ``conf.yamlc``) or into a given cache directory, and next time it's
+    loaded from there without YAML parsing at all. A compiled file is
+    tagged with a hash of YAML source and a version of the loader, so it's
+    ignored once either of them is changed.
+
+    Failures to write compiled files are ignored, so read-only locations
+    are fine. Documents that can't be marshaled (e.g. ones with dates) are
+    compiled with :mod:`pickle`, so they are neither saved nor loaded
+    unless pickle is allowed, since unpickling may execute arbitrary code.
+    """
+
+    _magic = b'DKYC'
+
+    def __init__(self, cache_dir=None, allow_pickle=False):
+        self.cache_dir = cache_dir
+        self.allow_pickle = allow_pickle
+
+    @property
+    def _version(self):
+        return ('%s;%s;%s;%d' % (
+            yaml.__version__, _YAMLLoader.__name__,
+            sys.version.split()[0], marshal.version)).encode('utf-8')
+
+    def _path(self, filename):
+        if self.cache_dir is None:
+            return filename + 'c'
+
+        name = hashlib.sha1(
+            os.path.abspath(filename).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.yamlc')
+
+    def __call__(self, f):
+        source = f.read()
+        path = self._path(f.name)
+
+        digest = hashlib.sha1(self._version)
+        digest.update(source.encode('utf-8'))
+        header = self._magic + digest.digest()
+
+        try:
+            with io.open(path, 'rb') as compiled:
+                if compiled.read(len(header)) == header:
+                    kind = compiled.read(1)
+                    if kind == b'm':
+                        return marshal.loads(compiled.read())
+                    if self.allow_pickle:
+                        return pickle.loads(compiled.read())
+        except Exception:
+            # missed or broken compiled file, parse YAML then
+            pass
+
+        tree = _load_yaml(source)
+        loads, data = _dumps(tree)
+        if loads is pickle.loads and not self.allow_pickle:
+            return tree
+
+        try:
+            if self.cache_dir is not None and \
+                    not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+
+            # write to a temporary file first, so concurrent readers never
+            # see a partially written one
+            tmp = '%s.%d.tmp' % (path, os.getpid())
+            with io.open(tmp, 'wb') as compiled:
+                compiled.write(header)
+                compiled.write(b'm' if loads is marshal.loads else b'p')
+                compiled.write(data)
+            _replace(tmp, path)
+        except Exception:
+            pass
+
+        return tree
+
+    def __eq__(self, other):
+        return isinstance(other, _CompiledYAMLLoader) and \
+            self.cache_dir == other.cache_dir
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((_CompiledYAMLLoader, self.cache_dir))
+
+
+def _get_loader(filename):
+    """
+    Returns a loader for a given file, chosen by the file extension.
+
+    :raises ValueError: the file extension is unknown
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.json':
+        return json.load
+    if ext in ('.yaml', '.yml'):
+        if not yaml:
+            raise AttributeError(
+                'You need to install PyYAML before loading YAML files!')
+        return _load_yaml
+    raise ValueError('Can not choose a loader for %r.' % (filename, ))
+
+
+def _load_file(task):
+    """
+    Loads a file; it's executed by a pool of workers.
+
+    An exception is returned rather than raised, so errors of other files
+    don't break the pool.
+
+    :param task: (tuple) a loader, a filename, an encoding and a cache
+    :returns: (tuple) a flag whether the load failed, and a parsed file or
+              an exception
+    """
+    loader, filename, encoding, cache = task
+    try:
+        if cache is not None:
+            return False, cache.load(loader, filename, encoding)
+
+        with open(filename, encoding=encoding) as f:
+            return False, loader(f)
+    except Exception as exc:
+        return True, exc
+
+
+def _walk(nodes, path, separator, create=False, copy=False, hashes=None):
+    """
+    Returns a node of a given path, and memoizes nodes of the path and all
+    its prefixes, so paths that share a prefix walk it once.
+
+    The memo is keyed by paths: compound keys or tuples of keys. Roots are
+    keyed by ``None`` and an empty tuple respectively.
+
+    :param nodes: (dict) a memo of nodes
+    :param path: (str or tuple) a path to walk
+    :param separator: (str) a separator of compound keys
+    :param create: (bool) create missing nodes
+    :param copy: (bool) copy (shallowly) nodes on the way, so the memo may
+                 be changed without affecting the nodes it's copied from
+    :param hashes: (dict) cached fingerprints to drop for nodes that are
+                   changed or replaced on the way
+    :returns: a node, or ``_missing`` if there's no such one
+    :raises TypeError: a value on the path isn't a dictionary, and
+                       ``create`` is set
+    """
+    pending = []
+    while path not in nodes:
+        pending.append(path)
+        if isinstance(path, tuple):
+            path = path[:-1]
+        else:
+            head, found, _ = path.rpartition(separator)
+            path = head if found else None
+
+    node = nodes[path]
+    for path in reversed(pending):
+        if isinstance(path, tuple):
+            key = path[-1]
+        else:
+            key = path.rpartition(separator)[2]
+
+        if not isinstance(node, dict):
+            if create:
+                raise TypeError('%r is not a dictionary.' % (key, ))
+            node = _missing
+        elif key in node:
+            parent, node = node, node[key]
+            if copy and isinstance(node, dict):
+                if hashes:
+                    _forget(hashes, node)
+                node = parent[key] = dict(node)
+        elif create:
+            if hashes:
+                _forget(hashes, node)
+            parent, node = node, {}
+            parent[key] = node
+        else:
+            node = _missing
+
+        nodes[path] = node
+    return node
+
+
+def _share(pool, value):
+    """
+    Returns an object of a given pool that's equal to a given value, if
+    the value is immutable; otherwise returns the value itself.
+    """
+    cls = value.__class__
+    if cls not in _ATOMIC_TYPES or cls is float and not value:
+        # -0.0 equals to 0.0, so zeros can't be shared
+        return value
+
+    # values of different types may be equal, e.g. 1 and True
+    return pool.setdefault((cls, value), value)
+
+
+def compact(tree, pool=None):
+    """
+    Reduces memory taken by a given tree of dictionaries in place.
+
+    Configs tend to repeat the same keys and values over and over, and
+    each of them is kept as a separate object, e.g. every ``json.load``
+    call produces its own strings. The function replaces equal keys and
+    immutable values (strings, numbers, etc) with the same object, and
+    rebuilds dictionaries, so ones that had a lot of keys deleted don't
+    keep oversized hash tables. Lists are compacted as well.
+
+    Nodes are changed in place rather than replaced, so references to
+    them stay valid. ::
+
+        pool = {}
+        for conf in tenant_confs:
+            compact(conf, pool)
+
+    :param tree: (dict) a tree to be compacted
+    :param pool: (dict) a pool of shared values; pass the same pool to
+                 share values between a few trees
+    :returns: (dict) the pool
+
+    .. versionadded:: 0.5.0
+    """
+    if pool is None:
+        pool = {}
+
+    stack = [tree]
+
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, dict):
+            items = [
+                (_share(pool, key), _share(pool, value))
+                for key, value in node.items()]
+            node.clear()
+            node.update(items)
+            values = node.values()
+        else:
+            node[:] = [_share(pool, value) for value in node]
+            values = node
+
+        stack.extend(
+            value for value in values if isinstance(value, (dict, list)))
+
+    return pool
+
+
+class ConfDiff(collections.namedtuple(
+        'ConfDiff', ['added', 'removed', 'changed'])):
+    """
+    A difference between two configs, see :meth:`Conf.diff`.
+
+    Keys of all the dictionaries are compiled compound keys.
+
+    :param added: (dict) keys and values that are added
+    :param removed: (dict) keys and values that are removed
+    :param changed: (dict) keys and pairs of old and new values
+
+    .. versionadded:: 0.5.0
+    """
+    __slots__ = ()
+
+
+def _diff(old, new, expand=False):
+    """
+    Compares two trees.
+
+    Dictionaries are compared recursively, except ones that are the same
+    object in both trees; they're skipped at once. So trees that share
+    subtrees are compared in time proportional to the number of different
+    subtrees.
+
+    :param expand: (bool) report values of added and removed dictionaries
+                   one by one, rather than the dictionaries themselves
+    :returns: (tuple) dictionaries of added, removed and changed values
+              keyed by :class:`KeyPath`; changed values are pairs of old
+              and new ones
+    """
+    added, removed, changed = {}, {}, {}
+    stack = [((), old, new)]
+
+    while stack:
+        path, old, new = stack.pop()
+        common = len(old)
+
+        for key, a in old.items():
+            b = new.get(key, _missing)
+            if a is b:
+                continue
+
+            if b is _missing:
+                common -= 1
+                if expand and a and isinstance(a, dict):
+                    stack.append((path + (key, ), a, {}))
+                else:
+                    removed[KeyPath(path + (key, ))] = a
+            elif isinstance(a, dict) and isinstance(b, dict):
+                stack.append((path + (key, ), a, b))
+            elif a.__class__ is not b.__class__ or a != b:
+                changed[KeyPath(path + (key, ))] = (a, b)
+
+        if len(new) == common:
+            # every key of the new node is in the old one
+            continue
+
+        for key, b in new.items():
+            if key not in old:
+                if expand and b and isinstance(b, dict):
+                    stack.append((path + (key, ), {}, b))
+                else:
+                    added[KeyPath(path + (key, ))] = b
+
+    return added, removed, changed
+
+
+def _patch_items(diff):
+    """
+    Returns keys and copies of values to be set to apply a given diff.
+    """
+    for key, (_, value) in diff.changed.items():
+        yield key, _copy_value(value)
+    for key, value in diff.added.items():
+        yield key, _copy_value(value)
+
+
+def _node_digest(node, hashes):
+    """
+    Returns a digest of a given node, which subnodes are hashed already.
+
+    Leaf values are dumped to JSON, so equal values produce the same digest
+    regardless of a process or Python version, and subnodes are replaced
+    by their digests. Values that aren't JSON serializable are represented
+    by their ``repr``.
+    """
+    leaves, children = {}, {}
+    parts = [leaves, children]
+
+    for key, value in node.items():
+        if isinstance(value, dict):
+            entry = hashes[id(value)]
+            entry[2].add(id(node))
+            children[key] = entry[1]
+        else:
+            leaves[key] = value
+
+    if not all(isinstance(key, string_types) for key in node):
+        # JSON keys are strings, so ``1`` and ``'1'`` would be mixed up;
+        # dump keys as well, and mark the node as such
+        parts = [
+            dict((json.dumps(key, default=repr), value)
+                 for key, value in part.items())
+            for part in parts] + [True]
+
+    text = json.dumps(parts, sort_keys=True, default=repr)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _fingerprint(tree, hashes):
+    """
+    Returns a fingerprint of a given tree.
+
+    Fingerprints of dictionaries are cached in a given map as ``id(node)``
+    <-> ``(node, digest, parents)`` entries, where ``parents`` is a set of
+    ids of the nodes that include the node. The cache has to be updated by
+    :func:`_forget` whenever a cached node is changed, so only nodes on a
+    changed path are hashed again.
+    """
+    entry = hashes.get(id(tree))
+    if entry is not None:
+        return entry[1]
+
+    # nodes are hashed in post-order by an explicit stack, so there's no
+    # limit on a tree depth
+    stack = [(tree, False)]
+
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in hashes:
+            continue
+
+        if ready:
+            hashes[id(node)] = (node, _node_digest(node, hashes), set())
+        else:
+            stack.append((node, True))
+            stack.extend(
+                (value, False) for value in node.values()
+                if isinstance(value, dict) and id(value) not in hashes)
+
+    return hashes[id(tree)][1]
+
+
+def _forget(hashes, node):
+    """
+    Drops cached fingerprints of a given node and all its ancestors.
+    """
+    ids = [id(node)]
+    while ids:
+        entry = hashes.pop(ids.pop(), None)
+        if entry is not None:
+            ids.extend(entry[2])
+
+
+def _forget_tree(hashes, tree):
+    """
+    Drops cached fingerprints of all nodes of a given subtree, so the cache
+    doesn't keep alive a subtree that's removed.
+    """
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        _forget(hashes, node)
+        stack.extend(
+            value for value in node.values() if isinstance(value, dict))
+
+
+def _forget_merged(hashes, dst, src):
+    """
+    Drops cached fingerprints of nodes of the ``dst`` tree that may be
+    changed or replaced once an iterable of ``(key, value)`` pairs is
+    merged into it.
+    """
+    stack = [(dst, src)]
+    while stack:
+        dst, src = stack.pop()
+        _forget(hashes, dst)
+
+        for key, value in src:
+            node = dst.get(key)
+            if not isinstance(node, dict):
+                continue
+
+            if isinstance(value, (Conf, FrozenConf)):
+                value = value._data
+            if isinstance(value, dict):
+                stack.append((node, value.items()))
+            else:
+                _forget_tree(hashes, node)
+
+
+class _ItemsView(collections.ItemsView):
+    """
+    Items of a :class:`Conf` that are taken from its data as is.
+    """
+
+    __slots__ = ()
+
+    def __iter__(self):
+        conf = self._mapping
+        for key, value in conf._data.items():
+            if isinstance(value, dict):
+                value = conf._wrap(value, (key, ))
+            yield key, value
+
+    def __contains__(self, item):
+        key, value = item
+        rv = self._mapping._data.get(key, _missing)
+        if rv is _missing:
+            return False
+        return rv is value or value == rv
+
+
+class _ValuesView(collections.ValuesView):
+    """
+    Values of a :class:`Conf` that are taken from its data as is.
+    """
+
+    __slots__ = ()
+
+    def __iter__(self):
+        conf = self._mapping
+        for key, value in conf._data.items():
+            if isinstance(value, dict):
+                value = conf._wrap(value, (key, ))
+            yield value
+
+    def __contains__(self, value):
+        for rv in self._mapping._data.values():
+            if rv is value or value == rv:
+                return True
+        return False
+
+
+class Conf(collections.MutableMapping):
+    """
+    A :class:`dict` wrapper that extends its functionality.
+
+    The class was designed with one purpose: to provide the more convenient
+    way to interact with dictionary instances that keep some configuration
+    data. In many ways it behaves exactly like a dictionary, but unlike the
+    last one it can be accessed by a *compound key* and supports *recursive
+    update*.
+
+    A Compound Key is a key that consists of two or more keys that allow
+    you to retrieve value from subnode of subnode. For example, we have
+    the following structure ::
+
+        { 'ukraine': {
+            'kharkiv': {
+              'timezone': 'UTC+2', }, }, }
+
+    and you want to get the timezone's value with one query. Well, with
+    compound keys you can do it this way ::
+
+        timezone = conf['ukraine.kharkiv.timezone']
+
+    instead of usual ::
+
+        timezone = conf['ukraine']['kharkiv']['timezone']
+
+    On the other hand we have a usual dictionary behaviour:
+
+    * a ``KeyError`` exception will be thrown in case of key absence
+    * a :meth:`get` method is provided to retrieve values safely
+
+    The class overrides an :meth:`update` method so it can be used to
+    recursively update values. For example, we have the following structure ::
+
+        { 'ukraine': {
+            'kharkiv': {
+              'timezone': 'UTC+2', }, }, }
+
+    and want to update it with next one ::
+
+        { 'ukraine': {
+            'kharkiv': {
+              'population': '1 427 000', }, }, }
+
+    In vanilla Python's dictionary we will have the same result as statement
+    above since it completely overwrites top-level keys, but our class can
+    handle it properly and merge it automatically, so we will have next
+    result ::
+
+        { 'ukraine': {
+            'kharkiv': {
+              'timezone': 'UTC+2',
+              'population': '1 427 000', }, }, }
+
+    In addition to compound keys and update method, the class provides two
+    helpers - :meth:`from_json` and :meth:`from_yaml` - for loading and
+    updating a Conf instance from files. ::
+
+        conf = Conf(default_conf)
+        conf.from_json('path/to/user/conf.json')
+
+    .. note:: You have to install ``PyYAML`` before using :meth:`from_yaml`.
+
+    :param confs:
+        A list of dictionaries to create a Conf instance based on it.
+        Each next dictionary overrides settings from the previous one.
+    :param separator:
+        A character that's used as separator in compound keys
+    :param strategies:
+        A dictionary of compound keys and merge strategies to be used for
+        values of those keys on update; see :class:`Merger` for details.
+    """
+
+    #: this character will be used as a separator in case you don't
+    #: set a new one explicitly
+    default_separator = '.'
+
+    # instances are created for every subtree that's accessed, so keep
+    # them as small as possible
+    __slots__ = (
+        '_data', '_separator', '_compile_key', '_merger', '_views', '_hashes')
+
+    def __init__(self, *confs, **options):
+        self._data = {}
+        self._separator = options.get('separator', self.default_separator)
+        self._compile_key = _get_keypath_cache(self._separator)
+
+        #: `id(node)` <-> `view` map; it's shared by an instance and all
+        #: its views
+        self._views = {}
+
+        #: cached fingerprints of nodes, see `_fingerprint`; it's shared
+        #: by an instance and all its views as well
+        self._hashes = {}
+
+        strategies = options.get('strategies')
+        if strategies:
+            self._merger = Merger(strategies, self._separator)
+        else:
+            self._merger = _default_merger
+
+        for conf in confs:
+            self._merger.merge(self._data, conf, copy=True)
+
+    def compile_key(self, compound_key):
+        """
+        Returns a compiled compound key for this instance's separator.
+
+        The compiled key may be used instead of a string one in any place
+        that accepts compound keys, and it saves a key split on each use.
+
+        :param compound_key: (str) a compound key to be compiled
+        :returns: (:class:`KeyPath`) a compiled key
+
+        .. versionadded:: 0.5.0
+        """
+        if isinstance(compound_key, KeyPath):
+            return compound_key
+        return self._compile_key(compound_key)
+
+    def from_file(self, loader, filename, encoding='utf-8', silent=False,
+                  cache=None):
+        """
+        Updates recursively the value in the the config from some file.
+
+        :param loader: (function) a function that receives a file object
+            and returns a dictionary to be merged into settings
+        :param filename: (str) a filename to be opened
+        :param encoding: (str) an encoding of the filename
+        :param silent: (bool) fails silently if something wrong with json file
+        :param cache: (:class:`ConfCache`) a cache of parsed files to be used
+        :returns: (:class:`MergeStats`) a merge report
+
+        .. versionadded:: 0.4.0
+        .. versionchanged:: 0.5.0
+           The ``cache`` parameter is added.
+        """
+        conf = {}
+        try:
+            if cache is not None:
+                conf = cache.load(loader, filename, encoding)
+            else:
+                with open(filename, encoding=encoding) as f:
+                    conf = loader(f)
+        except Exception:
+            if not silent:
+                raise
+        return self.update(conf)
+
+    def from_json(self, filename, encoding='utf-8', silent=False,
+                  stream=False, cache=None, lazy=False):
+        """
+        Updates recursively the value in the the config from a JSON file.
+
+        By default the whole file is parsed first and then merged into the
+        config. In streaming mode the file is parsed incrementally, and
+        each value is merged as soon as it's parsed, so peak memory usage
+        doesn't include the whole parsed file. The top-level value must be
+        an object then.
+
+        In lazy mode big objects of the file are only indexed, and each of
+        them is decoded once it's accessed, so parts of the file that are
+        never read cost neither time nor memory. Objects are decoded when
+        they have to be merged with existing ones as well, so it's the most
+        effective on empty configs. Large files are mapped into memory
+        rather than read. The top-level value must be an object.
+
+        .. note:: In streaming mode the config is changed while the file
+                  is being read, so if the file turns out to be invalid,
+                  the config may be updated partially.
+
+        .. note:: In lazy mode the file must not be changed while the
+                  config is used, and syntax errors in objects that
+                  haven't been decoded yet are raised on access.
+
+        :param filename: (str) a filename of the JSON file
+        :param encoding: (str) an encoding of the filename
+        :param silent: (bool) fails silently if something wrong with json file
+        :param stream: (bool) parse and merge the file incrementally
+        :param cache: (:class:`ConfCache`) a cache of parsed files to be
+                      used; can't be used along with streaming or lazy mode
+        :param lazy: (bool) decode big objects on first access
+        :returns: (:class:`MergeStats`) a merge report
+
+        .. versionadded:: 0.3.0
+        .. versionchanged:: 0.5.0
+           The ``stream``, ``cache`` and ``lazy`` parameters are added.
+        """
+        if stream and cache is not None:
+            raise ValueError('A cache can not be used in streaming mode.')
+        if lazy and (stream or cache is not None):
+            raise ValueError(
+                'Lazy mode can not be used along with a cache or streaming.')
+
+        if lazy:
+            conf = {}
+            try:
+                conf = _load_json_lazily(filename, encoding)
+            except Exception:
+                if not silent:
+                    raise
+            return self.update(conf)
+
+        if not stream:
+            return self.from_file(
+                json.load, filename, encoding, silent, cache)
+
+        try:
+            with open(filename, encoding=encoding) as f:
+                self._views.clear()
+                self._hashes.clear()
+                return _stream_json(f, self._data, self._merger)
+        except Exception:
+            if not silent:
+                raise
+        return self.update({})
+
+    def from_yaml(self, filename, encoding='utf-8', silent=False,
+                  cache=None, compiled=False, cache_dir=None,
+                  allow_pickle=False):
+        """
+        Updates recursively the value in the the config from a YAML file.
+
+        The method requires the PyYAML to be installed.
+
+        YAML parsing is slow, so a parsed file may be compiled into a binary
+        form and saved on disk, similar to ``.pyc`` files. A compiled file
+        is saved next to the YAML one (``conf.yaml`` -> ``conf.yamlc``) or
+        into a given cache directory, and it's used on next loads until
+        YAML source or the loader are changed.
+
+        Documents with values that :mod:`marshal` doesn't support (e.g.
+        dates) are compiled with :mod:`pickle`. Loading a pickled file
+        executes arbitrary code if someone else is able to write to it, so
+        such documents aren't compiled unless ``allow_pickle`` is passed.
+        Allow it only if compiled files are in a location that's writable
+        by trusted users only.
+
+        :param filename: (str) a filename of the YAML file
+        :param encoding: (str) an encoding of the filename
+        :param silent: (bool) fails silently if something wrong with yaml file
+        :param cache: (:class:`ConfCache`) a cache of parsed files to be used
+        :param compiled: (bool) use compiled files to skip YAML parsing
+        :param cache_dir: (str) a directory for compiled files; if ``None``,
+                          they are saved next to YAML files
+        :param allow_pickle: (bool) save and load pickled compiled files
+        :returns: (:class:`MergeStats`) a merge report
+
+        .. versionadded:: 0.3.0
+        .. versionchanged:: 0.5.0
+           The ``cache``, ``compiled``, ``cache_dir`` and ``allow_pickle``
+           parameters are added. The safe loader is used, the LibYAML
+           based one if available.
+        """
+        if not yaml:
+            raise AttributeError(
+                'You need to install PyYAML before using this method!')
+
+        loader = _load_yaml
+        if compiled:
+            loader = _CompiledYAMLLoader(cache_dir, allow_pickle)
+
+        return self.from_file(loader, filename, encoding, silent, cache)
+
+    def from_files(self, filenames, loader=None, encoding='utf-8',
+                   silent=False, cache=None, workers=None, processes=False):
+        """
+        Updates recursively the value in the the config from a few files.
+
+        Files are read and parsed concurrently, in a pool of threads or
+        processes, and then merged in a given order, so the result is the
+        same as calling :meth:`from_file` for each file one by one::
+
+            conf.from_files(sorted(glob.glob('/etc/app/conf.d/*.yaml')))
+
+        Threads are good enough for IO-bound loads and for loaders that
+        release the GIL, while pure Python parsers (e.g. YAML without
+        LibYAML) benefit from processes. Loaders and parsed files have to
+        be picklable in the last case.
+
+        :param filenames: (list of str) filenames to be loaded
+        :param loader: (function) a function that receives a file object
+            and returns a dictionary to be merged into settings; if
+            ``None``, it's chosen by a file extension (JSON or YAML)
+        :param encoding: (str) an encoding of the files
+        :param silent: (bool) skip files that failed to load
+        :param cache: (:class:`ConfCache`) a cache of parsed files to be
+                      used; can't be used along with processes
+        :param workers: (int) a number of workers; a number of CPUs if
+                        ``None``
+        :param processes: (bool) use processes instead of threads
+        :returns: (:class:`MergeStats`) a merge report of all files
+        :raises ValueError: a loader can't be chosen for some file
+
+        .. versionadded:: 0.5.0
+        """
+        if processes and cache is not None:
+            raise ValueError('A cache can not be shared between processes.')
+
+        tasks = [
+            (loader or _get_loader(filename), filename, encoding, cache)
+            for filename in filenames]
+
+        if workers == 1 or len(tasks) < 2:
+            results = [_load_file(task) for task in tasks]
+        else:
+            # the pool is imported here, since it's a noticeable part of
+            # import time of the module
+            import multiprocessing
+            import multiprocessing.pool
+
+            if processes:
+                pool = multiprocessing.Pool(workers)
+            else:
+                pool = multiprocessing.pool.ThreadPool(workers)
+
+            try:
+                results = pool.map(_load_file, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        nodes = keys = 0
+        seconds = 0.0
+
+        for failed, conf in results:
+            if failed:
+                if not silent:
+                    raise conf
+                continue
+
+            stats = self.update(conf)
+            if stats is not None:
+                nodes += stats.nodes
+                keys += stats.keys
+                seconds += stats.seconds
+
+        return MergeStats(nodes, keys, seconds)
+
+    def from_binary(self, filename, silent=False, allow_pickle=False):
+        """
+        Updates recursively the value in the the config from a binary file
+        written by :meth:`dump_binary`.
+
+        Configs with values that :mod:`marshal` doesn't support are written
+        with :mod:`pickle`. Loading a pickled file executes arbitrary code
+        if someone else is able to write to it, so such files are refused
+        unless ``allow_pickle`` is passed. Allow it for trusted files only.
+
+        :param filename: (str) a filename of the binary file
+        :param silent: (bool) fails silently if something wrong with the file
+        :param allow_pickle: (bool) load pickled files as well
+        :returns: (:class:`MergeStats`) a merge report
+        :raises ValueError: the file isn't a binary config, it's written by
+                            an incompatible version of Python, or it's
+                            pickled while pickle isn't allowed
+
+        .. versionadded:: 0.5.0
+        """
+        conf = {}
+        try:
+            with open(filename, 'rb') as f:
+                conf = _load_binary(f, allow_pickle)
+        except Exception:
+            if not silent:
+                raise
+        return self.update(conf)
+
+    def dump_json(self, f, indent=None, sort_keys=False, ensure_ascii=True):
+        """
+        Writes the config to a given file object as JSON.
+
+        The config is written straight from its data, node by node, without
+        wrapping subtrees; consecutive values of a node are encoded at once
+        by the C encoder. If ``indent`` is passed, the config is written by
+        :func:`json.dump` as is, since the C encoder doesn't indent.
+
+        :param f: (file) a text file object to write to
+        :param indent: (int) a number of spaces to indent nested values
+        :param sort_keys: (bool) write keys in sorted order
+        :param ensure_ascii: (bool) escape non-ASCII characters
+
+        .. versionadded:: 0.5.0
+        """
+        if indent is not None:
+            return json.dump(
+                self._data, f, indent=indent, sort_keys=sort_keys,
+                ensure_ascii=ensure_ascii)
+        _dump_json(self._data, f, sort_keys, ensure_ascii)
+
+    def dump_yaml(self, f, **kwargs):
+        """
+        Writes the config to a given file object as YAML.
+
+        The method requires the PyYAML to be installed. The safe dumper is
+        used, the LibYAML based one if available, and it writes the file
+        while walking the config.
+
+        :param f: (file) a text file object to write to
+        :param kwargs: options to be passed to :func:`yaml.dump`; block
+                       style and unicode characters are used by default
+
+        .. versionadded:: 0.5.0
+        """
+        if not yaml:
+            raise AttributeError(
+                'You need to install PyYAML before using this method!')
+
+        kwargs.setdefault('default_flow_style', False)
+        kwargs.setdefault('allow_unicode', True)
+        yaml.dump(self._data, f, Dumper=_YAMLDumper, **kwargs)
+
+    def dump_binary(self, f):
+        """
+        Writes the config to a given file object in a compact binary form.
+
+        The :mod:`marshal` format is used, since it's loaded several times
+        faster than JSON, but it supports built-in types only, so
+        :mod:`pickle` is used for configs with other values (e.g. dates
+        from YAMLs). Marshaled configs can be loaded by the same version
+        of Python only. Use :meth:`from_binary` to load the file.
+
+        Pickled configs may execute arbitrary code once loaded, so they are
+        loaded only if it's allowed explicitly. Keep the file where only
+        trusted users are able to write to it.
+
+        :param f: (file) a binary file object to write to
+
+        .. versionadded:: 0.5.0
+        """
+        loads, data = _dumps(self._data)
+        f.write(_BINARY_MAGIC)
+        f.write(b'm' if loads is marshal.loads else b'p')
+        f.write(bytes(bytearray(sys.version_info[:2])))
+        f.write(data)
+
+    def update(self, iterable={}, **kwargs):
+        """
+        Updates recursively a self with a given iterable.
+
+        Values are merged according to merge strategies of the instance,
+        see :class:`Merger` for details.
+
+        :param iterable: (dict or iterable) a dictionary or an iterable of
+                         ``(key, value)`` pairs to merge
+        :returns: (:class:`MergeStats`) a merge report
+        """
+        # adopt iterable sequence to unified interface: (key, value)
+        if isinstance(iterable, Conf):
+            iterable = iterable._data
+        if isinstance(iterable, dict):
+            iterable = iterable.items()
+
+        iterable = itertools.chain(iterable, kwargs.items())
+        if self._hashes:
+            iterable = list(iterable)
+            _forget_merged(self._hashes, self._data, iterable)
+
+        # subtrees may be replaced, so drop their views
+        self._views.clear()
+        return self._merger.merge(self._data, iterable)
+
+    def get_many(self, keys, default=None):
+        """
+        Returns values of given compound keys.
+
+        It's a faster equivalent of ``[conf.get(key) for key in keys]``.
+        Large batches are grouped by key prefixes, so a prefix shared by a
+        few keys (e.g. ``db.primary`` of ``db.primary.host`` and
+        ``db.primary.port``) is walked once.
+
+        :param keys: (iterable) compound keys or :class:`KeyPath` instances
+        :param default: (object) a value for keys that don't exist
+        :returns: (list) values in order of the given keys
+
+        .. versionadded:: 0.5.0
+        """
+        keys = list(keys)
+        data = self._data
+
+        # it's a hot loop, so avoid attribute lookups
+        rv = []
+        append = rv.append
+
+        # Compiled keys of small batches are likely cached, and walking
+        # a cached key is cheaper than grouping. Large batches don't fit
+        # the cache, so it's cheaper to split keys in halves and group
+        # them by the first one.
+        if len(keys) <= _KEYPATH_CACHE_SIZE:
+            compile_key = self._compile_key
+
+            for key in keys:
+                if key.__class__ is not KeyPath:
+                    key = compile_key(key)
+
+                node = data
+                try:
+                    for part in key:
+                        node = node[part]
+                except (KeyError, TypeError):
+                    append(default)
+                    continue
+
+                if isinstance(node, dict):
+                    # a view has to be bound to its path
+                    node = self[key]
+                append(node)
+
+            return rv
+
+        separator = self._separator
+        nodes = {None: data, (): data}
+        lookup = nodes.get
+
+        for key in keys:
+            if isinstance(key, tuple):
+                parent, leaf = key[:-1], key[-1]
+            else:
+                parent, found, leaf = key.rpartition(separator)
+                if not found:
+                    parent = None
+
+            node = lookup(parent, _missing)
+            if node is _missing:
+                node = _walk(nodes, parent, separator)
+
+            if isinstance(node, dict):
+                value = node.get(leaf, default)
+                if isinstance(value, dict):
+                    value = self[key]
+                append(value)
+            else:
+                append(default)
+
+        return rv
+
+    def set_many(self, iterable):
+        """
+        Sets values of given compound keys.
+
+        It's a faster equivalent of setting the values one by one, since a
+        prefix shared by a few keys is walked once.
+
+        :param iterable: (dict or iterable) a dictionary of compound keys
+                         and values, or an iterable of ``(key, value)`` pairs
+
+        .. versionadded:: 0.5.0
+        """
+        self._set_many(self._data, iterable)
+
+    def _set_many(self, data, iterable, copy=False):
+        if isinstance(iterable, dict):
+            iterable = iterable.items()
+
+        separator = self._separator
+        hashes = self._hashes
+        nodes = {None: data, (): data}
+
+        for key, value in iterable:
+            if isinstance(key, tuple):
+                parent, leaf = key[:-1], key[-1]
+            else:
+                parent, found, leaf = key.rpartition(separator)
+                if not found:
+                    parent = None
+
+            node = nodes.get(parent, _missing)
+            if node is _missing:
+                node = _walk(nodes, parent, separator, True, copy, hashes)
+            if not isinstance(node, dict):
+                raise TypeError('%r is not a dictionary.' % (parent, ))
+
+            old = node.get(leaf)
+            if hashes:
+                _forget(hashes, node)
+                if isinstance(old, dict):
+                    _forget_tree(hashes, old)
+            if isinstance(old, dict):
+                # a replaced subtree may be memoized
+                nodes = {None: data, (): data}
+                self._drop_views()
+            node[leaf] = value
+
+    def delete_many(self, keys):
+        """
+        Removes given compound keys from the instance.
+
+        It's a faster equivalent of deleting the keys one by one. Large
+        batches are grouped by key prefixes, so a prefix shared by a few
+        keys is walked once.
+
+        :param keys: (iterable) compound keys or :class:`KeyPath` instances
+        :raises KeyError: a given key does not exist; keys that precede it
+                          are removed anyway
+
+        .. versionadded:: 0.5.0
+        """
+        if not isinstance(keys, (list, tuple)):
+            keys = list(keys)
+        data = self._data
+
+        # Grouping doesn't pay off for small batches, since their compiled
+        # keys are likely cached, so they're walked key by key.
+        if len(keys) > _SMALL_BATCH:
+            return self._delete_many(data, keys)
+
+        hashes = self._hashes
+        compile_key = self._compile_key
+
+        for key in keys:
+            if key.__class__ is not KeyPath:
+                key = compile_key(key)
+
+            node, leaf = data, key[-1]
+            try:
+                for part in key[:-1]:
+                    node = node[part]
+            except (KeyError, TypeError):
+                node = None
+            if not isinstance(node, dict) or leaf not in node:
+                raise KeyError(leaf)
+
+            old = node.pop(leaf)
+            if hashes:
+                _forget(hashes, node)
+                if isinstance(old, dict):
+                    _forget_tree(hashes, old)
+            if isinstance(old, dict):
+                self._drop_views()
+
+    def _delete_many(self, data, keys, copy=False):
+        separator = self._separator
+        hashes = self._hashes
+        nodes = {None: data, (): data}
+
+        for key in keys:
+            if isinstance(key, tuple):
+                parent, leaf = key[:-1], key[-1]
+            else:
+                parent, found, leaf = key.rpartition(separator)
+                if not found:
+                    parent = None
+
+            node = nodes.get(parent, _missing)
+            if node is _missing:
+                node = _walk(nodes, parent, separator, copy=copy,
+                             hashes=hashes)
+            if not isinstance(node, dict) or leaf not in node:
+                raise KeyError(leaf)
+
+            old = node.pop(leaf)
+            if hashes:
+                _forget(hashes, node)
+                if isinstance(old, dict):
+                    _forget_tree(hashes, old)
+            if isinstance(old, dict):
+                nodes = {None: data, (): data}
+                self._drop_views()
+
+    def _drop_views(self):
+        self._views.clear()
+
+    def diff(self, other):
+        """
+        Compares the instance with a given config.
+
+        Values are compared recursively, so the diff consists of leaf
+        values, except dictionaries that are added or removed as a whole.
+        Dictionaries that are the same object in both configs are skipped
+        without walking, so configs that share most of their subtrees,
+        like versions of :class:`ConcurrentConf` or layers of
+        :class:`LayeredConf`, are compared in time proportional to the
+        difference. ::
+
+            diff = old.diff(new)
+            for key in diff.changed:
+                restart_component(key)
+
+        :param other: (dict or :class:`Conf`) a config to compare with
+        :returns: (:class:`ConfDiff`) values that differ in the given config
+
+        .. versionadded:: 0.5.0
+        """
+        if isinstance(other, (Conf, FrozenConf)):
+            other = other._data
+        return ConfDiff(*_diff(self._data, other))
+
+    def apply_patch(self, diff):
+        """
+        Applies a given diff, so the instance becomes equal to the config
+        the diff was made with.
+
+        Old values in the diff aren't checked, and new ones are copied.
+
+        :param diff: (:class:`ConfDiff`) a diff made by :meth:`diff`
+        :raises KeyError: a removed key does not exist
+
+        .. versionadded:: 0.5.0
+        """
+        self.delete_many(diff.removed)
+        self.set_many(_patch_items(diff))
+
+    def fingerprint(self):
+        """
+        Returns a fingerprint of the instance.
+
+        The fingerprint is a SHA-1 hex digest of the structure and values
+        of the config, so equal configs have equal fingerprints regardless
+        of key order, process and Python version. It's handy as a cache key
+        for objects that are built from the config::
+
+            pool = pools.get(conf['db'].fingerprint())
+
+        Fingerprints of all subtrees are cached, and changes made through
+        the instance or its views drop only fingerprints of nodes along
+        a changed path, so a fingerprint is computed again in time
+        proportional to the depth of the change.
+
+        .. note:: Changes made to values in place (e.g. appending to
+                  a list) aren't tracked; set a new value instead.
+
+        :returns: (str) a hex digest
+
+        .. versionadded:: 0.5.0
+        """
+        return _fingerprint(self._data, self._hashes)
+
+    def compact(self, pool=None):
+        """
+        Reduces memory taken by the instance.
+
+        Equal keys and immutable values are replaced with the same object,
+        and dictionaries are rebuilt; see :func:`compact` for details. It's
+        worth to call the method once big configs are loaded, especially
+        if there are a lot of instances that may share a pool::
+
+            pool = {}
+            for tenant in tenants:
+                tenant.conf.compact(pool)
+
+        :param pool: (dict) a pool of shared values
+        :returns: (dict) the pool
+
+        .. versionadded:: 0.5.0
+        """
+        return compact(self._data, pool)
+
+    def freeze(self):
+        """
+        Returns an immutable snapshot of the instance.
+
+        The snapshot is a read-only mapping that keeps a flat index of all
+        compound keys, so a lookup of a key of any depth takes exactly one
+        hash lookup. It's a good choice for hot read paths. The snapshot
+        owns a copy of the data, so further changes of the instance don't
+        affect it.
+
+        :returns: (:class:`FrozenConf`) a snapshot of the instance
+
+        .. versionadded:: 0.5.0
+        """
+        return FrozenConf(self._data, separator=self._separator)
+
+    def __getitem__(self, compound_key):
+        """
+        Returns a value that's associated with a given compound key.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :returns: (object) retrieved value if key exists
+        :raises KeyError: a given key does not exist
+        """
+        conf = self._data
+
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+
+        for key in compound_key:
+            conf = conf[key]
+
+        # We need to return dict as Conf instance to make possible use Conf's
+        # features on it. The returned object is used exactly like a wrapper,
+        # since it doesn't make a full copy of a given dict. Wrappers are
+        # cached, so repeated lookups don't allocate anything.
+        if isinstance(conf, dict):
+            rv = self._views.get(id(conf))
+            if rv is None:
+                rv = self._view(conf, compound_key)
+            return rv
+
+        return conf
+
+    def _view(self, node, keys):
+        """
+        Creates a view of a given subtree, and caches it.
+        """
+        view = Conf.__new__(Conf)
+        view._data = node
+        view._separator = self._separator
+        view._compile_key = self._compile_key
+        view._merger = self._merger
+        if self._merger is not _default_merger:
+            view._merger = self._merger.subtree(keys)
+        view._views = self._views
+        view._hashes = self._hashes
+
+        # the view keeps the node alive, so its id can't be reused while
+        # the view is cached
+        self._views[id(node)] = view
+        return view
+
+    def __setitem__(self, compound_key, value):
+        """
+        Sets a value for given option.
+
+        :param compound_key: (str or :class:`KeyPath`) an option to change
+        :param value: (object) a value to set
+        :raises KeyError: an option doesn't exist
+        """
+        conf = self._data
+        hashes = self._hashes
+        keys = self.compile_key(compound_key)
+        for key in keys[:-1]:
+            if key not in conf:
+                if hashes:
+                    _forget(hashes, conf)
+                conf[key] = {}
+            conf = conf[key]
+
+        old = conf[keys[-1]] if keys[-1] in conf else None
+        if hashes:
+            _forget(hashes, conf)
+            if isinstance(old, dict):
+                _forget_tree(hashes, old)
+
+        # don't keep a replaced subtree alive by its view
+        if isinstance(old, dict):
+            self._views.clear()
+        conf[keys[-1]] = value
+
+    def __delitem__(self, compound_key):
+        """
+        Remove a given compound key from the instance.
+
+        :param compound_key: (str or :class:`KeyPath`) a key to delete
+        """
+        conf = self._data
+        keys = self.compile_key(compound_key)
+        for key in keys[:-1]:
+            conf = conf[key]
+
+        value = conf[keys[-1]]
+        del conf[keys[-1]]
+
+        if self._hashes:
+            _forget(self._hashes, conf)
+            if isinstance(value, dict):
+                _forget_tree(self._hashes, value)
+        if isinstance(value, dict):
+            self._views.clear()
+
+    def get(self, compound_key, default=None):
+        """
+        Returns a value that's associated with a given compound key, or
+        a default value if there's no such key.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :param default: (object) a value to return if there's no such key
+        :returns: (object) retrieved value
+        """
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+
+        value = _lookup(self._data, compound_key)
+        if value is _missing:
+            return default
+        if isinstance(value, dict):
+            return self._wrap(value, compound_key)
+        return value
+
+    def _wrap(self, node, keys):
+        """
+        Returns a cached view of a given subtree.
+        """
+        rv = self._views.get(id(node))
+        if rv is None:
+            rv = self._view(node, keys)
+        return rv
+
+    def items(self):
+        """
+        Returns a view of pairs of top-level keys and values.
+
+        Values are taken from the data as is, rather than by looking up
+        each key; only dictionaries are wrapped into views.
+        """
+        return _ItemsView(self)
+
+    def values(self):
+        """
+        Returns a view of top-level values.
+
+        Values are taken from the data as is, rather than by looking up
+        each key; only dictionaries are wrapped into views.
+        """
+        return _ValuesView(self)
+
+    def walk(self):
+        """
+        Yields compound keys and values of all leaves of the config.
+
+        The config is walked in one pass, and subtrees aren't wrapped into
+        views, so it's the fastest way to go through all values. Empty
+        dictionaries have no leaves, so they're skipped. ::
+
+            for compound_key, value in conf.walk():
+                print(compound_key, value)
+
+        :returns: (generator) pairs of compound keys and values
+
+        .. versionadded:: 0.5.0
+        """
+        separator = self._separator
+        stack = [('', iter(self._data.items()))]
+
+        while stack:
+            prefix, items = stack[-1]
+
+            for key, value in items:
+                if not isinstance(key, string_types):
+                    key = '%s' % (key, )
+
+                if isinstance(value, dict):
+                    stack.append((
+                        prefix + key + separator, iter(value.items())))
+                    break
+                yield prefix + key, value
+            else:
+                stack.pop()
+
+    def copy(self):
+        """
+        Returns a deep copy of the instance.
+
+        The copy has the same separator and merge strategies.
+
+        :returns: (:class:`Conf`) a copy of the instance
+
+        .. versionadded:: 0.5.0
+        """
+        rv = Conf(separator=self._separator)
+        rv._merger = self._merger
+        rv._merger.merge(rv._data, self._data, copy=True)
+        return rv
+
+    def __contains__(self, compound_key):
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+        return _lookup(self._data, compound_key) is not _missing
+
+    def __eq__(self, other):
+        if isinstance(other, (Conf, FrozenConf)):
+            other = other._data
+        elif not isinstance(other, dict):
+            if not isinstance(other, collections.Mapping):
+                return NotImplemented
+            other = dict(other.items())
+        return self._data == other
+
+    def __ne__(self, other):
+        rv = self.__eq__(other)
+        return rv if rv is NotImplemented else not rv
+
+    __hash__ = None
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __str__(self):
+        return str(self._data)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+class FrozenConf(collections.Mapping):
+    """
+    An immutable snapshot of configuration data.
+
+    The class is designed for hot read paths. Unlike :class:`Conf`, which
+    walks nested dictionaries one level at a time, the snapshot keeps
+    a precomputed flat index from each compound key to its value, so a key
+    of any depth is retrieved by one hash lookup::
+
+        snapshot = conf.freeze()
+        timezone = snapshot['ukraine.kharkiv.timezone']
+
+    Nested dictionaries are returned as :class:`FrozenConf` instances that
+    share the index of the snapshot they belong to. Non-scalar leaves are
+    copied while building the snapshot, so changing the source doesn't
+    affect it.
+
+    Usually you don't need to create the snapshot directly; use the
+    :meth:`Conf.freeze` method instead.
+
+    :param conf:
+        A dictionary or a :class:`Conf` instance to create a snapshot of.
+    :param separator:
+        A character that's used as separator in compound keys
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, conf={}, **options):
+        if isinstance(conf, (Conf, FrozenConf)):
+            conf = conf._data
+
+        self._separator = options.get('separator', Conf.default_separator)
+        self._prefix = ''
+        self._views = {}
+        self._data, self._index = self._build(conf, self._separator)
+
+    @staticmethod
+    def _build(conf, separator):
+        """
+        Copies a given tree and builds a flat index of its compound keys.
+
+        The tree is walked with an explicit stack, so there's no recursion
+        limit on its depth.
+        """
+        data, index = {}, {}
+        stack = [(conf, data, '')]
+
+        while stack:
+            src, dst, prefix = stack.pop()
+
+            for key, value in src.items():
+                if isinstance(value, (Conf, FrozenConf)):
+                    value = value._data
+
+                if isinstance(value, dict):
+                    node = dst[key] = {}
+                    if prefix is not None and isinstance(key, string_types):
+                        compound_key = prefix + key
+                        index[compound_key] = node
+                        stack.append((value, node, compound_key + separator))
+                    else:
+                        # keys that aren't strings can't be a part of any
+                        # compound key, so there's nothing to index below
+                        stack.append((value, node, None))
+                    continue
+
+                value = dst[key] = _copy_value(value)
+                if prefix is not None and isinstance(key, string_types):
+                    index[prefix + key] = value
+
+        return data, index
+
+    def _view(self, compound_key, node):
+        """
+        Returns a snapshot of a given subtree that shares the flat index.
+        """
+        try:
+            return self._views[compound_key]
+        except KeyError:
+            pass
+
+        view = FrozenConf.__new__(FrozenConf)
+        view._separator = self._separator
+        view._prefix = compound_key + self._separator
+        view._views = self._views
+        view._data = node
+        view._index = self._index
+
+        return self._views.setdefault(compound_key, view)
+
+    def freeze(self):
+        """
+        Returns the snapshot itself, since it's immutable already.
+
+        :returns: (:class:`FrozenConf`) the instance
+        """
+        return self
+
+    def get(self, compound_key, default=None):
+        """
+        Returns a value for a given compound key, or a default one.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :param default: (object) a fallback value
+        :returns: (object) retrieved value if key exists; otherwise the
+                  default one
+        """
+        try:
+            return self[compound_key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, compound_key):
+        """
+        Returns a value that's associated with a given compound key.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :returns: (object) retrieved value if key exists
+        :raises KeyError: a given key does not exist
+        """
+        if compound_key.__class__ is KeyPath:
+            compound_key = self._separator.join(compound_key)
+
+        compound_key = self._prefix + compound_key
+        value = self._index[compound_key]
+
+        if value.__class__ is dict:
+            return self._view(compound_key, value)
+        return value
+
+    def __contains__(self, compound_key):
+        if compound_key.__class__ is KeyPath:
+            compound_key = self._separator.join(compound_key)
+        return self._prefix + compound_key in self._index
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __str__(self):
+        return str(self._data)
+
+    def __repr__(self):
+        return repr(self._data)
+
+
+class _Layers(tuple):
+    """
+    A stack of nodes that are merged lazily; the top-most node goes first.
+    """
+    __slots__ = ()
+
+
+class _OwnedDict(dict):
+    """
+    A node that belongs to a :class:`LayeredConf` and may be changed in place.
+    """
+    __slots__ = ()
+
+
+def _is_node(value):
+    return isinstance(value, dict) or value.__class__ is _Layers
+
+
+def _stack(*nodes):
+    """
+    Returns a stack of given nodes; nested stacks are flattened.
+    """
+    layers = []
+    for node in nodes:
+        if node.__class__ is _Layers:
+            layers.extend(node)
+        else:
+            layers.append(node)
+    return layers[0] if len(layers) == 1 else _Layers(layers)
+
+
+def _child(node, key, strategy=None):
+    """
+    Returns a child of a given node, resolving it through the stack.
+
+    Values of a key with a merge strategy other than :data:`MERGE` are
+    resolved the same way :class:`Merger` merges them, layer by layer from
+    the bottom one.
+
+    :raises KeyError: a given key does not exist on any layer
+    """
+    if node.__class__ is not _Layers:
+        return node[key]
+
+    if strategy is not None and strategy != MERGE:
+        found = [layer[key] for layer in node if key in layer]
+        if not found:
+            raise KeyError(key)
+        if strategy == REPLACE:
+            return found[0]
+
+        strategy = _STRATEGIES.get(strategy, strategy)
+        value = found[-1]
+        for upper in reversed(found[:-1]):
+            value = strategy(value, upper)
+        return value
+
+    found = []
+    for layer in node:
+        try:
+            value = layer[key]
+        except KeyError:
+            continue
+
+        if _is_node(value):
+            found.append(value)
+        elif found:
+            # a dictionary of an upper layer overrides anything but
+            # dictionaries in lower ones, so stop merging here
+            break
+        else:
+            return value
+
+    if not found:
+        raise KeyError(key)
+    return _stack(*found)
+
+
+def _own(node, trie=None):
+    """
+    Returns a shallow copy of a given node that may be changed in place.
+
+    Subnodes aren't copied, they're referenced; lower layers of a stack are
+    merged into the result, subnodes of a few layers become new stacks.
+    Values of keys with merge strategies of a given trie of a
+    :class:`Merger` are resolved by :func:`_child`.
+    """
+    if node.__class__ is not _Layers:
+        return _OwnedDict(node)
+
+    rv = _OwnedDict()
+    for layer in reversed(node):
+        for key, value in layer.items():
+            if key in rv and _is_node(value) and _is_node(rv[key]):
+                value = _stack(value, rv[key])
+            rv[key] = value
+
+    if trie is not None:
+        for key, subtrie in trie[1].items():
+            if subtrie[0] is not None and key in rv:
+                rv[key] = _child(node, key, subtrie[0])
+    return rv
+
+
+def _subtrie(trie, key):
+    """
+    Returns a node of a trie of a :class:`Merger` for a given key.
+    """
+    return trie[1].get(key) if trie is not None else None
+
+
+class LayeredConf(Conf):
+    """
+    A :class:`Conf` that keeps its sources as immutable layers.
+
+    The class is designed for cases when lots of configs are built from
+    the same big defaults and small per-case overrides. Unlike :class:`Conf`
+    it neither copies sources, nor merges them eagerly. Each source is kept
+    as a layer, and lookups are resolved through the stack of layers from
+    the top-most one to the bottom::
+
+        defaults = json.load(f)
+
+        tenants = dict(
+            (name, LayeredConf(defaults, overrides))
+            for name, overrides in tenant_overrides.items())
+
+    Writes are copy-on-write: a node is copied (shallowly) only when it or
+    any of its subnodes is changed, and the copy lives in the instance,
+    so layers stay untouched and may be safely shared between thousands of
+    instances. The :meth:`update` method pushes a new layer on the top of
+    the stack.
+
+    .. note:: Layers are never copied, so they must not be changed after
+              they were passed to the instance. Scalars and lists from
+              layers are returned as is, don't change them in place.
+
+    :param layers:
+        A list of dictionaries to create an instance based on it.
+        Each next dictionary overrides settings from the previous one.
+    :param separator:
+        A character that's used as separator in compound keys
+    :param strategies:
+        A dictionary of compound keys and merge strategies to be used for
+        values of those keys; values are resolved through the stack of
+        layers the same way :meth:`Conf.update` merges them.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, *layers, **options):
+        self._separator = options.get('separator', self.default_separator)
+        self._compile_key = _get_keypath_cache(self._separator)
+
+        strategies = options.get('strategies')
+        if strategies:
+            self._merger = Merger(strategies, self._separator)
+        else:
+            self._merger = _default_merger
+
+        #: a root instance and a path of the node it represents; views
+        #: returned by __getitem__ share the root with it
+        self._base = self
+        self._prefix = KeyPath(())
+
+        self._root = _OwnedDict()
+        self._cache = None
+
+        for layer in layers:
+            self.update(layer)
+
+    def _node(self, keys=()):
+        node = self._base._root
+        trie = self._base._merger._trie
+        for key in self._prefix + keys:
+            trie = _subtrie(trie, key)
+            node = _child(node, key, trie and trie[0])
+        return node
+
+    def _find(self, keys):
+        """
+        Returns a node of a given path, or ``_missing`` if there's no such
+        path, including one that goes through a value that isn't a node.
+        """
+        node = self._base._root
+        trie = self._base._merger._trie
+        for key in self._prefix + keys:
+            if not _is_node(node):
+                return _missing
+
+            trie = _subtrie(trie, key)
+            try:
+                node = _child(node, key, trie and trie[0])
+            except KeyError:
+                return _missing
+        return node
+
+    def _trie(self):
+        """
+        Returns a node of the merger's trie for the instance's path.
+        """
+        trie = self._base._merger._trie
+        for key in self._prefix:
+            trie = _subtrie(trie, key)
+        return trie
+
+    def _own_path(self, keys, create=True):
+        """
+        Copies nodes along a given path unless they're copied already, and
+        returns the last one.
+        """
+        base = self._base
+        base._cache = None
+
+        trie = base._merger._trie
+        if base._root.__class__ is not _OwnedDict:
+            base._root = _own(base._root, trie)
+
+        node = base._root
+        for key in self._prefix + keys:
+            trie = _subtrie(trie, key)
+            if key in node:
+                child = node[key]
+                if child.__class__ is not _OwnedDict and _is_node(child):
+                    child = node[key] = _own(child, trie)
+            elif create:
+                child = node[key] = _OwnedDict()
+            else:
+                raise KeyError(key)
+            node = child
+        return node
+
+    def _view(self, keys):
+        view = LayeredConf.__new__(LayeredConf)
+        view._separator = self._separator
+        view._compile_key = self._compile_key
+        view._merger = self._merger
+        if self._merger is not _default_merger:
+            view._merger = self._merger.subtree(keys)
+        view._base = self._base
+        view._prefix = self._prefix + keys
+        return view
+
+    @property
+    def _data(self):
+        """
+        A merged copy of all layers as a plain dictionary.
+
+        The copy is built on first access and cached until the next change
+        of the instance. It must not be changed.
+        """
+        base = self._base
+        if self is base and base._cache is not None:
+            return base._cache
+
+        data = {}
+        stack = [(self._node(), data, self._trie())]
+
+        while stack:
+            src, dst, trie = stack.pop()
+            for key, value in _own(src, trie).items():
+                if _is_node(value):
+                    dst[key] = {}
+                    stack.append((value, dst[key], _subtrie(trie, key)))
+                else:
+                    dst[key] = value
+
+        if self is base:
+            base._cache = data
+        return data
+
+    def from_json(self, filename, encoding='utf-8', silent=False,
+                  stream=False, cache=None, lazy=False):
+        """
+        Loads a JSON file as a new layer.
+
+        Layers are never merged, so there's nothing to save by streaming;
+        the ``stream`` parameter is accepted for compatibility only. In
+        lazy mode objects of the layer are decoded on first access.
+        """
+        if lazy:
+            return super(LayeredConf, self).from_json(
+                filename, encoding, silent, cache=cache, lazy=True)
+        return self.from_file(json.load, filename, encoding, silent, cache)
+
+    def update(self, iterable={}, **kwargs):
+        """
+        Pushes a given iterable on the top of the stack of layers.
+
+        Dictionaries (as well as :class:`Conf` instances) are used as is,
+        without copying; other iterables should produce ``(key, value)``
+        pairs.
+        """
+        if isinstance(iterable, Conf):
+            iterable = iterable._data
+        elif not isinstance(iterable, dict):
+            iterable = dict(iterable)
+
+        base = self._base
+
+        for layer in (iterable, kwargs):
+            if not layer:
+                continue
+
+            # a layer for the view has to be nested into the view's path
+            for key in reversed(self._prefix):
+                layer = {key: layer}
+
+            if base._root:
+                base._root = _stack(layer, base._root)
+            else:
+                base._root = layer
+            base._cache = None
+
+    def get_many(self, keys, default=None):
+        """
+        Returns values of given compound keys; each of them is resolved
+        through the stack of layers, so layers aren't merged.
+        """
+        compile_key = self._compile_key
+
+        rv = []
+        for key in keys:
+            if key.__class__ is not KeyPath:
+                key = compile_key(key)
+
+            value = self._find(key)
+            if value is _missing:
+                value = default
+            elif _is_node(value):
+                value = self._view(key)
+            rv.append(value)
+        return rv
+
+    def set_many(self, iterable):
+        """
+        Sets values of given compound keys one by one.
+        """
+        if isinstance(iterable, dict):
+            iterable = iterable.items()
+        for key, value in iterable:
+            self[key] = value
+
+    def delete_many(self, keys):
+        """
+        Removes given compound keys one by one.
+        """
+        for key in keys:
+            del self[key]
+
+    def compact(self, pool=None):
+        """
+        Reduces memory taken by nodes the instance owns, i.e. ones that
+        are copied on write; see :func:`compact` for details.
+
+        Layers must not be changed, so they aren't compacted, as well as
+        dictionaries and lists that are referenced by owned nodes, since
+        they may belong to layers. Use :func:`compact` on layers before
+        passing them instead.
+
+        :param pool: (dict) a pool of shared values
+        :returns: (dict) the pool
+        """
+        if pool is None:
+            pool = {}
+
+        self._base._cache = None
+        stack = [self._node()]
+
+        while stack:
+            node = stack.pop()
+            if node.__class__ is not _OwnedDict:
+                continue
+
+            items = [
+                (_share(pool, key), _share(pool, value))
+                for key, value in node.items()]
+            node.clear()
+            node.update(items)
+            stack.extend(node.values())
+
+        return pool
+
+    # layers are merged on access to the data, so lookups are resolved
+    # through the stack of layers key by key instead
+    items = collections.MutableMapping.items
+    values = collections.MutableMapping.values
+
+    def get(self, compound_key, default=None):
+        """
+        Returns a value that's associated with a given compound key, or
+        a default value if there's no such key.
+        """
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+
+        value = self._find(compound_key)
+        if value is _missing:
+            return default
+        if _is_node(value):
+            return self._view(compound_key)
+        return value
+
+    def __contains__(self, compound_key):
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+        return self._find(compound_key) is not _missing
+
+    def copy(self):
+        """
+        Returns a copy of the instance that has a merged copy of all the
+        layers as a single layer.
+        """
+        rv = LayeredConf(self._data, separator=self._separator)
+        rv._merger = self._merger
+        return rv
+
+    def fingerprint(self):
+        """
+        Returns a fingerprint of the instance.
+
+        Layers are merged into a new tree on every change, so fingerprints
+        of the instance aren't cached, and each call hashes the whole tree.
+        """
+        return _fingerprint(self._data, {})
+
+    def __getitem__(self, compound_key):
+        """
+        Returns a value that's associated with a given compound key.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :returns: (object) retrieved value if key exists
+        :raises KeyError: a given key does not exist
+        """
+        keys = self.compile_key(compound_key)
+        value = self._node(keys)
+
+        # a dictionary is returned as a view of the same instance, so
+        # changes made through it are copied on write as well
+        if _is_node(value):
+            return self._view(keys)
+        return value
+
+    def __setitem__(self, compound_key, value):
+        """
+        Sets a value for given option.
+
+        :param compound_key: (str or :class:`KeyPath`) an option to change
+        :param value: (object) a value to set
+        """
+        keys = self.compile_key(compound_key)
+        self._own_path(keys[:-1])[keys[-1]] = value
+
+    def __delitem__(self, compound_key):
+        """
+        Remove a given compound key from the instance.
+
+        :param compound_key: (str or :class:`KeyPath`) a key to delete
+        """
+        keys = self.compile_key(compound_key)
+        del self._own_path(keys[:-1], create=False)[keys[-1]]
+
+    def __iter__(self):
+        node = self._node()
+        if node.__class__ is not _Layers:
+            return iter(node)
+        return iter(_own(node))
+
+    def __len__(self):
+        node = self._node()
+        if node.__class__ is not _Layers:
+            return len(node)
+        return len(_own(node))
+
+
+class ConcurrentConf(Conf):
+    """
+    A :class:`Conf` that may be shared between threads.
+
+    The instance keeps its data as a chain of immutable versions. Readers
+    never take a lock: a lookup grabs the current version and walks it,
+    and since the version is never changed, the reader can't see a
+    half-merged tree. Writers are serialized by a lock; each of them copies
+    (shallowly) nodes along paths it changes, so the rest of the tree is
+    shared with the previous version, and then publishes the new version
+    by a single assignment::
+
+        conf = ConcurrentConf(defaults)
+
+        # in request threads
+        timeout = conf['http.timeout']
+
+        # in a reload thread
+        conf.update(overrides)
+
+    Each single lookup is consistent. If you need a few values from the
+    same version, take a snapshot by :meth:`freeze` and read them from it.
+
+    Values are copied on write, so the data passed to the instance may be
+    changed later. Views returned for dictionaries are bound to a path,
+    not to a version, so they always see the latest one.
+
+    .. note:: Scalars and lists are returned as is, so don't change them
+              in place, set new ones instead.
+
+    :param confs:
+        A list of dictionaries to create an instance based on it.
+        Each next dictionary overrides settings from the previous one.
+    :param separator:
+        A character that's used as separator in compound keys
+    :param strategies:
+        A dictionary of compound keys and merge strategies to be used for
+        values of those keys on update; see :class:`Merger` for details.
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, *confs, **options):
+        self._separator = options.get('separator', self.default_separator)
+        self._compile_key = _get_keypath_cache(self._separator)
+
+        strategies = options.get('strategies')
+        if strategies:
+            self._merger = Merger(strategies, self._separator)
+        else:
+            self._merger = _default_merger
+
+        #: a root instance and a path of the node it represents; views
+        #: returned by __getitem__ share the root with it
+        self._base = self
+        self._prefix = KeyPath(())
+
+        self._lock = threading.Lock()
+
+        #: cached fingerprints of nodes of the latest versions; nodes of
+        #: versions are never changed, so only replaced ones are dropped
+        self._hashes = {}
+
+        data = {}
+        for conf in confs:
+            self._merger.merge(data, conf, copy=True)
+        self._version = data
+
+    @property
+    def _data(self):
+        """
+        A node of the current version. It must not be changed.
+        """
+        node = self._base._version
+        for key in self._prefix:
+            node = node[key]
+        return node
+
+    def _view(self, keys):
+        view = ConcurrentConf.__new__(ConcurrentConf)
+        view._separator = self._separator
+        view._compile_key = self._compile_key
+        view._merger = self._merger
+        if self._merger is not _default_merger:
+            view._merger = self._merger.subtree(keys)
+        view._base = self._base
+        view._prefix = self._prefix + keys
+        view._hashes = self._hashes
+        return view
+
+    def _copy_path(self, keys, create=True):
+        """
+        Returns a copy of the current version's root with nodes copied
+        along a given path, and a copy of the last node.
+
+        Must be called with the lock held.
+        """
+        hashes = self._hashes
+        root = node = dict(self._base._version)
+        if hashes:
+            _forget(hashes, self._base._version)
+
+        for key in self._prefix + keys:
+            if key in node:
+                child = node[key]
+                if not isinstance(child, dict):
+                    raise TypeError('%r is not a dictionary.' % (key, ))
+                if hashes:
+                    _forget(hashes, child)
+                child = node[key] = dict(child)
+            elif create:
+                child = node[key] = {}
+            else:
+                raise KeyError(key)
+            node = child
+
+        return root, node
+
+    def from_json(self, filename, encoding='utf-8', silent=False,
+                  stream=False, cache=None, lazy=False):
+        """
+        Loads a JSON file into a new version.
+
+        The file has to be parsed completely before the new version is
+        published, so the ``stream`` and ``lazy`` parameters are accepted
+        for compatibility only.
+        """
+        return self.from_file(json.load, filename, encoding, silent, cache)
+
+    def update(self, iterable={}, **kwargs):
+        """
+        Updates recursively a self with a given iterable, and publishes
+        the result as a new version.
+
+        Only nodes that are changed by the update are copied.
+        """
+        if isinstance(iterable, Conf):
+            iterable = iterable._data
+        if isinstance(iterable, dict):
+            iterable = iterable.items()
+
+        iterable = itertools.chain(iterable, kwargs.items())
+
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(())
+            if self._hashes:
+                iterable = list(iterable)
+                _forget_merged(self._hashes, node, iterable)
+
+            stats = self._merger.merge(node, iterable, copy=True, shared=True)
+            base._version = root
+        return stats
+
+    def set_many(self, iterable):
+        """
+        Sets values of given compound keys, and publishes the result as
+        a single new version, so readers see either all of the values or
+        none of them.
+        """
+        if isinstance(iterable, dict):
+            iterable = iterable.items()
+
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(())
+            self._set_many(node, (
+                (key, _copy_value(value)) for key, value in iterable), True)
+            base._version = root
+
+    def delete_many(self, keys):
+        """
+        Removes given compound keys, and publishes the result as a single
+        new version.
+        """
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(())
+            self._delete_many(node, keys, True)
+            base._version = root
+
+    def apply_patch(self, diff):
+        """
+        Applies a given diff, and publishes the result as a single new
+        version.
+        """
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(())
+            self._delete_many(node, diff.removed, True)
+            self._set_many(node, _patch_items(diff), True)
+            base._version = root
+
+    def compact(self, pool=None):
+        """
+        Publishes a compacted copy of the node as a new version.
+        """
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(())
+            data = {}
+            self._merger.merge(data, node, copy=True)
+            pool = compact(data, pool)
+
+            node.clear()
+            node.update(data)
+            self._hashes.clear()
+            base._version = root
+        return pool
+
+    def _drop_views(self):
+        # views are bound to paths, so there's nothing to drop
+        pass
+
+    def _wrap(self, node, keys):
+        return self._view(keys)
+
+    def copy(self):
+        """
+        Returns a copy of the instance that shares the latest version with
+        it, since versions are never changed.
+        """
+        rv = ConcurrentConf(separator=self._separator)
+        rv._merger = self._merger
+        rv._version = self._data
+        return rv
+
+    def fingerprint(self):
+        """
+        Returns a fingerprint of the latest version.
+
+        The fingerprint is computed with the lock held, so it's never mixed
+        up with a version that's being published. Versions share unchanged
+        subtrees, so are their cached fingerprints.
+        """
+        with self._base._lock:
+            return _fingerprint(self._data, self._hashes)
+
+    def __getitem__(self, compound_key):
+        """
+        Returns a value that's associated with a given compound key.
+
+        :param compound_key: (str or :class:`KeyPath`) a key for
+                             retrieving value
+        :returns: (object) retrieved value if key exists
+        :raises KeyError: a given key does not exist
+        """
+        if compound_key.__class__ is not KeyPath:
+            compound_key = self._compile_key(compound_key)
+
+        # the version has to be grabbed once, since it may be replaced
+        # by a writer at any moment
+        node = self._base._version
+        for key in self._prefix:
+            node = node[key]
+        for key in compound_key:
+            node = node[key]
+
+        if isinstance(node, dict):
+            return self._view(compound_key)
+        return node
+
+    def __setitem__(self, compound_key, value):
+        """
+        Sets a value for given option, and publishes the result as a new
+        version.
+
+        :param compound_key: (str or :class:`KeyPath`) an option to change
+        :param value: (object) a value to set
+        """
+        keys = self.compile_key(compound_key)
+        value = _copy_value(value)
+
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(keys[:-1])
+            old = node.get(keys[-1])
+            if self._hashes and isinstance(old, dict):
+                _forget_tree(self._hashes, old)
+            node[keys[-1]] = value
+            base._version = root
+
+    def __delitem__(self, compound_key):
+        """
+        Remove a given compound key from the instance, and publishes the
+        result as a new version.
+
+        :param compound_key: (str or :class:`KeyPath`) a key to delete
+        """
+        keys = self.compile_key(compound_key)
+
+        base = self._base
+        with base._lock:
+            root, node = self._copy_path(keys[:-1], create=False)
+            old = node.pop(keys[-1])
+            if self._hashes and isinstance(old, dict):
+                _forget_tree(self._hashes, old)
+            base._version = root
+
+
+def _resolve(trees, keys, merger):
+    """
+    Returns a value that a given path has once given trees are merged.
+
+    Only the values on the path are merged, not the whole trees.
+
+    :param trees: (list) trees to be merged, in order of priority
+    :param keys: (tuple) a path to the value
+    :param merger: (:class:`Merger`) a merger of the trees
+    :returns: a merged value or ``_missing``
+    """
+    merger = merger.subtree(keys[:-1])
+    rv = {}
+
+    for tree in trees:
+        node = tree
+        for key in keys:
+            if not isinstance(node, dict):
+                # a value on the path overrides everything merged before
+                rv.clear()
+                node = _missing
+                break
+
+            node = node.get(key, _missing)
+            if node is _missing:
+                break
+
+        if node is not _missing:
+            merger.merge(rv, {keys[-1]: node}, copy=True)
+
+    return rv.get(keys[-1], _missing)
+
+
+class ConfWatcher(object):
+    """
+    Watches configuration files and reloads them into a :class:`Conf`.
+
+    The watcher keeps a parsed copy of each file it watches, so once a file
+    is changed, only this file is parsed again. Then the old and the new
+    copies are compared, and only changed values are merged again and set
+    to the conf. Subscribers are notified with a set of compound keys that
+    have been changed. ::
+
+        conf = Conf(defaults)
+
+        watcher = ConfWatcher(conf, interval=2.0)
+        watcher.watch('/etc/app/conf.yaml')
+        watcher.watch('/home/app/.app.yaml')
+        watcher.subscribe(lambda keys: log.info('reloaded: %s', keys))
+        watcher.start()
+
+    Files override each other in order they are watched, while a content
+    of the conf at the moment the watcher is created is used as defaults.
+    Changes that are made to the conf in other way may be overwritten.
+
+    The files are polled by modification time, size and inode, since it's
+    the only portable way to watch them. The polling may be done either by
+    a background thread (see :meth:`start`) or by calling :meth:`check`
+    whenever you want. If a file can't be loaded, e.g. it's being written
+    at the moment, its previous content is kept until the next check. A
+    removed file is treated as an empty one.
+
+    :param conf: (:class:`Conf`) a conf to be updated; its merge
+                 strategies are used to merge the files, including ones
+                 of :class:`LayeredConf` and :class:`ConcurrentConf`
+    :param interval: (float) a number of seconds between checks
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, conf, interval=1.0):
+        self.conf = conf
+        self.interval = interval
+
+        self._base = {}
+        conf._merger.merge(self._base, conf, copy=True)
+
+        #: a list of watched files, each of them is a list of a loader,
+        #: a filename, an encoding, a signature and a parsed tree
+        self._files = []
+        self._callbacks = []
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def watch(self, filename, loader=None, encoding='utf-8'):
+        """
+        Loads a given file into the conf and starts watching it.
+
+        :param filename: (str) a path to a file
+        :param loader: (callable) a function that receives a file object
+                       and returns a dictionary; if it's omitted, it's
+                       chosen by the file extension
+        :param encoding: (str) an encoding of the file
+        :returns: (:class:`MergeStats`) a merge report
+        """
+        if loader is None:
+            loader = _get_loader(filename)
+
+        with self._lock:
+            signature = self._signature(filename)
+            with open(filename, encoding=encoding) as f:
+                tree = loader(f)
+
+            self._files.append([loader, filename, encoding, signature, tree])
+
+            # the tree is kept untouched, since it's used to find changes
+            data = {}
+            self.conf._merger.merge(data, tree, copy=True)
+            return self.conf.update(data)
+
+    def subscribe(self, callback):
+        """
+        Registers a function to be called once the conf is reloaded.
+
+        :param callback: (callable) a function that receives a set of
+                         changed compound keys
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Unregisters a given function.
+
+        :param callback: (callable) a function to unregister
+        """
+        with self._lock:
+            self._callbacks.remove(callback)
+
+    def _signature(self, filename):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+    def check(self):
+        """
+        Reloads changed files and applies their changes to the conf.
+
+        :returns: (set) a set of compound keys that have been changed
+        """
+        with self._lock:
+            changed = set()
+
+            for entry in self._files:
+                loader, filename, encoding, signature, old = entry
+
+                signature = self._signature(filename)
+                if signature == entry[3]:
+                    continue
+
+                if signature is None:
+                    new = {}
+                else:
+                    try:
+                        with open(filename, encoding=encoding) as f:
+                            new = loader(f)
+                    except Exception:
+                        continue
+
+                entry[3:] = signature, new
+                for paths in _diff(old, new, expand=True):
+                    changed.update(paths)
+
+            changed = self._apply(changed)
+            if changed:
+                for callback in list(self._callbacks):
+                    callback(changed)
+            return changed
+
+    def _apply(self, paths):
+        conf = self.conf
+        trees = [self._base] + [entry[4] for entry in self._files]
+        changed = set()
+
+        # changes are applied as a single patch, so a ConcurrentConf
+        # publishes them as one version
+        added, removed = {}, {}
+
+        # parents go first, so values of their children are known
+        applied = set()
+        for keys in sorted(paths, key=len):
+            if any(keys[:i] in applied for i in range(1, len(keys))):
+                continue
+
+            keys = KeyPath(keys)
+            value = _resolve(trees, keys, conf._merger)
+            try:
+                old = conf[keys]
+            except KeyError:
+                old = _missing
+            except TypeError:
+                # a parent isn't a dictionary; it'll be set as a whole
+                continue
+            if isinstance(old, Conf):
+                old = old._data
+
+            if value is _missing:
+                if old is _missing:
+                    continue
+                removed[keys] = old
+            elif value == old:
+                continue
+            else:
+                added[keys] = value
+
+            applied.add(tuple(keys))
+            changed.add(conf._separator.join('%s' % (key, ) for key in keys))
+
+        if changed:
+            conf.apply_patch(ConfDiff(added, removed, {}))
+        return changed
+
+    def start(self):
+        """
+        Starts checking the files in a background thread.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the background thread, if it's running.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self._stopped.set()
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # the thread must keep watching, but the error shouldn't
+                # pass silently
+                traceback.print_exc()
+
+
+def _parse_env_value(value):
+    """
+    Parses a value of an environment variable.
+
+    Values are parsed as JSON, so numbers, booleans, ``null``, arrays and
+    objects become typed values; anything else is kept as a string.
+    """
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _lookup(value, keys):
+    """
+    Returns a value of a given path in a tree, or ``_missing``.
+    """
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return _missing
+        value = value[key]
+    return value
+
+
+def _replace_value(tree, keys, value):
+    """
+    Sets a value of a given path in a tree, or removes the path if the
+    value is ``_missing``.
+    """
+    for key in keys[:-1]:
+        if not isinstance(tree.get(key), dict):
+            if value is _missing:
+                return
+            tree[key] = {}
+        tree = tree[key]
+
+    if value is not _missing:
+        tree[keys[-1]] = value
+    else:
+        tree.pop(keys[-1], None)
+
+
+class EnvOverlay(object):
+    """
+    Overrides values of a :class:`Conf` by environment variables.
+
+    Variables that start with a given prefix and a delimiter are mapped to
+    compound keys by splitting the rest of their names by the delimiter,
+    e.g. ``APP__DB__HOST`` with the ``APP`` prefix is mapped to the
+    ``db.host`` key. Values are parsed as JSON, so ``APP__DB__PORT=5432``
+    becomes an integer, and values that aren't valid JSON are kept as
+    strings. ::
+
+        conf = Conf(defaults)
+        conf.from_yaml('/etc/app/conf.yaml')
+
+        overlay = EnvOverlay(conf, 'APP')
+
+    The environment is scanned once, when the overlay is created, and its
+    values are set over the conf, so they have the highest priority. Keys
+    of variables are computed once as well. A value that's overridden is
+    remembered, and it's set back once its variable is removed.
+
+    Values loaded to the conf later may override ones of the overlay;
+    call :meth:`apply` after that to set them again. Call :meth:`refresh`
+    to pick up changes of the environment; only changed variables are
+    parsed and set again.
+
+    :param conf: (:class:`Conf`) a conf to be overridden
+    :param prefix: (str) a prefix of variables' names
+    :param delimiter: (str) a delimiter of keys in variables' names
+    :param lowercase: (bool) lowercase keys
+    :param environ: (dict) an environment to use instead of
+                    :data:`os.environ`
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, conf, prefix, delimiter='__', lowercase=True,
+                 environ=None):
+        self.conf = conf
+        self.prefix = prefix + delimiter
+        self.delimiter = delimiter
+        self.lowercase = lowercase
+
+        self._environ = os.environ if environ is None else environ
+        self._seen = {}
+
+        #: `name` <-> `keys` map of variables' names
+        self._keys = {}
+
+        #: `keys` <-> `value` maps of values of the overlay and values of
+        #: the conf that are overridden by them
+        self._values = {}
+        self._shadowed = {}
+
+        #: `keys` <-> `set of keys` map of values of the overlay nested
+        #: into a given path
+        self._nested = collections.defaultdict(set)
+
+        self.refresh()
+
+    def _key(self, name):
+        keys = self._keys.get(name)
+        if keys is None:
+            parts = name[len(self.prefix):].split(self.delimiter)
+            if self.lowercase:
+                parts = [part.lower() for part in parts]
+            keys = self._keys[name] = KeyPath(parts) if all(parts) else ()
+        return keys
+
+    def _get(self, keys):
+        try:
+            value = self.conf[keys]
+        except (KeyError, TypeError):
+            return _missing
+        if isinstance(value, Conf):
+            value = value._data
+        return value
+
+    def _base_value(self, keys):
+        """
+        Returns a value of the conf that a given key would have without
+        the overlay.
+        """
+        if keys in self._shadowed:
+            return self._shadowed[keys][1]
+
+        # a parent is overridden already, so its value is the one
+        for i in range(len(keys) - 1, 0, -1):
+            if keys[:i] in self._shadowed:
+                return _lookup(self._shadowed[keys[:i]][1], keys[i:])
+
+        value = self._get(keys)
+        nested = [
+            nested for nested in self._nested.get(keys, ())
+            if nested in self._shadowed]
+
+        if nested and isinstance(value, dict):
+            value = copy.deepcopy(value)
+            for nested in sorted(nested, key=len):
+                _replace_value(
+                    value, nested[len(keys):], self._shadowed[nested][1])
+        return value
+
+    def _set(self, keys):
+        # parents go first, so children are set over them
+        keys = sorted(keys, key=len)
+        for key in keys:
+            if key in self._shadowed:
+                continue
+
+            # a missing value is remembered along with a length of its
+            # shortest missing parent, so the parent is removed later
+            # instead of leaving empty dictionaries
+            value = self._base_value(key)
+            depth = len(key)
+            if value is _missing:
+                depth = next(
+                    i for i in range(1, len(key) + 1)
+                    if self._base_value(key[:i]) is _missing)
+            self._shadowed[key] = (depth, value)
+
+        self.conf.set_many(
+            (key, _copy_value(self._values[key])) for key in keys)
+
+    def apply(self):
+        """
+        Sets values of the overlay over the conf again.
+        """
+        self._set(self._values)
+
+    def refresh(self):
+        """
+        Picks up changes of the environment.
+
+        The whole environment is compared with its previous state, but
+        only changed variables are parsed, and only their values are set.
+
+        :returns: (set) a set of compound keys that have been changed
+        :raises TypeError: a variable's key goes through a value that isn't
+                           a dictionary, e.g. both ``APP__DB`` and
+                           ``APP__DB__HOST`` are set, but the first one
+                           isn't a JSON object
+        """
+        environ = dict(self._environ)
+        if environ == self._seen:
+            return set()
+
+        names = set(name for name, _ in (
+            set(environ.items()) ^ set(self._seen.items())))
+        self._seen = environ
+
+        updated, removed = set(), set()
+        for name in names:
+            if not name.startswith(self.prefix):
+                continue
+
+            keys = self._key(name)
+            if not keys:
+                continue
+
+            if name in environ:
+                self._values[keys] = _parse_env_value(environ[name])
+                updated.add(keys)
+                for i in range(1, len(keys)):
+                    self._nested[keys[:i]].add(keys)
+            elif keys in self._values:
+                del self._values[keys]
+                removed.add(keys)
+                for i in range(1, len(keys)):
+                    self._nested[keys[:i]].discard(keys)
+
+        for keys in sorted(removed, key=len, reverse=True):
+            depth, value = self._shadowed.pop(keys)
+
+            # a value of an overridden parent takes place of the removed
+            # one, if there's such a parent
+            for i in range(len(keys) - 1, 0, -1):
+                if keys[:i] in self._values:
+                    parent = self._values[keys[:i]]
+                    value = _lookup(parent, keys[i:])
+                    if value is _missing:
+                        depth = next(
+                            j for j in range(i + 1, len(keys) + 1)
+                            if _lookup(parent, keys[i:j]) is _missing)
+                    break
+
+            if value is not _missing:
+                self.conf[keys] = _copy_value(value)
+                continue
+
+            # other values of the overlay may be set into a removed parent
+            if self._get(keys[:depth]) is not _missing:
+                del self.conf[keys[:depth]]
+                updated.update(self._nested.get(keys[:depth], ()))
+
+        # values of children are replaced along with their parents, so
+        # they have to be set again
+        for keys in updated | removed:
+            updated.update(self._nested.get(keys, ()))
+
+        self._set(updated)
+
+        separator = self.conf._separator
+        return set(
+            separator.join('%s' % (key, ) for key in keys)
+            for keys in updated | removed)
+
+
+_BOOLEANS = {
+    'true': True, 'yes': True, 'on': True, '1': True,
+    'false': False, 'no': False, 'off': False, '0': False,
+}
+
+
+def _to_bool(value):
+    """
+    Coerces a given value to :class:`bool`.
+
+    Unlike :class:`bool` itself, the function doesn't treat any non-empty
+    string as ``True``; only well-known words are accepted.
+    """
+    if isinstance(value, string_types):
+        try:
+            return _BOOLEANS[value.strip().lower()]
+        except KeyError:
+            raise ValueError('%r is not a boolean.' % (value, ))
+    if value in (0, 1):
+        return bool(value)
+    raise ValueError('%r is not a boolean.' % (value, ))
+
+
+class _Accessor(object):
+    """
+    A base class for accessors compiled by :class:`Schema`.
+    """
+
+    __slots__ = ()
+
+    def _asdict(self):
+        return collections.OrderedDict(
+            (name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return (
+            self.__class__ is other.__class__ and
+            self._asdict() == other._asdict())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % item for item in self._asdict().items()))
+
+
+class Schema(object):
+    """
+    A schema of typed config values.
+
+    The schema is compiled into an accessor class with a slot per field.
+    Values are looked up, coerced and validated once, when the accessor is
+    loaded, so reading a field is a plain attribute access, and a bad
+    value is reported at load time rather than somewhere in a hot path::
+
+        schema = Schema({
+            'host': ('server.host', str),
+            'port': ('server.port', int),
+            'debug': ('debug', bool, False),
+        })
+
+        settings = schema.load(conf)
+        bind(settings.host, settings.port)
+
+    A field is declared as a tuple of a compound key, a type and an
+    optional default value; a field without a default is required.
+    Instead of a tuple, just a type may be passed, then the name is used
+    as a compound key, and the field's attribute is named by the key with
+    separators replaced by underscores (e.g. ``server_port``).
+
+    A type may be any callable that receives a value and returns a coerced
+    one, raising :class:`ValueError` or :class:`TypeError` if it can't.
+    Values of exactly the given type are kept as is. The
+    :class:`bool` type accepts booleans, ``0`` and ``1``, and well-known
+    words like ``'yes'`` and ``'off'``.
+
+    :param fields: (dict) field names and declarations
+    :param name: (str) a name of the accessor class
+    :param separator: (str) a separator of compound keys
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, fields, name='Settings', separator='.'):
+        compiled = []
+
+        for field, spec in fields.items():
+            if not isinstance(spec, tuple):
+                field, spec = field.replace(separator, '_'), (field, spec)
+            if not 2 <= len(spec) <= 3:
+                raise ValueError('Bad declaration of %r field.' % (field, ))
+            if not re.match(r'^[^\d\W]\w*$', field) or field.startswith('_'):
+                raise ValueError('%r is not a valid field name.' % (field, ))
+
+            key, type_ = spec[:2]
+            default = spec[2] if len(spec) == 3 else _missing
+            coerce = _to_bool if type_ is bool else type_
+            compiled.append((field, key, type_, coerce, default))
+
+        compiled.sort(key=lambda item: item[0])
+        for a, b in zip(compiled, compiled[1:]):
+            if a[0] == b[0]:
+                raise ValueError('%r field is declared twice.' % (a[0], ))
+
+        self._fields = compiled
+        self._keys = [key for _, key, _, _, _ in compiled]
+
+        #: a class of accessors, with a slot per field
+        self.accessor = type(str(name), (_Accessor, ), {
+            '__slots__': tuple(field for field, _, _, _, _ in compiled),
+        })
+
+    def load(self, conf, into=None):
+        """
+        Validates a given config, and returns an accessor of its values.
+
+        All the fields are validated before anything is set, so a failed
+        load doesn't change an accessor that's passed to be refreshed. Call
+        the method again whenever the config is updated.
+
+        :param conf: (:class:`Conf` or :class:`FrozenConf`) a config
+        :param into: (accessor) an accessor to be refreshed instead of
+                     creating a new one
+        :returns: (accessor) an instance of :attr:`accessor` class
+        :raises ValueError: some values are missing or invalid; all of
+                            them are listed in the message
+        :raises TypeError: a given accessor isn't one of the schema
+        """
+        if into is not None and into.__class__ is not self.accessor:
+            raise TypeError('%r is not an accessor of the schema.' % (into, ))
+
+        if isinstance(conf, Conf):
+            values = conf.get_many(self._keys, _missing)
+        else:
+            values = [conf.get(key, _missing) for key in self._keys]
+
+        coerced, errors = [], []
+        for (field, key, type_, coerce, default), value in zip(
+                self._fields, values):
+            if value is _missing:
+                if default is _missing:
+                    errors.append('%s: missing' % (key, ))
+                value = default
+            elif not (isinstance(type_, type) and
+                      value.__class__ is type_):
+                try:
+                    value = coerce(value)
+                except (TypeError, ValueError) as exc:
+                    errors.append('%s: %s' % (key, exc))
+            coerced.append((field, value))
+
+        if errors:
+            raise ValueError('Invalid config: %s' % '; '.join(errors))
+
+        rv = self.accessor.__new__(self.accessor) if into is None else into
+        for field, value in coerced:
+            setattr(rv, field, value)
+        return rv
@@ -12,8 +12,288 @@
 
 from __future__ import absolute_import
 
+import io
+import os
+import sys
+import importlib
 import itertools
-import pkg_resources
+
+try:
+    _replace = os.replace
+except AttributeError:  # fallback to Python 2.x
+    _replace = os.rename
+
+
+def _import_metadata():
+    """
+    Returns :mod:`importlib.metadata` or its ``importlib_metadata``
+    backport, or ``None`` if neither of them is available.
+    """
+    try:
+        import importlib.metadata as metadata
+    except ImportError:  # fallback to Python < 3.8
+        try:
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+    return metadata
+
+
+def _scan_entry_points():
+    """
+    Returns entry points of all namespaces.
+
+    Entry points are discovered by means of :mod:`importlib.metadata` (or
+    its ``importlib_metadata`` backport), which reads ``entry_points.txt``
+    of installed distributions and nothing more. Since ``pkg_resources``
+    scans all installed distributions on import, it's imported lazily and
+    is used only if neither of them is available.
+
+    :returns: (dict) a namespace -> a list of ``(name, value)`` pairs
+    """
+    metadata = _import_metadata()
+    rv = {}
+
+    if metadata is None:
+        import pkg_resources
+
+        for dist in pkg_resources.working_set:
+            for namespace, entrypoints in dist.get_entry_map().items():
+                for entrypoint in entrypoints.values():
+                    value = entrypoint.module_name
+                    if entrypoint.attrs:
+                        value += ':' + '.'.join(entrypoint.attrs)
+
+                    rv.setdefault(namespace, [])
+                    rv[namespace].append((entrypoint.name, value))
+        return rv
+
+    entrypoints = metadata.entry_points()
+
+    # entry points are grouped into a dict by old versions, whose getters
+    # are deprecated by some of them, so the dict is read directly
+    if isinstance(entrypoints, dict):
+        for namespace, group in dict.items(entrypoints):
+            rv[namespace] = [
+                (entrypoint.name, entrypoint.value) for entrypoint in group]
+        return rv
+
+    for entrypoint in entrypoints:
+        rv.setdefault(entrypoint.group, [])
+        rv[entrypoint.group].append((entrypoint.name, entrypoint.value))
+    return rv
+
+
+class _EntryPoint(object):
+    """
+    An entry point restored from :class:`EntryPointIndex`. It's loaded
+    without importing neither :mod:`importlib.metadata` nor
+    ``pkg_resources``.
+    """
+
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        # a value looks like "package.module:attr.attr [extra]"
+        module, _, attrs = self.value.split('[')[0].partition(':')
+
+        rv = importlib.import_module(module.strip())
+        for attr in attrs.strip().split('.'):
+            if attr:
+                rv = getattr(rv, attr)
+        return rv
+
+    def __repr__(self):
+        return '_EntryPoint(%r, %r)' % (self.name, self.value)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _metadata_dirs(paths):
+    """
+    Returns metadata directories of distributions found in given paths.
+    """
+    rv = []
+    for path in paths:
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            # missed paths, or zip archives
+            continue
+
+        rv.extend(
+            os.path.join(path, name) for name in names
+            if name.endswith(('.dist-info', '.egg-info')))
+    return rv
+
+
+def _fingerprint(paths, dirs):
+    """
+    Returns a fingerprint of given paths and metadata directories, which
+    is changed once a distribution is installed, upgraded or removed.
+    """
+    return [[path, _mtime(path)] for path in paths] + [
+        [path, _mtime(path), _mtime(os.path.join(path, 'entry_points.txt'))]
+        for path in dirs]
+
+
+class EntryPointIndex(object):
+    """
+    An index of entry points of all namespaces.
+
+    Discovering entry points means reading metadata of every installed
+    distribution. The index does it once for all namespaces, and then
+    resolves them from memory. It's used by :class:`ExtensionManager`
+    instances, and there's a process-wide one - :data:`registry` - that's
+    used by default. Call :meth:`refresh` once distributions are installed
+    or removed at runtime.
+
+    Every process discovers entry points again though, unless the index
+    is kept in a file. Then next processes resolve namespaces without
+    reading any metadata::
+
+        index = EntryPointIndex('/var/cache/myapp/entry_points.json')
+        extensions = ExtensionManager('my_plugin_namespace', index=index)
+
+    A kept index is tagged with modification times of ``sys.path``
+    entries and of metadata directories of distributions found there, and
+    it's rebuilt once ``sys.path`` is changed or a distribution is
+    installed, upgraded or removed.
+
+    Failures to write the index are ignored, so read-only locations are
+    fine. Keep the index out of ``sys.path`` entries though, since writing
+    it there changes their modification times and invalidates it.
+
+    :param filename: (str) a file to keep the index in; the index is kept
+                     in memory only if ``None``
+
+    .. versionadded:: 0.5.0
+    """
+
+    _version = 1
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._namespaces = None
+
+    def entry_points(self, namespace):
+        """
+        Returns entry points of a given namespace.
+
+        :param namespace: (str) a namespace to resolve
+        :returns: (list) entry points with ``name`` and ``load()``
+        """
+        if self._namespaces is None:
+            self._namespaces = self._load()
+
+        return [
+            _EntryPoint(name, value)
+            for name, value in self._namespaces.get(namespace, [])]
+
+    def refresh(self):
+        """
+        Forgets entry points, so they are discovered again on next use.
+        A kept index is rebuilt only if distributions are changed.
+        """
+        self._namespaces = None
+
+    def _load(self):
+        if self.filename is None:
+            return _scan_entry_points()
+
+        # json imports re, and that's a noticeable part of import time of
+        # the module, so it's imported only if the index is kept
+        import json
+
+        paths = [os.path.abspath(path) for path in sys.path]
+
+        try:
+            with io.open(self.filename, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+
+            if index['version'] == self._version and \
+                    index['fingerprint'] == _fingerprint(paths, index['dirs']):
+                return index['namespaces']
+        except Exception:
+            # missed or broken index, rebuild it then
+            pass
+
+        # the fingerprint is taken before scanning, so distributions that
+        # are changed meanwhile invalidate the index
+        dirs = _metadata_dirs(paths)
+        fingerprint = _fingerprint(paths, dirs)
+        namespaces = _scan_entry_points()
+
+        try:
+            # write to a temporary file first, so concurrent readers never
+            # see a partially written one
+            tmp = '%s.%d.tmp' % (self.filename, os.getpid())
+            with io.open(tmp, 'wb') as f:
+                f.write(json.dumps({
+                    'version': self._version,
+                    'dirs': dirs,
+                    'fingerprint': fingerprint,
+                    'namespaces': namespaces,
+                }).encode('utf-8'))
+            _replace(tmp, self.filename)
+        except Exception:
+            pass
+
+        return namespaces
+
+
+def _load_entrypoint(entrypoint):
+    """
+    Loads an entry point; it's executed by a pool of workers.
+
+    An exception is returned rather than raised, so errors of other entry
+    points don't break the pool.
+
+    :param entrypoint: (object) an entry point to load
+    :returns: (tuple) a name of the entry point, a flag whether the load
+              failed, and a loaded extension or an exception
+    """
+    try:
+        return entrypoint.name, False, entrypoint.load()
+    except Exception as exc:
+        return entrypoint.name, True, exc
+
+
+#: A process-wide :class:`EntryPointIndex` that's used by
+#: :class:`ExtensionManager` instances by default. It may be replaced by
+#: a kept one.
+registry = EntryPointIndex()
+
+
+class ExtensionLoadError(Exception):
+    """
+    Extensions have failed to load concurrently, see the ``workers``
+    parameter of :class:`ExtensionManager`.
+
+    The error is chained from the first failure in order of loading.
+
+    :param errors: a list of ``(name, exception)`` pairs in order of
+                   loading
+
+    .. versionadded:: 0.5.0
+    """
+
+    def __init__(self, errors):
+        super(ExtensionLoadError, self).__init__(
+            'Failed to load extensions: %s.' % (
+                ', '.join(name for name, _ in errors), ))
+
+        #: a list of ``(name, exception)`` pairs in order of loading
+        self.errors = errors
 
 
 class ExtensionManager(object):
@@ -64,36 +344,135 @@ class ExtensionManager(object):
         it specifies an order of imports.
     :param silent:
         Skip loading errors if ``True``; otherwise - throw exception.
+    :param lazy:
+        Import extensions of a name on first access to it, rather than all
+        of them on construction. In this mode loading errors are thrown
+        on access, and :meth:`names` and ``in`` operator are aware of
+        discovered extensions, even ones that will fail to load.
+    :param index:
+        An :class:`EntryPointIndex` to resolve a namespace by; the
+        process-wide :data:`registry` is used if ``None``.
+    :param workers:
+        A number of threads to import extensions in; a number of CPUs if
+        ``None``. Helps if extensions do IO-bound initialization on
+        import. Extensions are ordered the same way as if they were
+        imported one by one. All the extensions are imported before errors
+        are checked, so loading errors of all of them are thrown at once
+        as :exc:`ExtensionLoadError`, unless ``silent`` is ``True``.
+
+    .. versionchanged:: 0.5.0
+
+       Entry points are discovered by means of :mod:`importlib.metadata`;
+       ``pkg_resources`` is used as a fallback only. Add ``lazy``,
+       ``index`` and ``workers`` parameters.
 
     .. _stevedore:    https://stevedore.readthedocs.org/
     .. _entry_points: https://pythonhosted.org/setuptools/setuptools.html
                       #dynamic-discovery-of-services-and-plugins
     """
-    def __init__(self, namespace, names=None, silent=False):
+    def __init__(self, namespace, names=None, silent=False, lazy=False,
+                 index=None, workers=1):
         #: `name` <-> `extensions list` map
         #:
         #: Since extension is an exported object and know nothing about
         #: it's name, we have to save this info here for further usage.
+        #: Until a name is loaded, its list contains entry points.
         self._extensions = {}
 
+        #: names whose extensions are not loaded yet
+        self._unloaded = set()
+        self._silent = silent
+        self._workers = workers
+
+        if index is None:
+            index = registry
+        entrypoints = index.entry_points(namespace)
+
         # if names is passed, let's discover extensions in passed order
         if names is not None:
+            by_name = {}
+            for entrypoint in entrypoints:
+                by_name.setdefault(entrypoint.name, []).append(entrypoint)
+
             entrypoints = itertools.chain.from_iterable(
-                pkg_resources.iter_entry_points(namespace, name)
-                for name in names)
-        else:
-            entrypoints = pkg_resources.iter_entry_points(namespace)
+                by_name.get(name, []) for name in names)
 
-        # load extensions
+        entrypoints = list(entrypoints)
         for entrypoint in entrypoints:
+            self._extensions.setdefault(entrypoint.name, [])
+            self._extensions[entrypoint.name].append(entrypoint)
+            self._unloaded.add(entrypoint.name)
+
+        # load extensions
+        if not lazy:
+            self._load(entrypoints)
+
+    def _load(self, entrypoints):
+        """
+        Loads given entry points in order, and replaces them with loaded
+        extensions. Names whose extensions have all failed to load are
+        dropped.
+
+        Unless the manager is silent, an error of an entry point is thrown
+        as is if they are loaded one by one, and all the errors are thrown
+        as :exc:`ExtensionLoadError` if they are loaded concurrently.
+        """
+        loaded = {}
+
+        if self._workers == 1 or len(entrypoints) < 2:
+            for entrypoint in entrypoints:
+                try:
+                    ext = entrypoint.load()
+
+                    loaded.setdefault(entrypoint.name, [])
+                    loaded[entrypoint.name].append(ext)
+                except Exception:
+                    if not self._silent:
+                        raise
+        else:
+            # the pool is imported here, since it's a noticeable part of
+            # import time of the module
+            import multiprocessing.pool
+
+            pool = multiprocessing.pool.ThreadPool(self._workers)
             try:
-                ext = entrypoint.load()
+                results = pool.map(_load_entrypoint, entrypoints)
+            finally:
+                pool.close()
+                pool.join()
+
+            errors = []
+            for name, failed, ext in results:
+                if failed:
+                    errors.append((name, ext))
+                    continue
+
+                loaded.setdefault(name, [])
+                loaded[name].append(ext)
+
+            if errors and not self._silent:
+                error = ExtensionLoadError(errors)
+                # it's chained by hand, since Python 2.x doesn't support
+                # "raise ... from ..." syntax
+                error.__cause__ = errors[0][1]
+                raise error
 
-                self._extensions.setdefault(entrypoint.name, [])
-                self._extensions[entrypoint.name].append(ext)
-            except Exception:
-                if not silent:
-                    raise
+        for entrypoint in entrypoints:
+            if entrypoint.name in self._unloaded:
+                self._unloaded.remove(entrypoint.name)
+                if entrypoint.name in loaded:
+                    self._extensions[entrypoint.name] = loaded[entrypoint.name]
+                else:
+                    del self._extensions[entrypoint.name]
+
+    def _get(self, name):
+        """
+        Returns a list of extensions with a given name, and loads them
+        if they are not loaded yet.
+        """
+        if name in self._unloaded:
+            self._load(self._extensions[name])
+        return self._extensions[name]
 
     def get(self, name, default=None):
         """
@@ -125,11 +504,15 @@ class ExtensionManager(object):
         """
         # we're interested to return a copy to protect us
         # from unexpected modifications
-        return list(self._extensions.get(name, []))
+        try:
+            return list(self._get(name))
+        except KeyError:
+            return []
 
     def names(self):
         """
-        Returns a list of plugin names that were loaded.
+        Returns a list of plugin names that were loaded, or discovered
+        ones in lazy mode.
 
         :returns: (set) plugin names
         """
@@ -147,7 +530,7 @@ class ExtensionManager(object):
         :returns: (object) an extension instance
         """
         # we always have at least one item in the list
-        return self._extensions[name][0]
+        return self._get(name)[0]
 
     def __contains__(self, name):
         """
@@ -164,6 +547,12 @@ class ExtensionManager(object):
 
         :returns: (object) an iterator over extensions
         """
-        for key in self._extensions:
-            for value in self._extensions[key]:
+        # names may be dropped when they are loaded, so iterate over a copy
+        for key in list(self._extensions):
+            try:
+                values = self._get(key)
+            except KeyError:
+                continue
+
+            for value in values:
                 yield key, value
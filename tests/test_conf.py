@@ -9,12 +9,27 @@
     :license: BSD, see LICENSE for details
 """
 
+import io
 import os
+import sys
+import copy
+import json
+import pickle
+import shutil
+import hashlib
+import time
+import datetime
+import tempfile
+import threading
 import collections
 
 import mock
 
-from dooku.conf import Conf
+from dooku.conf import (
+    ConcurrentConf, Conf, ConfCache, ConfDiff, ConfWatcher, EnvOverlay,
+    FrozenConf, KeyPath, LayeredConf, Merger, MergeStats, Schema,
+    APPEND, MERGE, REPLACE, UNION)
+from dooku.conf import _stream_json, _LazyDict
 
 from . import DookuTestCase
 
@@ -168,6 +183,253 @@ class TestConf(DookuTestCase):
         conf = Conf(self.source_conf)
         conf.from_json(self.invalid, silent=True)
 
+    def test_from_json_stream(self):
+        """
+        The from_json in streaming mode has to produce the same result.
+        """
+        conf = Conf(self.source_conf)
+        stats = conf.from_json(self.jsonfile, stream=True)
+
+        result = {
+            'root': {
+                'one': {'a': 42, 'b': 2, 'z': 13},
+                'two': {'c': 3},
+                'three': [],
+            },
+            'non-root': [1, 2],
+        }
+
+        self.assertEqual(conf._data, result)
+        self.assertIsInstance(stats, MergeStats)
+
+    def test_from_json_stream_small_chunks(self):
+        """
+        The streaming mode has to handle values split between chunks.
+        """
+        source = json.dumps({
+            'root': {
+                'one': {'a': 1.25, 'b': [1, {'c': 'd'}], 'e': None},
+                'two': {'f': 'a "quoted" \\ string', 'g': -1e-3},
+            },
+            'non-root': {'h': True, 'i': {}},
+        })
+        source = u'' + source  # json.dumps returns bytes on Py 2.x
+        expected = Conf(self.source_conf)
+        expected.update(json.loads(source))
+
+        for chunk_size in (1, 2, 3, 5, 1024):
+            conf = Conf(self.source_conf)
+            _stream_json(io.StringIO(source), conf._data, conf._merger,
+                         chunk_size)
+            self.assertEqual(conf, expected)
+
+    def test_from_json_stream_strategies(self):
+        """
+        The streaming mode has to respect merge strategies.
+        """
+        conf = Conf(
+            {'root': {'three': [1], 'one': {'x': 1}}},
+            strategies={'root.three': APPEND, 'root.one': REPLACE})
+        conf.from_json(self.jsonfile, stream=True)
+
+        self.assertEqual(conf['root.three'], [1])
+        self.assertEqual(conf['root.one'], {'a': 42, 'z': 13})
+
+    def test_from_json_stream_raise_error(self):
+        """
+        The streaming mode has to raise error in case of invalid JSON.
+        """
+        conf = Conf(self.source_conf)
+        self.assertRaises(
+            ValueError, conf.from_json, self.invalid, stream=True)
+
+        for source in (u'[1, 2]', u'{"a": 1,}', u'{"a": {"b": 1}', u'{} {}'):
+            self.assertRaises(
+                ValueError, _stream_json, io.StringIO(source), {}, Merger())
+
+    def test_from_json_stream_silent_mode(self):
+        """
+        The streaming mode has to be capable fail silent.
+        """
+        conf = Conf(self.source_conf)
+        conf.from_json(self.invalid, silent=True, stream=True)
+
+        self.assertEqual(conf._data, self.source_conf)
+
+    def _write_json(self, source, encoding='utf-8'):
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+
+        with io.open(filename, 'w', encoding=encoding) as f:
+            f.write(source)
+        return filename
+
+    def test_from_json_lazy(self):
+        """
+        The from_json in lazy mode has to produce the same result.
+        """
+        conf = Conf(self.source_conf)
+        conf.from_json(self.jsonfile, lazy=True)
+
+        expected = Conf(self.source_conf)
+        expected.from_json(self.jsonfile)
+
+        self.assertEqual(conf, expected)
+
+    @mock.patch('dooku.conf._MMAP_THRESHOLD', 0)
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy_decodes_on_access(self):
+        """
+        Objects have to be decoded only once they're accessed.
+        """
+        data = {
+            'root': {
+                'one': {'a': 1.25, 'b': [1, {'c': '}{'}], 'e': None},
+                'two': {'f': 'a "quoted" \\ {string', 'g': -1e-3},
+            },
+            'non-root': {'h': True, 'i': {}, 'j': u'і'},
+        }
+        filename = self._write_json(u'' + json.dumps(data, indent=2))
+
+        conf = Conf()
+        conf.from_json(filename, lazy=True)
+
+        self.assertIsInstance(conf._data['root'], _LazyDict)
+        self.assertIsNotNone(conf._data['root']._source)
+
+        self.assertEqual(conf['root.one.b'], [1, {'c': '}{'}])
+        self.assertIsNone(conf._data['root']._source)
+        self.assertIsNotNone(conf._data['root']['two']._source)
+        self.assertIsNotNone(conf._data['non-root']._source)
+
+        self.assertEqual(conf, data)
+        self.assertEqual(json.loads(json.dumps(conf._data)), data)
+
+        # copies have to be plain dictionaries
+        conf = Conf()
+        conf.from_json(filename, lazy=True)
+        self.assertEqual(copy.deepcopy(conf._data), data)
+        self.assertIs(type(copy.deepcopy(conf._data)['root']), dict)
+        self.assertEqual(pickle.loads(pickle.dumps(conf._data)), data)
+
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy_threads(self):
+        """
+        Objects have to be decoded once, and readers of other threads
+        have to wait for that.
+        """
+        data = {'big': dict(('k%d' % i, {'v': i}) for i in range(20000))}
+        filename = self._write_json(u'' + json.dumps(data))
+
+        for _ in range(5):
+            conf = Conf()
+            conf.from_json(filename, lazy=True)
+            errors, start = [], threading.Event()
+
+            def read():
+                start.wait()
+                try:
+                    self.assertEqual(conf['big.k19999.v'], 19999)
+                except Exception as exc:
+                    errors.append(exc)
+
+            threads = [threading.Thread(target=read) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy_eq_dumps(self):
+        """
+        Undecoded objects have to be compared and dumped by json as
+        decoded ones.
+        """
+        data = {'a': {'b': {'c': 1}, 'd': [2]}, 'e': {'f': 3}}
+        filename = self._write_json(u'' + json.dumps(data))
+
+        confs = [Conf(), Conf()]
+        for conf in confs:
+            conf.from_json(filename, lazy=True)
+
+        self.assertTrue(confs[0] == confs[1])
+        self.assertFalse(confs[0] != confs[1])
+
+        conf = Conf()
+        conf.from_json(filename, lazy=True)
+        self.assertTrue(data == conf._data)
+        self.assertTrue(conf._data['e'] == confs[1]._data['e'])
+
+        conf = Conf()
+        conf.from_json(filename, lazy=True)
+        self.assertIsNotNone(conf._data['a']._source)
+        self.assertEqual(json.loads(json.dumps(conf._data)), data)
+        self.assertEqual(
+            json.loads(json.dumps(conf._data, indent=2, sort_keys=True)),
+            data)
+
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy_writes(self):
+        """
+        Writes to an object that isn't decoded yet have to be kept.
+        """
+        filename = self._write_json(u'{"a": {"b": {"c": 1}, "d": 2}}')
+
+        conf = Conf()
+        conf.from_json(filename, lazy=True)
+        conf['a.b.e'] = 3
+        conf.update({'a': {'d': 4}})
+
+        self.assertEqual(conf, {'a': {'b': {'c': 1, 'e': 3}, 'd': 4}})
+
+    def test_from_json_lazy_encoding(self):
+        """
+        Files that aren't ASCII compatible have to be loaded eagerly.
+        """
+        filename = self._write_json(u'{"a": {"b": "і"}}', 'utf-16')
+
+        conf = Conf()
+        conf.from_json(filename, encoding='utf-16', lazy=True)
+
+        self.assertEqual(conf, {'a': {'b': u'і'}})
+
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy_raise_error(self):
+        """
+        The lazy mode has to raise errors of top-level structure on load,
+        and errors of nested objects on access.
+        """
+        conf = Conf(self.source_conf)
+        self.assertRaises(ValueError, conf.from_json, self.invalid, lazy=True)
+
+        for source in (u'[1, 2]', u'{"a": 1,}', u'{"a": {"b": 1}', u'{"a"}'):
+            self.assertRaises(
+                ValueError, Conf().from_json, self._write_json(source),
+                lazy=True)
+
+        conf = Conf()
+        conf.from_json(self._write_json(u'{"a": {"b": 1,}}'), lazy=True)
+        self.assertRaises(ValueError, conf.__getitem__, 'a.b')
+
+        self.assertRaises(
+            ValueError, conf.from_json, self.jsonfile, lazy=True, stream=True)
+        self.assertRaises(
+            ValueError, conf.from_json, self.jsonfile, lazy=True,
+            cache=ConfCache())
+
+    def test_from_json_lazy_silent_mode(self):
+        """
+        The lazy mode has to be capable fail silent.
+        """
+        conf = Conf(self.source_conf)
+        conf.from_json(self.invalid, silent=True, lazy=True)
+
+        self.assertEqual(conf._data, self.source_conf)
+
     def test_from_yaml(self):
         """
         The from_yaml has to read conf from a given file and be capable to
@@ -582,3 +844,1966 @@ class TestConf(DookuTestCase):
         """
         conf = Conf(self.source_conf)
         self.assertIsInstance(conf, collections.MutableMapping)
+
+    def test_getitem_keypath(self):
+        """
+        The __getitem__ has to accept compiled compound keys.
+        """
+        conf = Conf(self.source_conf)
+
+        self.assertEqual(conf[KeyPath('root.one.a')], 1)
+        self.assertEqual(conf[KeyPath('root#two', '#')], {'c': 3})
+        self.assertRaises(KeyError, lambda: conf[KeyPath('root.three')])
+
+    def test_setitem_keypath(self):
+        """
+        The __setitem__ has to accept compiled compound keys.
+        """
+        conf = Conf(self.source_conf)
+        conf[KeyPath('root.three.d')] = 42
+
+        self.assertEqual(conf['root.three.d'], 42)
+
+    def test_delitem_keypath(self):
+        """
+        The __delitem__ has to accept compiled compound keys.
+        """
+        conf = Conf(self.source_conf)
+        del conf[KeyPath('root.one.a')]
+
+        self.assertNotIn('root.one.a', conf)
+
+    def test_getitem_views_are_cached(self):
+        """
+        The __getitem__ has to return the same view for the same subtree,
+        no matter how it's reached.
+        """
+        conf = Conf(self.source_conf)
+
+        self.assertIs(conf['root.one'], conf['root.one'])
+        self.assertIs(conf['root']['one'], conf['root.one'])
+
+    def test_getitem_views_are_dropped(self):
+        """
+        Views of replaced or deleted subtrees don't have to be returned.
+        """
+        conf = Conf(self.source_conf)
+        view = conf['root.one']
+
+        conf['root.one'] = {'z': 1}
+        self.assertEqual(conf['root.one'], {'z': 1})
+        self.assertEqual(view, self.source_conf['root']['one'])
+
+        conf['root']['two'].update({'c': {'d': 1}})
+        self.assertEqual(conf['root.two.c'], {'d': 1})
+
+        del conf['root.two']
+        self.assertEqual(len(conf._views), 0)
+
+    def test_views_have_no_dict(self):
+        """
+        Views have to be lightweight.
+        """
+        if sys.version_info[0] < 3:
+            self.skipTest('ABCs of Python 2.x have no __slots__')
+
+        conf = Conf(self.source_conf)
+        self.assertFalse(hasattr(conf['root'], '__dict__'))
+
+    def test_get_many(self):
+        """
+        The get_many has to return values in order of given keys.
+        """
+        conf = Conf(self.source_conf)
+
+        keys = [
+            'root.one.b', KeyPath('root.one.a'), 'root.two.c', 'root.x.y',
+            'root.one.a.q', 'nope', 'root.two']
+
+        values = conf.get_many(keys)
+        self.assertEqual(values, [2, 1, 3, None, None, None, {'c': 3}])
+        self.assertIs(values[-1], conf['root.two'])
+        self.assertEqual(conf.get_many(['root.x'], default=42), [42])
+
+        # large batches are grouped by prefixes
+        with mock.patch('dooku.conf._KEYPATH_CACHE_SIZE', 0):
+            self.assertEqual(conf.get_many(keys), values)
+            self.assertEqual(conf.get_many(['root.x'], default=42), [42])
+
+    def test_set_many(self):
+        """
+        The set_many has to set values like __setitem__ does.
+        """
+        conf = Conf(self.source_conf)
+
+        conf.set_many([
+            ('root.one.a', 10), (KeyPath('root.one.b'), 20), ('root.x.y', 1),
+            ('root.two', {'d': 4}), ('root.two.e', 5), ('top', 0)])
+
+        self.assertEqual(conf, {
+            'root': {
+                'one': {'a': 10, 'b': 20},
+                'two': {'d': 4, 'e': 5},
+                'x': {'y': 1},
+            },
+            'top': 0,
+        })
+
+        self.assertRaises(TypeError, conf.set_many, {'top.a': 1})
+
+    def test_delete_many(self):
+        """
+        The delete_many has to remove keys like __delitem__ does.
+        """
+        for batch in [32, 0]:
+            # large batches are grouped by prefixes
+            with mock.patch('dooku.conf._SMALL_BATCH', batch):
+                conf = Conf(self.source_conf, {'top': 0})
+
+                conf.delete_many(iter([
+                    'root.one.a', KeyPath('root.two'), 'root.one.b']))
+                self.assertEqual(conf, {'root': {'one': {}}, 'top': 0})
+
+                for keys in [['root.one.a'], ['root.two.c'], ['top.a']]:
+                    self.assertRaises(KeyError, conf.delete_many, keys)
+                self.assertEqual(conf, {'root': {'one': {}}, 'top': 0})
+
+    def test_compact(self):
+        """
+        The compact has to share equal keys and values between instances
+        and keep data and nodes intact.
+        """
+        source = u'{"a": {"host": "localhost", "port": 80, "on": true,' \
+                 u' "zero": -0.0, "list": ["localhost", {"port": 80}]}}'
+        first, second = Conf(json.loads(source)), Conf(json.loads(source))
+        node = first._data['a']
+
+        pool = first.compact()
+        self.assertIs(second.compact(pool), pool)
+
+        self.assertEqual(first, json.loads(source))
+        self.assertIs(first._data['a'], node)
+
+        a, b = first._data['a'], second._data['a']
+        self.assertIs(a['host'], b['host'])
+        self.assertIs(a['list'][0], b['host'])
+        self.assertIs(a['list'][1]['port'], b['port'])
+        self.assertIs(next(iter(first._data)), next(iter(second._data)))
+        self.assertIs(a['on'], True)
+        self.assertEqual(str(a['zero']), '-0.0')
+
+    def test_diff(self):
+        """
+        The diff has to report added, removed and changed values.
+        """
+        conf = Conf({
+            'a': {'b': 1, 'c': 2, 'd': {'e': 1}},
+            'f': {'g': 1},
+            'h': 1,
+            'i': [1],
+        })
+        diff = conf.diff({
+            'a': {'b': 1, 'c': 3, 'd': 5, 'x': {'y': 1}},
+            'h': True,
+            'i': [1],
+            'z': 0,
+        })
+
+        self.assertIsInstance(diff, ConfDiff)
+        self.assertEqual(diff.added, {('a', 'x'): {'y': 1}, ('z', ): 0})
+        self.assertEqual(diff.removed, {('f', ): {'g': 1}})
+        self.assertEqual(diff.changed, {
+            ('a', 'c'): (2, 3),
+            ('a', 'd'): ({'e': 1}, 5),
+            ('h', ): (1, True),
+        })
+        self.assertIsInstance(list(diff.added)[0], KeyPath)
+
+    def test_diff_skips_shared(self):
+        """
+        Subtrees that are the same object have to be skipped.
+        """
+        nan = {'value': float('nan')}
+        conf = Conf()
+        conf._data = {'shared': nan, 'other': {'value': float('nan')}}
+
+        diff = conf.diff(Conf({'shared': nan, 'other': {'value': 1}}))
+
+        self.assertEqual(list(diff.changed), [('other', 'value')])
+        self.assertEqual(conf.diff(conf), ({}, {}, {}))
+
+    def test_apply_patch(self):
+        """
+        The apply_patch has to make a config equal to the compared one.
+        """
+        old = {'a': {'b': 1, 'c': {'d': 1}}, 'e': [1], 'f': 0}
+        new = {'a': {'b': 2, 'c': 5}, 'e': [1, 2], 'g': {'h': {'i': []}}}
+
+        conf = Conf(old)
+        conf.apply_patch(conf.diff(new))
+
+        self.assertEqual(conf, new)
+        self.assertIsNot(conf['g.h.i'], new['g']['h']['i'])
+        self.assertRaises(KeyError, conf.apply_patch, Conf(old).diff(new))
+
+    def test_fingerprint(self):
+        """
+        The fingerprint has to depend on keys and values, not their order.
+        """
+        conf = Conf({'a': {'b': 1, 'c': [1, 2]}, 'd': u'x'})
+        same = Conf(collections.OrderedDict([
+            ('d', u'x'), ('a', {'c': [1, 2], 'b': 1})]))
+
+        self.assertEqual(conf.fingerprint(), same.fingerprint())
+        self.assertEqual(
+            conf['a'].fingerprint(), Conf({'b': 1, 'c': [1, 2]}).fingerprint())
+        self.assertEqual(len(set([
+            Conf({'a': 1}).fingerprint(),
+            Conf({'a': True}).fingerprint(),
+            Conf({'a': 1.0}).fingerprint(),
+            Conf({'a': '1'}).fingerprint(),
+            Conf({1: 1}).fingerprint(),
+            Conf({'1': 1}).fingerprint(),
+            Conf({'a': {}}).fingerprint(),
+        ])), 7)
+
+    def test_fingerprint_cached(self):
+        """
+        Changes have to drop cached fingerprints only along changed paths.
+        """
+        conf = Conf({'a': {'b': {'c': 1}}, 'x': {'y': 1}})
+        fingerprint = conf.fingerprint()
+        cached = conf._hashes[id(conf._data['x'])]
+
+        conf['a.b.c'] = 2
+        self.assertNotEqual(conf.fingerprint(), fingerprint)
+        self.assertIs(conf._hashes[id(conf._data['x'])], cached)
+
+        conf['a']['b.c'] = 1
+        self.assertEqual(conf.fingerprint(), fingerprint)
+
+        for change in [
+                lambda: conf.update({'a': {'b': {'d': 1}}}),
+                lambda: conf.set_many({'a.b.c': 3, 'n.e.w': 1}),
+                lambda: conf.delete_many(['n.e.w']),
+                lambda: conf['a'].__delitem__('b.d'),
+                lambda: conf.__setitem__('a.b', 1)]:
+            fingerprint = conf.fingerprint()
+            change()
+            self.assertNotEqual(conf.fingerprint(), fingerprint)
+            self.assertEqual(conf.fingerprint(), Conf(conf).fingerprint())
+            self.assertIs(conf._hashes[id(conf._data['x'])], cached)
+
+    def test_fingerprint_deep(self):
+        """
+        The fingerprint has to handle deep trees.
+        """
+        conf = Conf()
+        conf[(u'k', ) * 5000] = 1
+        self.assertEqual(len(conf.fingerprint()), 40)
+
+    def test_dump_json(self):
+        """
+        The dump_json has to write the same JSON as json.dumps does.
+        """
+        conf = Conf(self.source_conf, {'empty': {}, 'list': [{'a': 1}]})
+
+        for options in [{}, {'sort_keys': True}, {'ensure_ascii': False}]:
+            f = io.StringIO()
+            conf.dump_json(f, **options)
+            self.assertEqual(f.getvalue(), json.dumps(conf._data, **options))
+
+        f = io.StringIO()
+        conf.dump_json(f, indent=2)
+        self.assertEqual(f.getvalue(), json.dumps(conf._data, indent=2))
+
+    def test_dump_yaml(self):
+        """
+        The dump_yaml has to write YAML that's loaded back.
+        """
+        conf = Conf(self.source_conf)
+        conf.from_json(self.jsonfile)
+        fd, filename = tempfile.mkstemp(suffix='.yaml')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            conf['root'].dump_yaml(f)
+
+        loaded = Conf()
+        loaded.from_yaml(filename)
+        self.assertEqual(loaded, conf['root'])
+
+    def test_dump_binary(self):
+        """
+        The dump_binary has to write a file that's loaded back.
+        """
+        conf = Conf(self.source_conf, {'date': datetime.date(2016, 1, 1)})
+        fd, filename = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+
+        for data in [self.source_conf, conf]:
+            with io.open(filename, 'wb') as f:
+                Conf(data).dump_binary(f)
+
+            loaded = Conf()
+            loaded.from_binary(filename, allow_pickle=True)
+            self.assertEqual(loaded, data)
+
+        # the last one is pickled, so it's refused by default
+        loaded = Conf()
+        self.assertRaises(ValueError, loaded.from_binary, filename)
+        self.assertEqual(loaded, {})
+
+        with io.open(filename, 'wb') as f:
+            Conf(self.source_conf).dump_binary(f)
+        loaded.from_binary(filename)
+        self.assertEqual(loaded, self.source_conf)
+
+        # lazily loaded JSON is marshaled, so it's loaded by default
+        data = {'big': dict(('k%d' % i, [{'v': i}]) for i in range(5000))}
+        lazy = Conf()
+        with mock.patch('dooku.conf._LAZY_THRESHOLD', 0):
+            lazy.from_json(self._write_json(u'' + json.dumps(data)), lazy=True)
+        self.assertIsInstance(lazy._data['big'], _LazyDict)
+
+        with io.open(filename, 'wb') as f:
+            lazy.dump_binary(f)
+        with io.open(filename, 'rb') as f:
+            self.assertEqual(f.read(len(b'DKCB') + 1)[-1:], b'm')
+
+        loaded = Conf()
+        loaded.from_binary(filename)
+        self.assertEqual(loaded, data)
+        self.assertIs(type(loaded._data['big']), dict)
+
+        loaded = Conf()
+        self.assertRaises(ValueError, loaded.from_binary, self.jsonfile)
+        loaded.from_binary(self.jsonfile, silent=True)
+        self.assertEqual(loaded, {})
+
+    def test_items_values(self):
+        """
+        The items and values have to take values from data, wrapping
+        dictionaries into cached views.
+        """
+        conf = Conf(self.source_conf, {'x': 1})
+        items = dict(conf.items())
+
+        self.assertIsInstance(items['root'], Conf)
+        self.assertIs(items['root'], conf['root'])
+        self.assertEqual(items['x'], 1)
+        self.assertIn(('x', 1), conf.items())
+        self.assertNotIn(('x', 2), conf.items())
+        self.assertNotIn(('y', 1), conf.items())
+
+        self.assertEqual(list(conf.values()), [v for _, v in conf.items()])
+        self.assertIn(1, conf.values())
+        self.assertIn(self.source_conf['root'], conf.values())
+        self.assertNotIn(2, conf.values())
+
+    def test_get(self):
+        """
+        The get has to return a default if a key is missing.
+        """
+        conf = Conf(self.source_conf)
+
+        self.assertEqual(conf.get('root.one.a'), 1)
+        self.assertIs(conf.get('root.one'), conf['root.one'])
+        self.assertIsNone(conf.get('root.three'))
+        self.assertEqual(conf.get('root.one.a.b', 42), 42)
+        self.assertEqual(conf.get(KeyPath(('root', 'two', 'c'))), 3)
+
+    def test_contains(self):
+        """
+        The in operator has to look up compound keys.
+        """
+        conf = Conf(self.source_conf)
+
+        self.assertIn('root.one.a', conf)
+        self.assertIn('root.two', conf)
+        self.assertNotIn('root.three', conf)
+        self.assertNotIn('root.one.a.b', conf)
+
+    def test_eq(self):
+        """
+        The config has to be equal to mappings with the same data.
+        """
+        conf = Conf(self.source_conf)
+
+        self.assertEqual(conf, self.source_conf)
+        self.assertEqual(conf, Conf(self.source_conf))
+        self.assertEqual(conf['root'], conf.freeze()['root'])
+        self.assertNotEqual(conf, {'root': {}})
+        self.assertNotEqual(conf, [('root', self.source_conf['root'])])
+        self.assertFalse(conf == 42)
+
+    def test_copy(self):
+        """
+        The copy has to be deep and preserve options.
+        """
+        conf = Conf(self.source_conf, separator='/')
+        rv = conf.copy()
+        rv['root/one/a'] = 42
+
+        self.assertIsInstance(rv, Conf)
+        self.assertEqual(conf['root/one/a'], 1)
+        self.assertEqual(rv['root/one/a'], 42)
+        self.assertEqual(conf['root'].copy(), self.source_conf['root'])
+
+    def test_walk(self):
+        """
+        The walk has to yield leaves with compound keys in order.
+        """
+        conf = Conf(self.source_conf, {'x': {}, 'y': {1: 'a'}})
+
+        self.assertEqual(sorted(conf.walk()), [
+            ('root.one.a', 1),
+            ('root.one.b', 2),
+            ('root.two.c', 3),
+            ('y.1', 'a'),
+        ])
+        self.assertEqual(list(conf['root.one'].walk()), [('a', 1), ('b', 2)])
+
+    def test_compile_key(self):
+        """
+        The compile_key has to split a key by the instance's separator and
+        to return the same object for the same key.
+        """
+        conf = Conf(self.source_conf, separator='#')
+        key = conf.compile_key('root#one#a')
+
+        self.assertEqual(key, KeyPath(['root', 'one', 'a']))
+        self.assertIs(conf.compile_key('root#one#a'), key)
+        self.assertIs(conf.compile_key(key), key)
+        self.assertIs(conf['root'].compile_key('root#one#a'), key)
+
+
+class TestKeyPath(DookuTestCase):
+
+    def test_split(self):
+        """
+        The KeyPath has to split a given compound key by a separator.
+        """
+        self.assertEqual(KeyPath('a.b.c'), ('a', 'b', 'c'))
+        self.assertEqual(KeyPath('a#b.c', '#'), ('a', 'b.c'))
+
+    def test_keys(self):
+        """
+        The KeyPath has to accept already split keys.
+        """
+        self.assertEqual(KeyPath(['a', 'b']), ('a', 'b'))
+        self.assertEqual(KeyPath(('a', )), ('a', ))
+
+    def test_repr(self):
+        """
+        The KeyPath has to have representation that shows keys.
+        """
+        self.assertEqual(repr(KeyPath('a.b')), "KeyPath(('a', 'b'))")
+
+
+class TestFrozenConf(DookuTestCase):
+
+    def setUp(self):
+        """
+        Prepare source config for each testcase.
+        """
+        self.source_conf = {
+            'root': {
+                'one': {
+                    'a': 1,
+                    'b': [2],
+                },
+
+                'two': {
+                    'c': 3,
+                }
+            }
+        }
+
+    def test_freeze(self):
+        """
+        The freeze has to return a snapshot equal to the instance.
+        """
+        conf = Conf(self.source_conf)
+        snapshot = conf.freeze()
+
+        self.assertIsInstance(snapshot, FrozenConf)
+        self.assertEqual(snapshot, self.source_conf)
+        self.assertIs(snapshot.freeze(), snapshot)
+
+    def test_getitem_compound_key(self):
+        """
+        The __getitem__ has to retrieve values of any depth.
+        """
+        snapshot = Conf(self.source_conf).freeze()
+
+        self.assertEqual(snapshot['root.one.a'], 1)
+        self.assertEqual(snapshot['root.one']['b'], [2])
+        self.assertEqual(snapshot['root']['two'], {'c': 3})
+        self.assertEqual(snapshot[KeyPath('root.two.c')], 3)
+        self.assertRaises(KeyError, lambda: snapshot['root.three'])
+        self.assertRaises(KeyError, lambda: snapshot['root.one']['c'])
+
+    def test_getitem_returns_same_subtree(self):
+        """
+        The __getitem__ has to return the same object for a subtree.
+        """
+        snapshot = Conf(self.source_conf).freeze()
+
+        self.assertIsInstance(snapshot['root.one'], FrozenConf)
+        self.assertIs(snapshot['root.one'], snapshot['root']['one'])
+
+    def test_custom_separator(self):
+        """
+        The snapshot has to use the separator of its source.
+        """
+        snapshot = Conf(self.source_conf, separator='#').freeze()
+
+        self.assertEqual(snapshot['root#one#a'], 1)
+        self.assertEqual(snapshot['root']['two#c'], 3)
+        self.assertNotIn('root.one', snapshot)
+
+    def test_contains_and_get(self):
+        """
+        The __contains__ and get have to work with compound keys.
+        """
+        snapshot = Conf(self.source_conf).freeze()
+
+        self.assertIn('root.one.a', snapshot)
+        self.assertIn('one.b', snapshot['root'])
+        self.assertNotIn('one.b', snapshot)
+        self.assertEqual(snapshot.get('root.two.c'), 3)
+        self.assertEqual(snapshot.get('root.two.d', 42), 42)
+
+    def test_source_changes(self):
+        """
+        Changes of the source instance mustn't affect the snapshot.
+        """
+        conf = Conf(self.source_conf)
+        snapshot = conf.freeze()
+
+        conf['root.one.a'] = 42
+        conf['root.one.b'].append(42)
+        del conf['root.two']
+
+        self.assertEqual(snapshot['root.one.a'], 1)
+        self.assertEqual(snapshot['root.one.b'], [2])
+        self.assertEqual(snapshot['root.two.c'], 3)
+
+    def test_is_immutable(self):
+        """
+        The snapshot has to be a read-only mapping.
+        """
+        snapshot = Conf(self.source_conf).freeze()
+
+        self.assertIsInstance(snapshot, collections.Mapping)
+        self.assertNotIsInstance(snapshot, collections.MutableMapping)
+
+    def test_len_and_iter(self):
+        """
+        The __len__ and __iter__ have to behave exactly like a dict's ones.
+        """
+        snapshot = Conf(self.source_conf).freeze()
+
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(len(snapshot['root']), 2)
+        self.assertCountEqual(snapshot['root'], ['one', 'two'])
+
+
+class TestLayeredConf(DookuTestCase):
+
+    def setUp(self):
+        """
+        Prepare source layers for each testcase.
+        """
+        self.defaults = {
+            'root': {
+                'one': {
+                    'a': 1,
+                    'b': 2,
+                },
+
+                'two': {
+                    'c': 3,
+                }
+            },
+            'non-root': [1, 2],
+        }
+
+        self.overrides = {
+            'root': {
+                'one': {'a': 42, 'z': 13},
+                'three': [],
+            },
+        }
+
+        self.result = {
+            'root': {
+                'one': {'a': 42, 'b': 2, 'z': 13},
+                'two': {'c': 3},
+                'three': [],
+            },
+            'non-root': [1, 2],
+        }
+
+    def test_constructor_merges_layers(self):
+        """
+        The constructor has to produce the same result as Conf does.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        self.assertEqual(conf._data, self.result)
+        self.assertEqual(conf, Conf(self.defaults, self.overrides))
+
+    def test_getitem_compound_key(self):
+        """
+        The __getitem__ has to resolve compound keys through the layers.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        self.assertEqual(conf['root.one.a'], 42)
+        self.assertEqual(conf['root.one.b'], 2)
+        self.assertEqual(conf['root']['two']['c'], 3)
+        self.assertEqual(conf['root.one'], {'a': 42, 'b': 2, 'z': 13})
+        self.assertRaises(KeyError, lambda: conf['root.one.c'])
+
+    def test_scalar_overrides_dict(self):
+        """
+        The upper layer has to override a dict by a scalar and vice versa.
+        """
+        conf = LayeredConf(self.defaults, {'root': {'one': 1}})
+        self.assertEqual(conf['root.one'], 1)
+
+        conf = LayeredConf({'root': 1}, self.defaults)
+        self.assertEqual(conf['root.one.a'], 1)
+
+    def test_get_and_contains(self):
+        """
+        The get and in operator have to treat a path through a value that
+        isn't a dictionary as a missing key, as Conf does.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        for key in ['root.one.a', 'root.two', 'non-root']:
+            self.assertIn(key, conf)
+            self.assertEqual(conf.get(key), Conf(self.result)[key])
+        self.assertIsInstance(conf.get('root.one'), LayeredConf)
+
+        for key in ['root.one.c', 'root.one.a.b', 'non-root.a', 'x.y']:
+            self.assertNotIn(key, conf)
+            self.assertEqual(conf.get(key, 42), 42)
+            self.assertEqual(key in Conf(self.result), key in conf)
+
+        self.assertNotIn('x.y', LayeredConf({'x': 1}))
+        self.assertIn('c', conf['root.two'])
+        self.assertNotIn('c.d', conf['root.two'])
+
+    def test_setitem_copies_on_write(self):
+        """
+        The __setitem__ mustn't change layers.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+        conf['root.one.b'] = 42
+        conf['root.four.d'] = 42
+
+        self.assertEqual(conf['root.one.b'], 42)
+        self.assertEqual(conf['root.four.d'], 42)
+        self.assertEqual(conf['root.one.z'], 13)
+        self.assertEqual(self.defaults['root']['one']['b'], 2)
+        self.assertNotIn('four', self.defaults['root'])
+        self.assertNotIn('four', self.overrides['root'])
+
+    def test_delitem_copies_on_write(self):
+        """
+        The __delitem__ mustn't change layers.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+        del conf['root.one.a']
+        del conf['non-root']
+
+        self.assertNotIn('root.one.a', conf)
+        self.assertNotIn('non-root', conf)
+        self.assertIn('a', self.defaults['root']['one'])
+        self.assertIn('a', self.overrides['root']['one'])
+        self.assertIn('non-root', self.defaults)
+        self.assertRaises(KeyError, conf.__delitem__, 'root.one.c')
+
+    def test_change_subconf(self):
+        """
+        Changes made via sub-conf have to be visible in the main one.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        one_conf = conf['root.one']
+        one_conf['a'] = 13
+        one_conf.update({'c': 3})
+
+        self.assertEqual(conf['root.one.a'], 13)
+        self.assertEqual(conf['root.one.c'], 3)
+        self.assertEqual(self.overrides['root']['one']['a'], 42)
+
+    def test_update_pushes_layer(self):
+        """
+        The update has to put a new layer on the top of the stack.
+        """
+        conf = LayeredConf(self.defaults)
+        conf['root.one.a'] = 13
+        conf.update(self.overrides, extra=42)
+
+        self.assertEqual(conf._data, dict(self.result, extra=42))
+
+    def test_shared_layers(self):
+        """
+        Instances have to share layers without affecting each other.
+        """
+        conf_a = LayeredConf(self.defaults, {'root': {'tenant': 'a'}})
+        conf_b = LayeredConf(self.defaults, {'root': {'tenant': 'b'}})
+        conf_a['root.one.a'] = 'a'
+
+        self.assertEqual(conf_a['root.tenant'], 'a')
+        self.assertEqual(conf_b['root.tenant'], 'b')
+        self.assertEqual(conf_b['root.one.a'], 1)
+
+    def test_len_and_iter(self):
+        """
+        The __len__ and __iter__ have to account keys of all layers.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        self.assertEqual(len(conf['root']), 3)
+        self.assertCountEqual(conf['root'], ['one', 'two', 'three'])
+        self.assertCountEqual(conf, ['root', 'non-root'])
+
+    def test_from_json(self):
+        """
+        The from_json has to load a file as a new layer.
+        """
+        conf = LayeredConf(self.defaults)
+        conf.from_json(TestConf.jsonfile)
+
+        self.assertEqual(conf._data, self.result)
+
+    def test_compact(self):
+        """
+        The compact has to share values of owned nodes, and has to keep
+        layers intact.
+        """
+        def host():
+            # strings built at runtime aren't interned
+            return ''.join(['local', 'host'])
+
+        layer = {'a': {'host': host(), 'list': [1]}}
+        conf = LayeredConf(layer)
+        conf['a.x'] = host()
+        conf['b'] = {'host': host()}
+
+        shared = host()
+        pool = {(str, shared): shared}
+        self.assertIs(conf.compact(pool), pool)
+
+        self.assertEqual(conf._data, {
+            'a': {'host': 'localhost', 'list': [1], 'x': 'localhost'},
+            'b': {'host': 'localhost'}})
+        self.assertIs(conf['a.x'], shared)
+        self.assertIs(conf['a.host'], shared)
+        self.assertIsNot(layer['a']['host'], shared)
+        # assigned dictionaries are referenced, so they aren't owned
+        self.assertIsNot(conf['b.host'], shared)
+        self.assertIs(conf['a.list'], layer['a']['list'])
+        self.assertEqual(layer, {'a': {'host': 'localhost', 'list': [1]}})
+
+        self.assertIsInstance(LayeredConf(self.defaults).compact(), dict)
+
+    def test_strategies(self):
+        """
+        The values of keys with merge strategies have to be resolved as
+        they're merged by a plain config.
+        """
+        strategies = {
+            'non-root': APPEND,
+            'root.one': REPLACE,
+            'root.x': lambda old, new: old + new,
+        }
+        overrides = {'non-root': [3], 'root': {'one': {'b': 0}, 'x': 2}}
+        layers = [self.defaults, {'root': {'x': 1}}, overrides]
+
+        conf = LayeredConf(*layers, strategies=strategies)
+        expected = Conf(*layers, strategies=strategies)
+
+        self.assertEqual(conf['non-root'], [1, 2, 3])
+        self.assertEqual(conf['root.one'], {'b': 0})
+        self.assertEqual(conf['root']['x'], 3)
+        self.assertEqual(conf._data, expected)
+
+        conf['root.two.d'] = expected['root.two.d'] = 4
+        conf.update({'non-root': [4]})
+        expected.update({'non-root': [4]})
+
+        self.assertEqual(conf['non-root'], [1, 2, 3, 4])
+        self.assertEqual(conf._data, expected)
+        self.assertEqual(conf.copy()['root.x'], 3)
+
+    def test_fingerprint(self):
+        """
+        The fingerprint has to be the same as one of a plain config.
+        """
+        conf = LayeredConf(self.defaults, {'c': 1})
+        self.assertEqual(
+            conf.fingerprint(), Conf(self.defaults, {'c': 1}).fingerprint())
+
+    def test_copy(self):
+        """
+        The copy has to be independent from the config.
+        """
+        conf = LayeredConf(self.defaults)
+        rv = conf.copy()
+        rv['root.one.a'] = 0
+
+        self.assertIsInstance(rv, LayeredConf)
+        self.assertEqual(conf['root.one.a'], self.defaults['root']['one']['a'])
+        self.assertEqual(rv['root.one.a'], 0)
+
+    @mock.patch('dooku.conf._LAZY_THRESHOLD', 0)
+    def test_from_json_lazy(self):
+        """
+        The from_json has to be capable to load a lazy layer.
+        """
+        conf = LayeredConf(self.defaults)
+        conf.from_json(TestConf.jsonfile, lazy=True)
+
+        self.assertEqual(conf['root.one.a'], 42)
+        self.assertEqual(conf._data, self.result)
+
+    def test_set_delete_many(self):
+        """
+        The set_many and delete_many have to copy nodes on write.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+
+        conf.set_many({'root.one.a': 0, 'root.x': 1})
+        conf.delete_many(['root.two'])
+
+        self.assertEqual(conf.get_many(['root.one.a', 'root.x']), [0, 1])
+        self.assertNotIn('two', conf['root'])
+        self.assertEqual(self.overrides['root']['one']['a'], 42)
+        self.assertIn('two', self.defaults['root'])
+
+    def test_get_many(self):
+        """
+        The get_many has to resolve keys through the layers, without
+        merging them.
+        """
+        conf = LayeredConf(self.defaults, self.overrides)
+        conf['root.x'] = 1
+
+        def merge(self):
+            raise AssertionError('Layers are merged.')
+
+        with mock.patch.object(LayeredConf, '_data', property(merge)):
+            self.assertEqual(
+                conf.get_many(['root.one.a', 'root.x', 'root.y', 'x.y']),
+                [42, 1, None, None])
+            self.assertEqual(
+                conf['root'].get_many(['two.c', 'non-root.a'], 0), [3, 0])
+
+            one, = conf.get_many(['root.one'])
+            self.assertIsInstance(one, LayeredConf)
+            self.assertEqual(one.get_many(['b', 'z']), [2, 13])
+
+        self.assertIsNone(conf._cache)
+
+
+class TestMerger(DookuTestCase):
+
+    def test_merge_dicts(self):
+        """
+        The merge has to merge dictionaries recursively by default.
+        """
+        dst = {'a': {'b': 1, 'c': [1]}, 'd': 1}
+        Merger().merge(dst, {'a': {'b': 2, 'c': [2]}, 'd': {'e': 1}})
+
+        self.assertEqual(dst, {'a': {'b': 2, 'c': [2]}, 'd': {'e': 1}})
+
+    def test_merge_copy(self):
+        """
+        The merge has to copy source values if asked.
+        """
+        src = {'a': {'b': [1]}}
+        dst = {}
+        Merger().merge(dst, src, copy=True)
+        dst['a']['b'].append(2)
+        dst['a']['c'] = 3
+
+        self.assertEqual(src, {'a': {'b': [1]}})
+
+    def test_merge_stats(self):
+        """
+        The merge has to report a number of merged nodes and keys.
+        """
+        stats = Merger().merge({'a': {'b': 1}}, {'a': {'b': 2, 'c': 3}})
+
+        self.assertIsInstance(stats, MergeStats)
+        self.assertEqual(stats.nodes, 2)
+        self.assertEqual(stats.keys, 3)
+        self.assertGreaterEqual(stats.seconds, 0)
+
+    def test_strategies(self):
+        """
+        The merge has to apply strategies to values of given keys.
+        """
+        merger = Merger({
+            'a.append': APPEND,
+            'a.union': UNION,
+            'a.replace': REPLACE,
+            'a.merge': MERGE,
+            'a.custom': lambda old, new: old + new,
+        })
+        dst = {'a': {
+            'append': [1, 2],
+            'union': [1, 2],
+            'replace': {'x': 1},
+            'merge': {'x': 1},
+            'custom': 1,
+        }}
+        merger.merge(dst, {'a': {
+            'append': [2, 3],
+            'union': [2, 3],
+            'replace': {'y': 2},
+            'merge': {'y': 2},
+            'custom': 2,
+        }})
+
+        self.assertEqual(dst, {'a': {
+            'append': [1, 2, 2, 3],
+            'union': [1, 2, 3],
+            'replace': {'y': 2},
+            'merge': {'x': 1, 'y': 2},
+            'custom': 3,
+        }})
+
+    def test_union_unhashable(self):
+        """
+        The union strategy has to work with unhashable items.
+        """
+        dst = {'a': [{'x': 1}]}
+        Merger({'a': UNION}).merge(dst, {'a': [{'x': 1}, {'y': 2}]})
+
+        self.assertEqual(dst, {'a': [{'x': 1}, {'y': 2}]})
+
+    def test_unknown_strategy(self):
+        """
+        The constructor has to reject unknown strategies.
+        """
+        self.assertRaises(ValueError, Merger, {'a': 'unknown'})
+
+    def test_deep_tree(self):
+        """
+        The merge has to handle trees deeper than the recursion limit.
+        """
+        src = node = {}
+        for _ in range(sys.getrecursionlimit() + 100):
+            node['k'] = {}
+            node = node['k']
+        node['v'] = 1
+
+        stats = Merger().merge({}, src, copy=True)
+        self.assertEqual(stats.nodes, sys.getrecursionlimit() + 101)
+
+    def test_conf_strategies(self):
+        """
+        The Conf has to use given strategies on update, sub-confs too.
+        """
+        conf = Conf({'a': {'b': [1]}}, strategies={'a.b': APPEND})
+        conf.update({'a': {'b': [2]}})
+        conf['a'].update({'b': [3]})
+
+        self.assertEqual(conf['a.b'], [1, 2, 3])
+
+    def test_conf_update_returns_stats(self):
+        """
+        The update and from_json have to return merge reports.
+        """
+        conf = Conf({'a': {'x': 0}})
+
+        self.assertEqual(conf.update({'a': {'b': 1}}, c=2).keys, 3)
+        self.assertIsInstance(conf.from_json(TestConf.jsonfile), MergeStats)
+
+    def test_merge_shared(self):
+        """
+        Shared nodes of a destination have to be copied before changing.
+        """
+        shared = {'b': {'c': 1}}
+        dst = {'a': shared}
+
+        Merger().merge(dst, {'a': {'b': {'d': 2}}}, shared=True)
+
+        self.assertEqual(dst, {'a': {'b': {'c': 1, 'd': 2}}})
+        self.assertEqual(shared, {'b': {'c': 1}})
+
+
+class TestConfCache(DookuTestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self._write({'root': {'one': [1]}})
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def _write(self, conf, mtime=None):
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(u'' + json.dumps(conf))
+        if mtime is not None:
+            os.utime(self.filename, (mtime, mtime))
+
+    def test_hit(self):
+        """
+        The cache has to parse an unchanged file only once.
+        """
+        cache = ConfCache()
+        loader = mock.Mock(side_effect=json.load)
+
+        self.assertEqual(cache.load(loader, self.filename), {'root': {
+            'one': [1]}})
+        self.assertEqual(cache.load(loader, self.filename), {'root': {
+            'one': [1]}})
+
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual(cache.cache_info()[:4], (1, 1, 0, 1))
+        self.assertGreater(cache.cache_info().memory, 0)
+
+    def test_miss_on_change(self):
+        """
+        The cache has to parse a file again once it's changed.
+        """
+        cache = ConfCache()
+        cache.load(json.load, self.filename)
+        self._write({'root': {'one': [2]}}, mtime=0)
+
+        self.assertEqual(cache.load(json.load, self.filename), {'root': {
+            'one': [2]}})
+        self.assertEqual(cache.cache_info().misses, 2)
+
+    def test_checksum(self):
+        """
+        The cache has to compare content hashes if asked, so a change that
+        isn't reflected in stats is detected and a touch is ignored.
+        """
+        cache = ConfCache(checksum=True)
+        self._write({'root': {'one': [1]}}, mtime=1000)
+        cache.load(json.load, self.filename)
+
+        self._write({'root': {'one': [2]}}, mtime=1000)
+        self.assertEqual(cache.load(json.load, self.filename), {'root': {
+            'one': [2]}})
+
+        self._write({'root': {'one': [2]}}, mtime=2000)
+        cache.load(json.load, self.filename)
+        self.assertEqual(cache.cache_info()[:2], (1, 2))
+
+    def test_evict_by_size(self):
+        """
+        The cache has to evict least recently used entries.
+        """
+        cache = ConfCache(maxsize=1)
+        cache.load(json.load, self.filename)
+        cache.load(json.load, self.filename, encoding='ascii')
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.cache_info().evictions, 1)
+
+    def test_evict_by_memory(self):
+        """
+        The cache has to keep memory taken by entries under the limit.
+        """
+        cache = ConfCache()
+        cache.load(json.load, self.filename)
+        memory = cache.cache_info().memory
+
+        cache = ConfCache(maxmemory=memory)
+        cache.load(json.load, self.filename)
+        cache.load(json.load, self.filename, encoding='ascii')
+        self.assertEqual(cache.cache_info()[2:], (1, 1, memory))
+
+        cache = ConfCache(maxmemory=memory - 1)
+        cache.load(json.load, self.filename)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_and_clear(self):
+        """
+        The invalidate and clear have to drop entries.
+        """
+        cache = ConfCache()
+        cache.load(json.load, self.filename)
+        cache.invalidate(self.filename)
+        self.assertEqual(len(cache), 0)
+
+        cache.load(json.load, self.filename)
+        cache.clear()
+        self.assertEqual(cache.cache_info(), (0, 0, 0, 0, 0))
+
+    def test_conf_copies_cached_tree(self):
+        """
+        The Conf has to copy a cached tree, so changes don't affect it.
+        """
+        cache = ConfCache()
+
+        conf = Conf()
+        conf.from_json(self.filename, cache=cache)
+        conf['root.one'].append(2)
+        conf['root.two'] = 2
+
+        conf = Conf()
+        conf.from_json(self.filename, cache=cache)
+        self.assertEqual(conf, {'root': {'one': [1]}})
+
+    def test_conf_silent_mode(self):
+        """
+        The Conf has to respect silent mode when the cache is used.
+        """
+        conf = Conf()
+        conf.from_json(TestConf.invalid, silent=True, cache=ConfCache())
+        self.assertRaises(
+            ValueError, conf.from_json, TestConf.invalid, cache=ConfCache())
+
+    def test_conf_stream(self):
+        """
+        The cache can't be used in streaming mode.
+        """
+        self.assertRaises(
+            ValueError, Conf().from_json, self.filename,
+            stream=True, cache=ConfCache())
+
+
+class TestCompiledYAML(DookuTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'conf.yaml')
+        shutil.copy(TestConf.yamlfile, self.filename)
+
+        self.result = {
+            'root': {'one': {'a': 42, 'z': 13}, 'three': []},
+            'non-root': [1, 2],
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_compiled_next_to_yaml(self):
+        """
+        The from_yaml has to save a compiled file next to the YAML one and
+        use it on next loads.
+        """
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True)
+
+        self.assertEqual(conf, self.result)
+        self.assertTrue(os.path.exists(self.filename + 'c'))
+
+        with mock.patch('dooku.conf._load_yaml') as load_yaml:
+            conf = Conf()
+            conf.from_yaml(self.filename, compiled=True)
+
+        self.assertEqual(conf, self.result)
+        self.assertFalse(load_yaml.called)
+
+    def test_compiled_cache_dir(self):
+        """
+        The from_yaml has to save compiled files to a given directory.
+        """
+        cache_dir = os.path.join(self.tmpdir, 'cache')
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True, cache_dir=cache_dir)
+
+        self.assertEqual(conf, self.result)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertFalse(os.path.exists(self.filename + 'c'))
+
+    def test_compiled_invalidated_by_source(self):
+        """
+        The compiled file has to be ignored once the YAML one is changed.
+        """
+        Conf().from_yaml(self.filename, compiled=True)
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(u'root: 42\n')
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True)
+        self.assertEqual(conf, {'root': 42})
+
+    def test_compiled_broken(self):
+        """
+        The broken compiled file has to be ignored and rewritten.
+        """
+        with io.open(self.filename + 'c', 'wb') as f:
+            f.write(b'garbage')
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True)
+        self.assertEqual(conf, self.result)
+
+        with io.open(self.filename + 'c', 'rb') as f:
+            self.assertNotEqual(f.read(), b'garbage')
+
+    def test_compiled_non_builtin_types(self):
+        """
+        The compiled file has to support values like dates.
+        """
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(u'released: 2016-01-01\n')
+
+        Conf().from_yaml(self.filename, compiled=True, allow_pickle=True)
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True, allow_pickle=True)
+
+        self.assertEqual(conf['released'], datetime.date(2016, 1, 1))
+
+    def test_compiled_pickle_refused(self):
+        """
+        The pickled compiled file has to be neither saved nor loaded unless
+        pickle is allowed.
+        """
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(u'released: 2016-01-01\n')
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True)
+        self.assertEqual(conf['released'], datetime.date(2016, 1, 1))
+        self.assertFalse(os.path.exists(self.filename + 'c'))
+
+        # a valid header followed by a pickle that's crafted by someone else
+        Conf().from_yaml(self.filename, compiled=True, allow_pickle=True)
+        with io.open(self.filename + 'c', 'rb') as f:
+            header = f.read(len(b'DKYC') + hashlib.sha1().digest_size)
+        with io.open(self.filename + 'c', 'wb') as f:
+            f.write(header + b'p' + pickle.dumps({'crafted': True}))
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True)
+        self.assertEqual(conf, {'released': datetime.date(2016, 1, 1)})
+
+        conf = Conf()
+        conf.from_yaml(self.filename, compiled=True, allow_pickle=True)
+        self.assertEqual(conf, {'crafted': True})
+
+    def test_safe_loader(self):
+        """
+        The from_yaml has to refuse to construct arbitrary objects.
+        """
+        with io.open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(u'root: !!python/object:dooku.conf.Conf {}\n')
+
+        self.assertRaises(Exception, Conf().from_yaml, self.filename)
+
+
+class TestFromFiles(DookuTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = []
+
+        for i in range(10):
+            filename = os.path.join(self.tmpdir, '%02d.json' % i)
+            with io.open(filename, 'w', encoding='utf-8') as f:
+                f.write(u'' + json.dumps({
+                    'root': {'last': i, 'items': {str(i): i}}}))
+            self.filenames.append(filename)
+
+        filename = os.path.join(self.tmpdir, '10.yaml')
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(u'root: {yaml: true}\n')
+        self.filenames.append(filename)
+
+        self.result = {'root': {
+            'last': 9,
+            'items': dict((str(i), i) for i in range(10)),
+            'yaml': True,
+        }}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_threads(self):
+        """
+        The from_files has to produce the same result as loading files one
+        by one.
+        """
+        conf = Conf()
+        stats = conf.from_files(self.filenames, workers=4)
+
+        self.assertEqual(conf, self.result)
+        self.assertIsInstance(stats, MergeStats)
+
+    def test_processes(self):
+        """
+        The from_files has to be capable to load files in processes.
+        """
+        conf = Conf()
+        conf.from_files(self.filenames, workers=2, processes=True)
+
+        self.assertEqual(conf, self.result)
+
+    def test_keep_order(self):
+        """
+        The from_files has to merge files in a given order.
+        """
+        conf = Conf()
+        conf.from_files(reversed(self.filenames[:10]), loader=json.load)
+
+        self.assertEqual(conf['root.last'], 0)
+
+    def test_cache(self):
+        """
+        The from_files has to use a given cache.
+        """
+        cache = ConfCache()
+        Conf().from_files(self.filenames, cache=cache)
+
+        conf = Conf()
+        conf.from_files(self.filenames, cache=cache)
+
+        self.assertEqual(conf, self.result)
+        self.assertEqual(cache.cache_info().hits, len(self.filenames))
+        self.assertRaises(
+            ValueError, conf.from_files, self.filenames,
+            cache=cache, processes=True)
+
+    def test_raise_error(self):
+        """
+        The from_files has to raise an error of a file that failed to load
+        and skip it in silent mode.
+        """
+        filenames = self.filenames[:3] + [TestConf.invalid]
+
+        self.assertRaises(
+            ValueError, Conf().from_files, filenames, loader=json.load)
+
+        conf = Conf()
+        conf.from_files(filenames, loader=json.load, silent=True)
+        self.assertEqual(conf['root.last'], 2)
+
+    def test_unknown_extension(self):
+        """
+        The from_files has to refuse to guess a loader for unknown files.
+        """
+        self.assertRaises(ValueError, Conf().from_files, [TestConf.invalid])
+
+
+class TestConfWatcher(DookuTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.first = os.path.join(self.tmpdir, 'first.json')
+        self.second = os.path.join(self.tmpdir, 'second.json')
+
+        self._write(self.first, {'a': {'x': 1, 'y': 2}, 'b': 1})
+        self._write(self.second, {'a': {'y': 3}})
+
+        self.conf = Conf({'a': {'z': 0}, 'c': 0})
+        self.watcher = ConfWatcher(self.conf)
+        self.watcher.watch(self.first)
+        self.watcher.watch(self.second)
+
+        self.notifications = []
+        self.watcher.subscribe(self.notifications.append)
+
+    def tearDown(self):
+        self.watcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, filename, data):
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write(u'' + json.dumps(data))
+        # mtime may have a coarse resolution, so make sure it's changed
+        stat = os.stat(filename)
+        os.utime(filename, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_watch(self):
+        """
+        Watched files have to be merged into the conf.
+        """
+        self.assertEqual(self.conf, {
+            'a': {'x': 1, 'y': 3, 'z': 0}, 'b': 1, 'c': 0})
+
+    def test_layered_conf(self):
+        """
+        The watcher has to work with layered configs and their strategies.
+        """
+        conf = LayeredConf(
+            {'a': {'z': 0}, 'l': [0]}, strategies={'l': APPEND})
+        watcher = ConfWatcher(conf)
+        self._write(self.second, {'a': {'y': 3}, 'l': [1]})
+        watcher.watch(self.first)
+        watcher.watch(self.second)
+
+        self.assertEqual(conf['a'], {'x': 1, 'y': 3, 'z': 0})
+        self.assertEqual(conf['l'], [0, 1])
+
+        self._write(self.first, {'a': {'x': 5, 'y': 2}, 'b': 1})
+        self.assertEqual(watcher.check(), set(['a.x']))
+        self.assertEqual(conf['a.x'], 5)
+
+    def test_concurrent_conf(self):
+        """
+        The reload has to be published as a single version of concurrent
+        configs, so readers never see it applied partially.
+        """
+        versions = []
+
+        class RecordingConf(ConcurrentConf):
+            def __setattr__(self, name, value):
+                if name == '_version':
+                    versions.append(value)
+                ConcurrentConf.__setattr__(self, name, value)
+
+        conf = RecordingConf({'a': {'z': 0}, 'c': 0})
+        watcher = ConfWatcher(conf)
+        watcher.watch(self.first)
+        watcher.watch(self.second)
+        del versions[:]
+
+        self._write(self.first, {'a': {'x': 5}, 'b': 2, 'd': {'e': 1}})
+        self.assertEqual(watcher.check(), set(['a.x', 'b', 'd.e']))
+        self.assertEqual(len(versions), 1)
+        self.assertEqual(conf, {
+            'a': {'x': 5, 'y': 3, 'z': 0}, 'b': 2, 'c': 0, 'd': {'e': 1}})
+
+    def test_check_unchanged(self):
+        """
+        Nothing has to be reported if files are unchanged.
+        """
+        self.assertEqual(self.watcher.check(), set())
+        self.assertEqual(self.notifications, [])
+
+    def test_check_changed(self):
+        """
+        Changed values have to be applied and reported.
+        """
+        self._write(self.first, {'a': {'x': 5, 'y': 2}, 'b': 1})
+
+        self.assertEqual(self.watcher.check(), set(['a.x']))
+        self.assertEqual(self.conf['a.x'], 5)
+        self.assertEqual(self.notifications, [set(['a.x'])])
+
+    def test_check_overridden(self):
+        """
+        Changes of values that are overridden by other files have to be
+        ignored.
+        """
+        self._write(self.first, {'a': {'x': 1, 'y': 42}, 'b': 1})
+
+        self.assertEqual(self.watcher.check(), set())
+        self.assertEqual(self.conf['a.y'], 3)
+        self.assertEqual(self.notifications, [])
+
+    def test_check_removed_key(self):
+        """
+        Removed keys have to fall back to values of lower files, or to be
+        deleted if there are no such ones.
+        """
+        self._write(self.second, {})
+        self._write(self.first, {'a': {'y': 2}})
+
+        self.assertEqual(self.watcher.check(), set(['a.x', 'a.y', 'b']))
+        self.assertEqual(self.conf, {'a': {'y': 2, 'z': 0}, 'c': 0})
+
+    def test_check_replaced_by_value(self):
+        """
+        A subtree that's replaced by a value and back has to be restored
+        with defaults.
+        """
+        self._write(self.second, {'a': 42})
+        self.assertEqual(self.watcher.check(), set(['a']))
+        self.assertEqual(self.conf['a'], 42)
+
+        self._write(self.second, {'a': {'y': 3}})
+        self.assertEqual(self.watcher.check(), set(['a']))
+        self.assertEqual(self.conf['a'], {'x': 1, 'y': 3, 'z': 0})
+
+    def test_check_removed_file(self):
+        """
+        A removed file has to be treated as an empty one.
+        """
+        os.remove(self.second)
+
+        self.assertEqual(self.watcher.check(), set(['a.y']))
+        self.assertEqual(self.conf['a.y'], 2)
+
+    def test_check_broken_file(self):
+        """
+        A broken file has to keep its previous content until the next check.
+        """
+        with io.open(self.second, 'w', encoding='utf-8') as f:
+            f.write(u'{"a": {"y"')
+        os.utime(self.second, (0, 0))
+
+        self.assertEqual(self.watcher.check(), set())
+        self.assertEqual(self.conf['a.y'], 3)
+
+        self._write(self.second, {'a': {'y': 4}})
+        self.assertEqual(self.watcher.check(), set(['a.y']))
+        self.assertEqual(self.conf['a.y'], 4)
+
+    def test_strategies(self):
+        """
+        Merge strategies of the conf have to be respected on reload.
+        """
+        self._write(self.first, {'items': [1]})
+        self._write(self.second, {'items': [2]})
+
+        conf = Conf({'items': [0]}, strategies={'items': APPEND})
+        watcher = ConfWatcher(conf)
+        watcher.watch(self.first)
+        watcher.watch(self.second)
+        self.assertEqual(conf['items'], [0, 1, 2])
+
+        self._write(self.first, {'items': [1, 1]})
+        self.assertEqual(watcher.check(), set(['items']))
+        self.assertEqual(conf['items'], [0, 1, 1, 2])
+
+    def test_unsubscribe(self):
+        """
+        Unsubscribed callbacks don't have to be called.
+        """
+        self.watcher.unsubscribe(self.notifications.append)
+        self._write(self.first, {'a': {'x': 5, 'y': 2}, 'b': 1})
+
+        self.assertEqual(self.watcher.check(), set(['a.x']))
+        self.assertEqual(self.notifications, [])
+
+    def test_start(self):
+        """
+        The background thread has to check files periodically.
+        """
+        with mock.patch.object(ConfWatcher, 'check') as check:
+            self.watcher.interval = 0.01
+            self.watcher.start()
+
+            for _ in range(500):
+                if check.call_count >= 2:
+                    break
+                time.sleep(0.01)
+
+            self.watcher.stop()
+
+        self.assertGreaterEqual(check.call_count, 2)
+        self.assertIsNone(self.watcher._thread)
+
+
+class TestConcurrentConf(DookuTestCase):
+
+    def setUp(self):
+        self.data = {'a': {'b': {'c': 1}, 'x': 1}, 'y': [1]}
+        self.conf = ConcurrentConf(self.data)
+
+    def test_getitem(self):
+        """
+        The class has to behave like a usual Conf on reads.
+        """
+        self.assertEqual(self.conf['a.b.c'], 1)
+        self.assertEqual(self.conf['a']['b'], {'c': 1})
+        self.assertEqual(self.conf, self.data)
+        self.assertEqual(len(self.conf['a']), 2)
+        self.assertEqual(set(self.conf), set(['a', 'y']))
+        self.assertRaises(KeyError, lambda: self.conf['a.z'])
+
+    def test_sources_are_copied(self):
+        """
+        Changes of sources don't have to affect the instance.
+        """
+        self.data['a']['b']['c'] = 42
+        self.assertEqual(self.conf['a.b.c'], 1)
+
+    def test_update(self):
+        """
+        An update has to publish a new version and leave an old one intact.
+        """
+        version = self.conf._version
+
+        stats = self.conf.update({'a': {'b': {'d': 2}}})
+
+        self.assertIsInstance(stats, MergeStats)
+        self.assertEqual(self.conf['a.b'], {'c': 1, 'd': 2})
+        self.assertEqual(version, {'a': {'b': {'c': 1}, 'x': 1}, 'y': [1]})
+
+        # untouched nodes have to be shared with the old version
+        self.assertIs(self.conf._version['y'], version['y'])
+
+    def test_setitem(self):
+        """
+        Setting a value has to copy only a path to it.
+        """
+        version = self.conf._version
+
+        self.conf['a.b.c'] = 2
+        self.conf['z.z'] = 3
+
+        self.assertEqual(self.conf['a.b.c'], 2)
+        self.assertEqual(self.conf['z.z'], 3)
+        self.assertEqual(version['a']['b']['c'], 1)
+        self.assertNotIn('z', version)
+
+    def test_delitem(self):
+        """
+        Deleting a value has to publish a new version.
+        """
+        version = self.conf._version
+
+        del self.conf['a.b']
+
+        self.assertEqual(self.conf, {'a': {'x': 1}, 'y': [1]})
+        self.assertIn('b', version['a'])
+        self.assertRaises(KeyError, self.conf.__delitem__, 'q.w')
+
+    def test_views(self):
+        """
+        Views have to write through to a root instance and see its latest
+        version.
+        """
+        view = self.conf['a']
+
+        view['b.c'] = 2
+        view.update({'x': 3})
+        self.conf['a.b.e'] = 4
+
+        self.assertEqual(self.conf['a'], {'b': {'c': 2, 'e': 4}, 'x': 3})
+        self.assertEqual(view['b.e'], 4)
+
+    def test_strategies(self):
+        """
+        Merge strategies have to be respected by views as well.
+        """
+        conf = ConcurrentConf(
+            {'a': {'items': [1]}}, strategies={'a.items': APPEND})
+
+        conf['a'].update({'items': [2]})
+
+        self.assertEqual(conf['a.items'], [1, 2])
+
+    def test_concurrent_writes(self):
+        """
+        Readers have to see consistent versions while writers are changing
+        the instance.
+        """
+        conf = ConcurrentConf({'a': {'v': 0}, 'b': {'v': 0}})
+        errors = []
+
+        def write(n):
+            for i in range(500):
+                conf.update({'a': {'v': i}, 'b': {'v': i}})
+                conf['x.%d' % n] = i
+
+        def read():
+            for _ in range(500):
+                snapshot = conf.freeze()
+                if snapshot['a.v'] != snapshot['b.v']:
+                    errors.append(snapshot)
+
+        threads = [threading.Thread(target=write, args=(n, ))
+                   for n in range(2)]
+        threads += [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(conf['x'], {'0': 499, '1': 499})
+
+    def test_set_many(self):
+        """
+        The set_many has to publish all values as a single version.
+        """
+        version = self.conf._version
+
+        self.conf.set_many({'a.b.c': 2, 'a.x': 3, 'z.z': 4})
+
+        self.assertEqual(
+            self.conf.get_many(['a.b.c', 'a.x', 'z.z']), [2, 3, 4])
+        self.assertEqual(version, {'a': {'b': {'c': 1}, 'x': 1}, 'y': [1]})
+
+        # a failed batch doesn't have to be published at all
+        self.assertRaises(
+            TypeError, self.conf.set_many, [('a.x', 5), ('y.q', 6)])
+        self.assertEqual(self.conf['a.x'], 3)
+
+    def test_delete_many(self):
+        """
+        The delete_many has to publish a new version.
+        """
+        version = self.conf._version
+
+        self.conf['a'].delete_many(['b.c', 'x'])
+
+        self.assertEqual(self.conf, {'a': {'b': {}}, 'y': [1]})
+        self.assertEqual(version, {'a': {'b': {'c': 1}, 'x': 1}, 'y': [1]})
+
+    def test_compact(self):
+        """
+        The compact has to publish a new version.
+        """
+        version = self.conf._version
+        other = ConcurrentConf(self.data)
+
+        pool = self.conf.compact()
+        other.compact(pool)
+
+        self.assertEqual(self.conf, self.data)
+        self.assertIsNot(self.conf._version, version)
+        self.assertIs(
+            next(iter(self.conf._version)), next(iter(other._version)))
+
+    def test_apply_patch(self):
+        """
+        The apply_patch has to publish a single new version, and a diff of
+        versions has to skip shared subtrees.
+        """
+        old = self.conf._version
+        new = {'a': {'b': {'c': 2}, 'x': 1}, 'z': 0}
+
+        self.conf.apply_patch(self.conf.diff(new))
+
+        self.assertEqual(self.conf, new)
+        self.assertEqual(old, {'a': {'b': {'c': 1}, 'x': 1}, 'y': [1]})
+
+        self.conf['q.w'] = 1
+        self.assertEqual(Conf(new).diff(self.conf).added, {('q', ): {'w': 1}})
+
+    def test_fingerprint(self):
+        """
+        The fingerprint has to be cached for subtrees shared by versions,
+        and fingerprints of replaced nodes have to be dropped.
+        """
+        fingerprint = self.conf.fingerprint()
+        cached = self.conf._hashes[id(self.conf._version['a']['b'])]
+
+        self.conf['a.x'] = 2
+        self.assertNotEqual(self.conf.fingerprint(), fingerprint)
+        self.assertIs(
+            self.conf._hashes[id(self.conf._version['a']['b'])], cached)
+
+        self.conf['a']['x'] = 1
+        self.conf.update({'a': {'b': {'c': 1}}})
+        self.assertEqual(self.conf.fingerprint(), fingerprint)
+        self.assertEqual(len(self.conf._hashes), 3)
+
+    def test_copy(self):
+        """
+        The copy has to share the latest version and copy nodes on write.
+        """
+        rv = self.conf.copy()
+        self.assertIs(rv._version, self.conf._version)
+
+        rv['a.x'] = 2
+        self.assertEqual(self.conf['a.x'], 1)
+        self.assertEqual(dict(rv.items())['a'], {'b': {'c': 1}, 'x': 2})
+
+
+class TestSchema(DookuTestCase):
+
+    def setUp(self):
+        self.schema = Schema({
+            'host': ('server.host', str),
+            'port': ('server.port', int),
+            'debug': ('debug', bool, False),
+            'server.workers': int,
+        })
+        self.conf = Conf({
+            'server': {'host': 'localhost', 'port': '8080', 'workers': 4},
+        })
+
+    def test_load(self):
+        """
+        The load has to coerce values, and set defaults.
+        """
+        settings = self.schema.load(self.conf)
+
+        self.assertIsInstance(settings, self.schema.accessor)
+        self.assertEqual(settings.host, 'localhost')
+        self.assertEqual(settings.port, 8080)
+        self.assertIs(settings.debug, False)
+        self.assertEqual(settings.server_workers, 4)
+        self.assertEqual(settings, self.schema.load(self.conf.freeze()))
+
+    def test_accessor_has_slots(self):
+        """
+        The accessor has to keep values in slots only.
+        """
+        settings = self.schema.load(self.conf)
+
+        self.assertFalse(hasattr(settings, '__dict__'))
+        self.assertRaises(AttributeError, setattr, settings, 'other', 1)
+        self.assertEqual(
+            repr(settings),
+            "Settings(debug=False, host='localhost', port=8080, "
+            "server_workers=4)")
+
+    def test_load_bool(self):
+        """
+        The bool type has to accept well-known words only.
+        """
+        for value, expected in [
+                (True, True), (0, False), ('yes', True), (' Off ', False)]:
+            self.conf['debug'] = value
+            self.assertIs(self.schema.load(self.conf).debug, expected)
+
+        self.conf['debug'] = 'maybe'
+        self.assertRaises(ValueError, self.schema.load, self.conf)
+
+    def test_load_invalid(self):
+        """
+        The load has to report all missing and invalid values at once.
+        """
+        self.conf['server.port'] = 'http'
+        del self.conf['server.host']
+
+        with self.assertRaises(ValueError) as ctx:
+            self.schema.load(self.conf)
+
+        self.assertIn('server.host: missing', str(ctx.exception))
+        self.assertIn('server.port: invalid literal', str(ctx.exception))
+
+    def test_load_into(self):
+        """
+        The load has to refresh a given accessor only if values are valid.
+        """
+        settings = self.schema.load(self.conf)
+
+        self.conf['server.port'] = 80
+        self.assertIs(self.schema.load(self.conf, settings), settings)
+        self.assertEqual(settings.port, 80)
+
+        self.conf['server.port'] = 'http'
+        self.assertRaises(ValueError, self.schema.load, self.conf, settings)
+        self.assertEqual(settings.port, 80)
+
+        other = Schema({'port': ('server.port', int)})
+        self.assertRaises(TypeError, other.load, self.conf, settings)
+
+    def test_bad_declarations(self):
+        """
+        The schema has to refuse bad declarations.
+        """
+        for fields in [
+                {'port': ('server.port', )},
+                {'_port': ('server.port', int)},
+                {'server-port': int},
+                {'a.b': int, 'a_b': int}]:
+            self.assertRaises(ValueError, Schema, fields)
+
+
+class TestEnvOverlay(DookuTestCase):
+
+    def setUp(self):
+        self.conf = Conf({'db': {'host': 'localhost', 'user': 'app'}})
+        self.environ = {
+            'APP__DB__HOST': 'db.local',
+            'APP__DB__PORT': '5432',
+            'APP__DEBUG': 'true',
+            'APP__TAGS': '["a", "b"]',
+            'APP__': 'ignored',
+            'PATH': '/bin',
+        }
+
+    def test_overlay(self):
+        """
+        The overlay has to set typed values of prefixed variables.
+        """
+        EnvOverlay(self.conf, 'APP', environ=self.environ)
+
+        self.assertEqual(self.conf, {
+            'db': {'host': 'db.local', 'user': 'app', 'port': 5432},
+            'debug': True,
+            'tags': ['a', 'b'],
+        })
+
+    def test_overlay_options(self):
+        """
+        The overlay has to respect a delimiter and a case of names.
+        """
+        EnvOverlay(self.conf, 'APP', delimiter='_', lowercase=False,
+                   environ={'APP_DB_Name': 'x', 'APP__DB__HOST': 'y'})
+
+        self.assertEqual(self.conf['DB.Name'], 'x')
+        self.assertEqual(self.conf['db.host'], 'localhost')
+
+    def test_refresh(self):
+        """
+        The refresh has to apply changed variables only, and to restore
+        values of removed ones.
+        """
+        overlay = EnvOverlay(self.conf, 'APP', environ=self.environ)
+
+        self.environ['APP__DB__PORT'] = '6432'
+        self.environ['APP__DB__NAME'] = 'app'
+        del self.environ['APP__DB__HOST']
+        del self.environ['APP__DEBUG']
+        self.environ['PATH'] = '/usr/bin'
+
+        with mock.patch('dooku.conf._parse_env_value',
+                        side_effect=lambda value: value) as parse:
+            changed = overlay.refresh()
+
+        self.assertEqual(
+            changed, set(['db.port', 'db.name', 'db.host', 'debug']))
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual(self.conf, {
+            'db': {'host': 'localhost', 'user': 'app', 'port': '6432',
+                   'name': 'app'},
+            'tags': ['a', 'b'],
+        })
+        self.assertEqual(overlay.refresh(), set())
+
+    def test_refresh_nested(self):
+        """
+        The refresh has to keep values of children over their parents.
+        """
+        overlay = EnvOverlay(self.conf, 'APP', environ=self.environ)
+
+        self.environ['APP__DB'] = '{"host": "other", "pool": {"size": 1}}'
+        overlay.refresh()
+        self.assertEqual(self.conf['db'], {
+            'host': 'db.local', 'port': 5432, 'pool': {'size': 1}})
+
+        del self.environ['APP__DB__HOST']
+        del self.environ['APP__DB__PORT']
+        overlay.refresh()
+        self.assertEqual(self.conf['db'], {
+            'host': 'other', 'pool': {'size': 1}})
+
+        del self.environ['APP__DB']
+        self.environ['APP__NEW__KEY'] = '1'
+        overlay.refresh()
+        del self.environ['APP__NEW__KEY']
+        overlay.refresh()
+        self.assertEqual(self.conf, {
+            'db': {'host': 'localhost', 'user': 'app'},
+            'debug': True,
+            'tags': ['a', 'b'],
+        })
+
+    def test_apply(self):
+        """
+        The apply has to set values of the overlay over updated ones.
+        """
+        overlay = EnvOverlay(self.conf, 'APP', environ=self.environ)
+
+        self.conf.update({'db': {'host': 'other', 'port': 1}})
+        overlay.apply()
+
+        self.assertEqual(self.conf['db.host'], 'db.local')
+        self.assertEqual(self.conf['db.port'], 5432)
+
+    def test_conflict(self):
+        """
+        The overlay has to refuse to set a key into a value that isn't
+        a dictionary.
+        """
+        self.environ['APP__DB'] = '1'
+        self.assertRaises(
+            TypeError, EnvOverlay, self.conf, 'APP', environ=self.environ)
@@ -9,11 +9,21 @@
     :license: BSD, see LICENSE for details
 """
 
+import io
 import os
-import pkg_resources
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import collections
+
 import mock
 
-from dooku.ext import ExtensionManager
+from dooku.ext import ExtensionManager, EntryPointIndex, registry
+from dooku.ext import ExtensionLoadError
+from dooku.ext import _scan_entry_points
 
 from . import DookuTestCase
 
@@ -30,11 +40,55 @@ class NewTwo(object):
     pass
 
 
-class TestExtensionManager(DookuTestCase):
+class DistributionsTestCase(DookuTestCase):
+    """
+    Creates fake distributions that export some extensions via entry
+    points, and makes them discoverable.
+    """
 
     # namespace to be used to export extensions via entry points
     namespace = 'dooku.tests'
 
+    def _make_dist(self, name, entry_points):
+        """
+        Creates a fake distribution with given entry points in a temporary
+        directory, and returns the directory.
+        """
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+
+        distinfo = os.path.join(location, '%s-0.1.dist-info' % name)
+        os.mkdir(distinfo)
+
+        with io.open(os.path.join(distinfo, 'METADATA'), 'w') as f:
+            f.write(u'Metadata-Version: 2.1\nName: %s\nVersion: 0.1\n' % name)
+
+        with io.open(os.path.join(distinfo, 'entry_points.txt'), 'w') as f:
+            f.write(u'[%s]\n' % self.namespace)
+            for entry_point in entry_points:
+                f.write(u'%s\n' % entry_point)
+
+        return location
+
+    def setUp(self):
+        self.locations = [
+            self._make_dist('fake_project_1', [
+                'one = %s:One' % __name__,
+                'two = %s:Two' % __name__, ]),
+            self._make_dist('fake_project_2', [
+                'two = %s:NewTwo' % __name__, ]),
+        ]
+
+        sys.path.extend(self.locations)
+        for location in self.locations:
+            self.addCleanup(sys.path.remove, location)
+
+        registry.refresh()
+        self.addCleanup(registry.refresh)
+
+
+class TestExtensionManager(DistributionsTestCase):
+
     def _get_entry_points(self, names, load_fn=None):
         """
         Prepares and returns named mocks with optional .load function.
@@ -52,36 +106,7 @@ class TestExtensionManager(DookuTestCase):
         return rv
 
     def setUp(self):
-        # create a fake distribution that will be used to export some
-        # extensions via entry points
-        fake_dist_1 = pkg_resources.Distribution(
-            project_name='fake_project_1',
-            version='0.1',
-            location=os.path.dirname(__file__))
-        fake_dist_2 = pkg_resources.Distribution(
-            project_name='fake_project_2',
-            version='0.1',
-            location=os.path.dirname(__file__))
-
-        # unfortunately, there's no public api for registring new entry
-        # points so no choice but use internal one
-        fake_dist_1._ep_map = {
-            self.namespace: {
-                'one': pkg_resources.EntryPoint.parse(
-                    'one = %s:One' % __name__, dist=fake_dist_1),
-                'two': pkg_resources.EntryPoint.parse(
-                    'two = %s:Two' % __name__, dist=fake_dist_1),
-            }}
-        fake_dist_2._ep_map = {
-            self.namespace: {
-                'two': pkg_resources.EntryPoint.parse(
-                    'two = %s:NewTwo' % __name__, dist=fake_dist_2),
-            }}
-
-        # register fake distributions within pkg_resources
-        pkg_resources.working_set.add(fake_dist_1)
-        pkg_resources.working_set.add(fake_dist_2)
-
+        super(TestExtensionManager, self).setUp()
         self.ext_manager = ExtensionManager(self.namespace)
 
     def test_get(self):
@@ -161,7 +186,50 @@ class TestExtensionManager(DookuTestCase):
             ('two', Two),
             ('two', NewTwo), ])
 
-    @mock.patch('dooku.ext.pkg_resources.iter_entry_points', autospec=True)
+    def test_pkg_resources_fallback(self):
+        """
+        The pkg_resources has to be used if importlib.metadata and its
+        backport aren't available.
+        """
+        import pkg_resources
+
+        # the first distribution only, so extensions discovered by
+        # importlib.metadata differ
+        working_set = pkg_resources.WorkingSet(self.locations[:1])
+        unavailable = {'importlib.metadata': None, 'importlib_metadata': None}
+
+        registry.refresh()
+        with mock.patch.dict('sys.modules', unavailable), \
+                mock.patch('pkg_resources.working_set', working_set):
+            self.ext_manager = ExtensionManager(self.namespace)
+
+        self.assertEqual(self.ext_manager.getall('two'), [Two])
+        self.assertEqual(self.ext_manager['one'], One)
+
+    def test_pkg_resources_not_imported(self):
+        """
+        Neither importing dooku.ext nor discovering extensions has to
+        import pkg_resources, since it scans all distributions on import.
+        """
+        if sys.version_info < (3, 8):
+            self.skipTest('importlib.metadata is not available')
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))] +
+            self.locations +
+            env.get('PYTHONPATH', '').split(os.pathsep))
+
+        output = subprocess.check_output([sys.executable, '-c', (
+            'import sys\n'
+            'from dooku.ext import ExtensionManager\n'
+            'rv = ExtensionManager("%s").names()\n'
+            'print(sorted(rv), "pkg_resources" in sys.modules)\n'
+        ) % self.namespace], env=env)
+
+        self.assertEqual(output.strip(), b"['one', 'two'] False")
+
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
     def test_keep_load_order(self, iter_ep):
         """
         The constructor has to load extensions is passed order.
@@ -172,15 +240,12 @@ class TestExtensionManager(DookuTestCase):
             order.append(self.name)
 
         entry_points = self._get_entry_points(['a', 'b', 'c'], load_trap)
-        iter_ep.side_effect = [
-            [entry_points[2]],
-            [entry_points[0]],
-            [entry_points[1]], ]
+        iter_ep.return_value = entry_points
 
         self.ext_manager = ExtensionManager(self.namespace, ['c', 'a', 'b'])
         self.assertEqual(order, ['c', 'a', 'b'])
 
-    @mock.patch('dooku.ext.pkg_resources.iter_entry_points', autospec=True)
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
     def test_silent_false(self, iter_ep):
         """
         The constructor has to raise exceptions if silent is False.
@@ -190,11 +255,15 @@ class TestExtensionManager(DookuTestCase):
 
         iter_ep.return_value = entry_points
 
-        self.assertRaises(
-            ValueError,
-            lambda: ExtensionManager(self.namespace, silent=False))
+        with self.assertRaises(ValueError) as context:
+            ExtensionManager(self.namespace, silent=False)
+
+        # the error is thrown as is, and the rest aren't loaded
+        self.assertIs(context.exception, entry_points[1].load.side_effect)
+        self.assertFalse(hasattr(context.exception, 'errors'))
+        self.assertFalse(entry_points[2].load.called)
 
-    @mock.patch('dooku.ext.pkg_resources.iter_entry_points', autospec=True)
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
     def test_silent_true(self, iter_ep):
         """
         The constructor don't has to raise exceptions if silent is True.
@@ -210,3 +279,271 @@ class TestExtensionManager(DookuTestCase):
             ('b', entry_points[1].load()),
             ('c', entry_points[2].load()), ]))
         self.assertCountEqual(self.ext_manager.names(), ['b', 'c'])
+
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
+    def test_lazy(self, iter_ep):
+        """
+        The extensions of a name have to be loaded on first access to it
+        in lazy mode.
+        """
+        loaded = []
+
+        def load_trap(self, *args):
+            loaded.append(self.name)
+            return self.name.upper()
+
+        iter_ep.return_value = self._get_entry_points(
+            ['a', 'b', 'b', 'c'], load_trap)
+
+        self.ext_manager = ExtensionManager(self.namespace, lazy=True)
+        self.assertCountEqual(self.ext_manager.names(), ['a', 'b', 'c'])
+        self.assertIn('c', self.ext_manager)
+        self.assertEqual(loaded, [])
+
+        self.assertEqual(self.ext_manager['a'], 'A')
+        self.assertEqual(self.ext_manager.getall('b'), ['B', 'B'])
+        self.assertEqual(self.ext_manager.get('a'), 'A')
+        self.assertEqual(loaded, ['a', 'b', 'b'])
+
+        self.assertCountEqual([i for i in self.ext_manager], [
+            ('a', 'A'), ('b', 'B'), ('b', 'B'), ('c', 'C'), ])
+        self.assertEqual(loaded, ['a', 'b', 'b', 'c'])
+
+    def test_lazy_discovered(self):
+        """
+        The lazy mode has to give the same extensions as the eager one.
+        """
+        self.ext_manager = ExtensionManager(self.namespace, lazy=True)
+
+        self.assertEqual(self.ext_manager.get('one'), One)
+        self.assertEqual(self.ext_manager.getall('two'), [Two, NewTwo])
+        self.assertCountEqual([i for i in self.ext_manager], [
+            ('one', One),
+            ('two', Two),
+            ('two', NewTwo), ])
+
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
+    def test_lazy_silent(self, iter_ep):
+        """
+        The lazy mode has to throw loading errors on access if silent is
+        False, and has to drop names that failed to load otherwise.
+        """
+        entry_points = self._get_entry_points(['a', 'b'])
+        entry_points[0].load.side_effect = ValueError('error')
+        iter_ep.return_value = entry_points
+
+        self.ext_manager = ExtensionManager(self.namespace, lazy=True)
+        self.assertRaises(ValueError, lambda: self.ext_manager['a'])
+        self.assertRaises(ValueError, lambda: self.ext_manager['a'])
+        self.assertEqual(self.ext_manager['b'], entry_points[1].load())
+
+        self.ext_manager = ExtensionManager(
+            self.namespace, silent=True, lazy=True)
+        self.assertIn('a', self.ext_manager)
+        self.assertIsNone(self.ext_manager.get('a'))
+        self.assertNotIn('a', self.ext_manager)
+        self.assertEqual(self.ext_manager.getall('a'), [])
+        self.assertEqual(
+            [i for i in self.ext_manager], [('b', entry_points[1].load())])
+
+    def test_registry(self):
+        """
+        The distributions have to be scanned once for all namespaces, and
+        have to be scanned again on refresh.
+        """
+        location = self._make_dist('fake_project_3', [
+            'three = %s:One' % __name__, ])
+        sys.path.append(location)
+        self.addCleanup(sys.path.remove, location)
+
+        self.assertNotIn('three', ExtensionManager(self.namespace))
+
+        with mock.patch('dooku.ext._scan_entry_points',
+                        wraps=_scan_entry_points) as scan:
+            registry.refresh()
+            ExtensionManager(self.namespace)
+            ExtensionManager(self.namespace, ['three'])
+            ExtensionManager('dooku.tests.missed')
+
+        self.assertEqual(scan.call_count, 1)
+        self.assertIn('three', ExtensionManager(self.namespace))
+
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
+    def test_workers(self, iter_ep):
+        """
+        The extensions have to be imported concurrently if workers are
+        passed, and have to be ordered as if they are imported one by one.
+        """
+        started = threading.Event()
+
+        def load_trap(self, *args):
+            # the first one waits for the others to start, so it's never
+            # completed first
+            if self.name == 'a':
+                return started.wait(5)
+            started.set()
+            return self.name
+
+        iter_ep.return_value = self._get_entry_points(
+            ['a', 'b', 'c', 'b'], load_trap)
+
+        self.ext_manager = ExtensionManager(
+            self.namespace, ['b', 'a', 'c'], workers=4)
+
+        self.assertIs(self.ext_manager['a'], True)
+        self.assertEqual(self.ext_manager.getall('b'), ['b', 'b'])
+        self.assertCountEqual([i for i in self.ext_manager], [
+            ('b', 'b'), ('b', 'b'), ('a', True), ('c', 'c'), ])
+
+    @mock.patch('dooku.ext.registry.entry_points', autospec=True)
+    def test_workers_silent(self, iter_ep):
+        """
+        Loading errors have to be thrown at once if silent is False, and
+        have to be skipped otherwise.
+        """
+        entry_points = self._get_entry_points(['a', 'b', 'c'])
+        entry_points[1].load.side_effect = first = ValueError('error')
+        entry_points[2].load.side_effect = second = TypeError('error')
+        iter_ep.return_value = entry_points
+
+        with self.assertRaises(ExtensionLoadError) as context:
+            ExtensionManager(self.namespace, workers=3)
+        self.assertEqual(
+            context.exception.errors, [('b', first), ('c', second)])
+        self.assertIs(context.exception.__cause__, first)
+        self.assertFalse(hasattr(first, 'errors'))
+
+        self.ext_manager = ExtensionManager(
+            self.namespace, silent=True, workers=3)
+        self.assertEqual(
+            [i for i in self.ext_manager], [('a', entry_points[0].load())])
+        self.assertTrue(entry_points[2].load.called)
+
+    @mock.patch('dooku.ext._import_metadata', autospec=True)
+    def test_scan_entry_points(self, import_metadata):
+        """
+        The entry points have to be grouped by namespaces, no matter
+        whether importlib.metadata groups them or not.
+        """
+        EntryPoint = collections.namedtuple('EntryPoint', 'name value group')
+        entry_points = [
+            EntryPoint('a', 'x:A', 'one'),
+            EntryPoint('b', 'x:B', 'two'),
+            EntryPoint('c', 'y:C', 'one'), ]
+        expected = {
+            'one': [('a', 'x:A'), ('c', 'y:C')],
+            'two': [('b', 'x:B')], }
+
+        metadata = import_metadata.return_value
+        metadata.entry_points.return_value = entry_points
+        self.assertEqual(_scan_entry_points(), expected)
+
+        metadata.entry_points.return_value = {
+            'one': [entry_points[0], entry_points[2]],
+            'two': [entry_points[1]], }
+        self.assertEqual(_scan_entry_points(), expected)
+
+
+class TestEntryPointIndex(DistributionsTestCase):
+
+    def setUp(self):
+        super(TestEntryPointIndex, self).setUp()
+
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.filename)
+        self.addCleanup(
+            lambda: os.path.exists(self.filename) and os.remove(self.filename))
+
+    def test_entry_points(self):
+        """
+        The index has to resolve namespaces like discovery does, and has
+        to be saved into a file.
+        """
+        index = EntryPointIndex(self.filename)
+        ext_manager = ExtensionManager(self.namespace, index=index)
+
+        self.assertEqual(ext_manager['one'], One)
+        self.assertEqual(ext_manager.getall('two'), [Two, NewTwo])
+        self.assertEqual(index.entry_points('dooku.tests.missed'), [])
+        self.assertTrue(os.path.exists(self.filename))
+
+    @mock.patch('dooku.ext._scan_entry_points', autospec=True)
+    def test_cached(self, scan):
+        """
+        The index has to be read from a file if nothing is changed.
+        """
+        scan.return_value = {self.namespace: [
+            ['one', '%s:One' % __name__], ]}
+
+        EntryPointIndex(self.filename).entry_points(self.namespace)
+        index = EntryPointIndex(self.filename)
+        entry_points = index.entry_points(self.namespace)
+        index.entry_points('dooku.tests.missed')
+
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual([ep.name for ep in entry_points], ['one'])
+        self.assertIs(entry_points[0].load(), One)
+
+    def test_invalidated(self):
+        """
+        The index has to be rebuilt once a distribution is installed or
+        changed, or sys.path is changed.
+        """
+        EntryPointIndex(self.filename).entry_points(self.namespace)
+
+        # make sure modification times differ from indexed ones
+        def touch(path):
+            os.utime(path, (time.time() + 10, time.time() + 10))
+
+        location = self._make_dist('fake_project_3', [
+            'three = %s:One' % __name__, ])
+        sys.path.append(location)
+        self.addCleanup(sys.path.remove, location)
+
+        index = EntryPointIndex(self.filename)
+        self.assertIn('three', ExtensionManager(self.namespace, index=index))
+
+        distinfo = os.path.join(location, 'fake_project_3-0.1.dist-info')
+        with io.open(os.path.join(distinfo, 'entry_points.txt'), 'a') as f:
+            f.write(u'four = %s:Two\n' % __name__)
+        touch(os.path.join(distinfo, 'entry_points.txt'))
+
+        index = EntryPointIndex(self.filename)
+        self.assertIn('four', ExtensionManager(self.namespace, index=index))
+
+        os.mkdir(os.path.join(location, 'fake_project_4-0.1.dist-info'))
+        touch(location)
+
+        with mock.patch('dooku.ext._scan_entry_points') as scan:
+            scan.return_value = {}
+            EntryPointIndex(self.filename).entry_points(self.namespace)
+            self.assertEqual(scan.call_count, 1)
+
+    def test_broken(self):
+        """
+        The index has to be rebuilt if its file is broken, and failures to
+        write it have to be ignored.
+        """
+        with io.open(self.filename, 'w') as f:
+            f.write(u'{"version": 1')
+
+        index = EntryPointIndex(self.filename)
+        self.assertEqual(len(index.entry_points(self.namespace)), 3)
+
+        index = EntryPointIndex(os.path.join(self.filename, 'missed'))
+        self.assertEqual(len(index.entry_points(self.namespace)), 3)
+
+    def test_load(self):
+        """
+        The restored entry points have to load nested attributes, and have
+        to ignore extras.
+        """
+        index = EntryPointIndex(self.filename)
+        index._namespaces = {self.namespace: [
+            ['one', 'os.path:join [extra]'],
+            ['two', 'os.path'], ]}
+
+        one, two = index.entry_points(self.namespace)
+        self.assertIs(one.load(), os.path.join)
+        self.assertIs(two.load(), os.path)